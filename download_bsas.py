@@ -1,5 +1,9 @@
-import cdsapi
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'web_platform'))
+from core.catalog import update_manifest
+from core.cds import Downloader, Job
 
 # --- CONFIGURACIÓN ZONA BUENOS AIRES ---
 # Norte, Oeste, Sur, Este
@@ -7,7 +11,8 @@ AREA_BSAS = [-33.0, -64.0, -42.0, -56.5]
 
 YEARS = [str(y) for y in range(1993, 2017)] 
 
-client = cdsapi.Client()
+# Pedidos activos a la vez en CDS (la cola es por usuario)
+MAX_ACTIVE = int(os.environ.get('CDS_MAX_ACTIVE', 4))
 
 MODELS = {
     'era5': 'reanalysis-era5-single-levels-monthly-means', # Reference
@@ -29,59 +34,45 @@ def main():
     print(f"Zona: {AREA_BSAS}")
     print(f"Periodo: 1993-2016")
 
-    # 1. Descargar ERA5 (Observación)
-    file_era5 = "data_bsas/era5_obs_bsas_1993_2016.nc"
-    if not os.path.exists(file_era5):
-        print("\n--> Descargando ERA5 (Observación)...")
-        try:
-            client.retrieve(
-                'reanalysis-era5-single-levels-monthly-means',
-                {
-                    'format': 'netcdf',
-                    'product_type': 'monthly_averaged_reanalysis',
-                    'variable': 'total_precipitation',
-                    'year': YEARS,
-                    'month': [str(i).zfill(2) for i in range(1, 13)],
-                    'time': '00:00',
-                    'area': AREA_BSAS,
-                },
-                file_era5
-            )
-            print("    OK ERA5")
-        except Exception as e:
-            print(f"    Error ERA5: {e}")
-    else:
-        print("\n--> ERA5 ya existe, saltando.")
+    # 1. ERA5 (Observación)
+    jobs = [Job('era5', 'reanalysis-era5-single-levels-monthly-means', {
+        'format': 'netcdf',
+        'product_type': 'monthly_averaged_reanalysis',
+        'variable': 'total_precipitation',
+        'year': YEARS,
+        'month': [str(i).zfill(2) for i in range(1, 13)],
+        'time': '00:00',
+        'area': AREA_BSAS,
+    }, "data_bsas/era5_obs_bsas_1993_2016.nc")]
 
-    # 2. Descargar Hindcasts (Modelos)
+    # 2. Hindcasts (Modelos)
     for name, sys_id in MODELS.items():
-        if name == 'era5': continue # Ya procesado
-        
-        file_hc = f"data_bsas/hc_{name}_{sys_id}_bsas.nc"
-        if os.path.exists(file_hc):
-            print(f"--> {name.upper()} ya existe, saltando.")
-            continue
-            
-        print(f"\n--> Descargando Hindcast {name.upper()}...")
-        try:
-            client.retrieve(
-                'seasonal-monthly-single-levels',
-                {
-                    'format': 'netcdf',
-                    'originating_centre': name,
-                    'system': sys_id,
-                    'variable': 'total_precipitation',
-                    'product_type': 'monthly_mean',
-                    'year': YEARS,
-                    'month': [str(i).zfill(2) for i in range(1, 13)],
-                    'leadtime_month': ['1','2','3','4','5','6'],
-                    'area': AREA_BSAS,
-                },
-                file_hc
-            )
-            print(f"    OK {name.upper()}")
-        except Exception as e:
-            print(f"    Error {name}: {e}")
+        if name == 'era5': continue # Ya agregado
+        jobs.append(Job(name, 'seasonal-monthly-single-levels', {
+            'format': 'netcdf',
+            'originating_centre': name,
+            'system': sys_id,
+            'variable': 'total_precipitation',
+            'product_type': 'monthly_mean',
+            'year': YEARS,
+            'month': [str(i).zfill(2) for i in range(1, 13)],
+            'leadtime_month': ['1','2','3','4','5','6'],
+            'area': AREA_BSAS,
+        }, f"data_bsas/hc_{name}_{sys_id}_bsas.nc"))
+
+    # Todos los pedidos se envían juntos y se siguen en paralelo (ver core/cds.py)
+    downloader = Downloader(max_active=MAX_ACTIVE, state_path="data_bsas/.cds_state.json")
+    for report in downloader.run(jobs):
+        if report['status'] == 'exists':
+            print(f"--> {report['name'].upper()} ya existe, saltando.")
+        elif report['status'] == 'done':
+            t = report['timings']
+            print(f"    OK {report['name'].upper()}: cola {t['queue']:.0f} s, descarga {t['download']:.0f} s")
+        else:
+            print(f"    Error {report['name']}: {report['error']}")
+
+    update_manifest("data_bsas")
+    print("\nDescargas listas. Normalizá los archivos con: python web_platform/manage.py ingest_data")
 
 if __name__ == "__main__":
     main()
@@ -1,8 +1,11 @@
 
-import cdsapi
+import argparse
 import os
+import sys
 
-c = cdsapi.Client()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'web_platform'))
+from core.catalog import operational_issues, recent_issues, update_manifest
+from core.cds import Downloader, Job
 
 # Directorio de datos
 DATA_DIR = 'data_bsas'
@@ -22,42 +25,57 @@ models = {
 }
 
 # Configuración de la descarga
-# Intentamos bajar el último disponible. 
-# NOTA: Ajusta AÑO y MES a la fecha actual real si es necesario.
-# Asumimos Enero 2026 (o Diciembre 2025 si Ene no salió).
-YEAR = '2025' 
-MONTH = '12' 
-
-print(f"Iniciando descarga de pronósticos operativos para {YEAR}-{MONTH}...")
-
-for system, origin in models.items():
-    filename = os.path.join(DATA_DIR, f'operational_{system}_{YEAR}{MONTH}.nc')
-    
-    if os.path.exists(filename):
-        print(f"Ya existe: {filename}")
-        continue
-        
-    print(f"Descargando {system}...")
-    
-    try:
-        c.retrieve(
-            'seasonal-monthly-single-levels',
-            {
-                'format': 'netcdf', # CAMBIO A NETCDF
-                'originating_centre': system,
-                'system': origin,
-                'variable': 'total_precipitation',
-                'product_type': 'monthly_mean',
-                'year': YEAR,
-                'month': MONTH,
-                'leadtime_month': ['1', '2', '3', '4', '5', '6'],
-                'area': [
-                    -33, -64, -41, -56, 
-                ],
-            },
-            filename)
-        print(f"Descargado: {filename}")
-    except Exception as e:
-        print(f"Error descargando {system}: {e}")
-
-print("¡Proceso finalizado!")
+# Por defecto: el último mes que C3S ya publicó (sale el día 13 de cada mes).
+# --year/--month fuerzan un mes; --months N completa también los N-1 anteriores.
+parser = argparse.ArgumentParser(description="Descarga incremental de pronósticos operativos")
+parser.add_argument('--year', type=int)
+parser.add_argument('--month', type=int)
+parser.add_argument('--months', type=int, default=1, help="Cantidad de meses de emisión recientes a completar")
+args = parser.parse_args()
+
+if (args.year is None) != (args.month is None):
+    parser.error("--year y --month van juntos")
+if args.year and args.month:
+    issues = [(args.year, args.month)]
+else:
+    issues = recent_issues(args.months)
+
+# Solo se piden los (centro, mes) que el catálogo todavía no tiene
+have = operational_issues(DATA_DIR)
+jobs = []
+for year, month in issues:
+    YEAR, MONTH = str(year), str(month).zfill(2)
+    for system, origin in models.items():
+        if (system, f'{YEAR}-{MONTH}') in have:
+            continue
+        filename = os.path.join(DATA_DIR, f'operational_{system}_{YEAR}{MONTH}.nc')
+        jobs.append(Job(f'{system} {YEAR}-{MONTH}', 'seasonal-monthly-single-levels', {
+            'format': 'netcdf', # CAMBIO A NETCDF
+            'originating_centre': system,
+            'system': origin,
+            'variable': 'total_precipitation',
+            'product_type': 'monthly_mean',
+            'year': YEAR,
+            'month': MONTH,
+            'leadtime_month': ['1', '2', '3', '4', '5', '6'],
+            'area': [
+                -33, -64, -41, -56, 
+            ],
+        }, filename))
+
+print(f"Meses de emisión: {', '.join(f'{y}-{m:02d}' for y, m in issues)}; {len(jobs)} descargas pendientes")
+
+# Todos los centros se piden juntos; una corrida cortada se retoma con el mismo estado
+downloader = Downloader(max_active=int(os.environ.get('CDS_MAX_ACTIVE', 4)),
+                        state_path=os.path.join(DATA_DIR, '.cds_state.json'))
+for report in downloader.run(jobs):
+    if report['status'] == 'exists':
+        print(f"Ya existe: {report['target']}")
+    elif report['status'] == 'done':
+        print(f"Descargado: {report['target']} ({report['timings']['total']:.0f} s)")
+    else:
+        print(f"Error descargando {report['name']}: {report['error']}")
+
+manifest = update_manifest(DATA_DIR)
+print(f"Catálogo actualizado: último operativo {manifest['latest_operational']}")
+print("¡Proceso finalizado! Normalizá los archivos con: python web_platform/manage.py ingest_data")
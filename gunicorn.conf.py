@@ -0,0 +1,25 @@
+# Configuración de gunicorn (se lee sola desde la raíz del repo: `gunicorn`)
+import os
+
+chdir = 'web_platform'
+wsgi_app = 'climate_viewer.wsgi:application'
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 3))
+timeout = 120
+
+# GUNICORN_ASGI=1: workers de uvicorn sobre la app ASGI. Las vistas /api/async/* calculan
+# en un pool acotado sin bloquear el worker y responden 504 si superan ANALYSIS_ASYNC_TIMEOUT.
+if os.environ.get('GUNICORN_ASGI', '0') == '1':
+    wsgi_app = 'climate_viewer.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+
+# Con preload la app (y la precarga de datos) se carga una vez en el master antes
+# del fork: los workers heredan los arrays copy-on-write y arrancan ya listos.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+os.environ.setdefault('CLIMATE_WARMUP', 'sync' if preload_app else 'thread')
+
+
+def post_fork(server, worker):
+    from core import warmup
+    state = warmup.status()
+    server.log.info("Worker %s: warm-up %s (%s s)", worker.pid, state["status"], state["seconds"])
@@ -20,6 +20,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/6.0/howto/deployment/checklist/
 
 import os
+import sys
+import tempfile
 
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.environ.get('SECRET_KEY', 'django-insecure-0u-p)moqg_wdf8wh_fe(juiqky0wuq!at6z%dr9^029v3vy1!k')
@@ -50,6 +52,8 @@ REST_FRAMEWORK = {
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # gzip / brotli según Accept-Encoding (core/middleware.py)
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -124,3 +128,119 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+
+
+# Datos climáticos (NetCDF de C3S) y cubo de skill precalculado
+# (python manage.py build_skill_cube)
+
+CLIMATE_DATA_DIR = os.environ.get('CLIMATE_DATA_DIR', str(BASE_DIR.parent / 'data_bsas'))
+
+SKILL_CUBE_DIR = os.environ.get('SKILL_CUBE_DIR', os.path.join(CLIMATE_DATA_DIR, 'skill_cube'))
+
+# Memoria de trabajo por bloque lat/lon al armar el cubo o la grilla (MB); 0 = toda la grilla de una vez
+SKILL_CUBE_MEMORY_MB = float(os.environ.get('SKILL_CUBE_MEMORY_MB', 256))
+
+# Store canónico de hindcasts/operativos (manage.py ingest_data)
+CLIMATE_STORE_DIR = os.environ.get('CLIMATE_STORE_DIR', os.path.join(CLIMATE_DATA_DIR, 'store'))
+
+
+# Máximo de puntos por pedido en /api/skill/batch
+
+BATCH_MAX_POINTS = int(os.environ.get('BATCH_MAX_POINTS', 10000))
+
+
+# Precarga al arrancar (core/warmup.py): '' (no), 'thread' (en segundo plano) o 'sync'
+# (bloqueante; con gunicorn --preload corre en el master y los workers comparten los arrays)
+
+CLIMATE_WARMUP = {'1': 'thread', 'true': 'thread', '0': '', 'false': ''}.get(
+    os.environ.get('CLIMATE_WARMUP', '').lower(), os.environ.get('CLIMATE_WARMUP', '').lower())
+CLIMATE_WARMUP_QUERY = os.environ.get('CLIMATE_WARMUP_QUERY', '1') != '0'
+
+
+# Hilos para evaluar los hindcasts en paralelo en un pedido de skill (0 o 1 = secuencial)
+
+ANALYSIS_MODEL_WORKERS = int(os.environ.get('ANALYSIS_MODEL_WORKERS', 0))
+
+
+# Cómo se llevan los modelos (hindcasts y operativos) a las celdas de ERA5: 'nearest' o 'bilinear'.
+# Los puntos fuera de la grilla de un modelo quedan sin dato en vez de tomar la celda del borde.
+
+GRID_INTERPOLATION = os.environ.get('GRID_INTERPOLATION', 'nearest')
+
+
+# Skill probabilístico (/api/skill/probabilistic): memoria por bloque de miembros del ensamble (MB)
+
+PROBABILISTIC_CHUNK_MB = int(os.environ.get('PROBABILISTIC_CHUNK_MB', 64))
+
+
+# Vistas async (/api/async/*): hilos para el cálculo, tope de cálculos en curso y espera máxima (s)
+
+ANALYSIS_ASYNC_WORKERS = int(os.environ.get('ANALYSIS_ASYNC_WORKERS', 4))
+ANALYSIS_ASYNC_MAX_PENDING = int(os.environ.get('ANALYSIS_ASYNC_MAX_PENDING', 64))
+ANALYSIS_ASYNC_TIMEOUT = float(os.environ.get('ANALYSIS_ASYNC_TIMEOUT', 60))
+
+
+# Jobs en segundo plano (/api/jobs): hilos trabajadores por proceso (0 = solo `manage.py run_jobs`;
+# arrancan con el primer pedido del proceso), espera entre consultas a la cola (s), tiempo para
+# reencolar un job de un worker caído (s), vida de los resultados (s), duración máxima de un stream
+# de eventos (s, por debajo del timeout de gunicorn) y espera del cliente antes de reconectar (ms).
+# `manage.py test` no arranca trabajadores salvo que se pida JOB_WORKERS.
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 0 if sys.argv[1:2] == ['test'] else 2))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1.0))
+JOB_STALE_AFTER = int(os.environ.get('JOB_STALE_AFTER', 600))
+JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', 86400))
+JOB_EVENTS_TIMEOUT = int(os.environ.get('JOB_EVENTS_TIMEOUT', 25))
+JOB_EVENTS_RETRY_MS = int(os.environ.get('JOB_EVENTS_RETRY_MS', 1000))
+
+
+# Header Server-Timing con los tiempos por etapa en /api/skill, /api/smart_forecast y /api/grid
+
+METRICS_SERVER_TIMING = os.environ.get('METRICS_SERVER_TIMING', '').lower() in ('1', 'true', 'yes')
+
+
+# Cache HTTP: Cache-Control max-age (s) de /api/skill, /api/smart_forecast, /api/grid y
+# /api/skill/probabilistic; pasado ese tiempo el cliente revalida con el ETag (304 si nada cambió)
+
+HTTP_CACHE_MAX_AGE = int(os.environ.get('HTTP_CACHE_MAX_AGE', 3600))
+
+
+# Cache de resultados (skill / smart forecast) por celda ERA5 y huella de data_bsas
+
+ANALYSIS_CACHE_SIZE = int(os.environ.get('ANALYSIS_CACHE_SIZE', 1024))
+
+ANALYSIS_CACHE_TTL = int(os.environ.get('ANALYSIS_CACHE_TTL', 3600))  # segundos
+
+# Segundo nivel compartido entre workers de gunicorn (alias de CACHES).
+# Por defecto archivos en disco; ANALYSIS_CACHE_URL=redis://... o memcached://host:port
+# para usar un servicio externo.
+ANALYSIS_CACHE_BACKEND = 'analysis'
+
+ANALYSIS_CACHE_LOCK_TIMEOUT = int(os.environ.get('ANALYSIS_CACHE_LOCK_TIMEOUT', 60))  # segundos
+
+ANALYSIS_CACHE_URL = os.environ.get('ANALYSIS_CACHE_URL', '')
+
+if ANALYSIS_CACHE_URL.startswith(('redis://', 'rediss://')):
+    _analysis_cache = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': ANALYSIS_CACHE_URL,
+    }
+elif ANALYSIS_CACHE_URL.startswith('memcached://'):
+    _analysis_cache = {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': ANALYSIS_CACHE_URL[len('memcached://'):],
+    }
+else:
+    _analysis_cache = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('ANALYSIS_CACHE_DIR',
+                                   os.path.join(tempfile.gettempdir(), 'climate_viewer_analysis')),
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    }
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'analysis': _analysis_cache,
+}
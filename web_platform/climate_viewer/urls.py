@@ -7,7 +7,20 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('', views.index, name='index'),
     path('api/skill', views.api_skill, name='api_skill'),
+    path('api/skill/batch', views.api_skill_batch, name='api_skill_batch'),
+    path('api/skill/probabilistic', views.api_skill_probabilistic, name='api_skill_probabilistic'),
     path('api/smart_forecast', views.api_smart_forecast, name='api_smart_forecast'),
+    path('api/grid', views.api_grid, name='api_grid'),
+    path('api/cache/stats', views.api_cache_stats, name='api_cache_stats'),
+    path('api/ready', views.api_ready, name='api_ready'),
+    path('api/jobs', views.api_jobs, name='api_jobs'),
+    path('api/jobs/<uuid:job_id>', views.api_job, name='api_job'),
+    path('api/jobs/<uuid:job_id>/events', views.api_job_events, name='api_job_events'),
+    path('metrics', views.api_metrics, name='metrics'),
+
+    # Variantes async (servidas por ASGI: uvicorn climate_viewer.asgi:application)
+    path('api/async/skill', views.api_skill_async, name='api_skill_async'),
+    path('api/async/smart_forecast', views.api_smart_forecast_async, name='api_smart_forecast_async'),
     
     # OpenAPI Schema & Swagger UI
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
@@ -1,221 +1,413 @@
-
-import xarray as xr
-import pandas as pd
 import numpy as np
 import os
 import glob
-from scipy.stats import pearsonr
-from calendar import monthrange
-import re
-import traceback
 import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from . import catalog
+from . import metrics
+from . import pairing
+from . import skill_cube
+from . import store
+from .cache import result_cache
+from .catalog import data_version
+
+# Ruta de datos: catalog.data_dir() (settings.CLIMATE_DATA_DIR)
+ERA5_FILE = catalog.ERA5_FILE
+
+_executor = None
+_executor_lock = threading.Lock()
 
-# Ruta de datos
-DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../data_bsas'))
 
-# Lock global para evitar que dos hilos abran archivos NetCDF al mismo tiempo
-file_lock = threading.Lock()
+def _forget_executor():
+    # En el hijo de un fork (gunicorn --preload con warm-up) los hilos del pool del padre no existen
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_executor)
 
 def get_latest_op_date():
-    op_files = glob.glob(os.path.join(DATA_DIR, 'operational_*.nc'))
-    max_date = 0
-    if not op_files: return None, None
-    for f in op_files:
-        match = re.search(r'_(\d{6})\.nc', f)
-        if match:
-             d = int(match.group(1))
-             if d > max_date: max_date = d
-    if max_date == 0: return None, None
-    return str(max_date)[:4], str(max_date)[4:]
-
-def get_skill_matrix(lat, lon, base_month):
+    # Del catálogo de ingesta (catalog.json); sin catálogo se recorre data_bsas
+    return catalog.latest_operational()
+
+def resolve_base_month(base_month):
+    # Si base_month es None o 'auto', usar el último disponible (enero si no hay); fuera de 1-12 es ValueError
+    return catalog.base_month(base_month)
+
+def hindcast_model_name(path):
+    name_parts = os.path.basename(path).split('_')
+    if len(name_parts) < 2: return None
+    return name_parts[1]
+
+def normalize_hindcast(ds, keep_members=False):
+    """Normalización On-The-Fly de un hindcast: (DataArray 'tp', coord de lead, coord de fecha).
+
+    Con keep_members no se promedia el ensamble: 'tp' conserva la dimensión
+    'number' (de largo 1 si el archivo no la tiene).
+    Lanza ValueError si el archivo no tiene una variable o coordenadas reconocibles.
+    """
+    if keep_members:
+        if 'number' not in ds.dims:
+            ds = ds.expand_dims('number')
+    elif 'number' in ds.dims:
+        with metrics.span('ensemble_mean'):
+            ds = ds.mean(dim='number')
+    
+    for v in ['tprate', 'total_precipitation', 'precip', 'precipitation_flux']:
+        if v in ds: ds = ds.rename({v: 'tp'})
+    
+    if 'tp' not in ds:
+        raise ValueError("no tiene variable 'tp'")
+    
+    da = ds['tp']
+    col_lead = None
+    for c in ['lead', 'forecastMonth', 'leadtime_month', 'step']:
+        if c in da.coords:
+            col_lead = c
+            break
+    
+    col_date = None
+    for c in ['start_date', 'time', 'forecast_reference_time', 'indexing_time']:
+        if c in da.coords and np.issubdtype(da[c].dtype, np.datetime64):
+            col_date = c
+            break
+    
+    if not col_lead or not col_date:
+        raise ValueError("tiene columnas incompatibles")
+    return da, col_lead, col_date
+
+def operational_path(model_name, op_year, op_month):
+    return os.path.join(catalog.data_dir(), f'operational_{model_name.lower()}_{op_year}{op_month}.nc')
+
+def normalize_operational(ds, keep_members=False):
+    """Pronóstico operativo como (valores (lead, lat, lon), leads, lats, lons), media del ensamble.
+
+    Las dimensiones de largo 1 (fecha de emisión) se descartan. Con 'step' el
+    lead es la posición (1..n); sin coordenada de lead se devuelve leads=None
+    y el mismo campo vale para todos los leads. Con keep_members los valores
+    son (lead, lat, lon, miembro).
+    """
+    members = ('number',) if keep_members else ()
+    if keep_members:
+        if 'number' not in ds.dims:
+            ds = ds.expand_dims('number')
+    elif 'number' in ds.dims:
+        with metrics.span('ensemble_mean'):
+            ds = ds.mean(dim='number', keep_attrs=True)
+
+    var_op = 'tp' if 'tp' in ds else ('tprate' if 'tprate' in ds else list(ds.data_vars)[0])
+    da = ds[var_op]
+    da = da.squeeze([d for d in da.dims if da.sizes[d] == 1 and d not in ('latitude', 'longitude', *members)])
+
+    leads = None
+    for c in ['leadtime_month', 'forecastMonth', 'step']:
+        if c in da.dims:
+            leads = np.arange(1, da.sizes[c] + 1) if c == 'step' else np.asarray(da[c].values)
+            da = da.transpose(c, 'latitude', 'longitude', *members)
+            break
+    else:
+        da = da.transpose('latitude', 'longitude', *members).expand_dims('lead')
+    return da.values.astype(np.float64), leads, da['latitude'].values, da['longitude'].values
+
+def operational_lead(op, lead):
+    """Campo (lat, lon) del lead pedido, o None si el archivo no lo tiene."""
+    values, leads, _, _ = op
+    if leads is None:
+        return values[0]
+    found = np.flatnonzero(leads == lead)
+    return values[found[0]] if len(found) else None
+
+class OutOfDomain(ValueError):
+    pass
+
+def locate_points(lats, lons):
+    """(lats, lons, inside): centros de las celdas ERA5 más cercanas y si el punto cae en la grilla.
+
+    Los resultados se calculan y cachean por celda.
+    """
+    lats = np.atleast_1d(np.asarray(lats, dtype=float))
+    lons = np.atleast_1d(np.asarray(lons, dtype=float))
+    try:
+        obs = store.observations(os.path.join(catalog.data_dir(), ERA5_FILE))
+    except Exception:
+        return lats, lons, np.ones(lats.shape, dtype=bool)
+    ilat, ilon, inside = obs.grid_index.nearest(lats, lons)
+    return obs.latitude[ilat], obs.longitude[ilon], inside
+
+def snap_points(lats, lons):
+    lats, lons, _ = locate_points(lats, lons)
+    return lats, lons
+
+def snap_point(lat, lon):
+    """Celda ERA5 del punto; OutOfDomain si cae fuera de la grilla en vez de pegarlo al borde."""
+    lats, lons, inside = locate_points([lat], [lon])
+    if not inside[0]:
+        raise OutOfDomain(f"point ({lat}, {lon}) is outside the data domain")
+    return float(lats[0]), float(lons[0])
+
+def _is_cacheable(data):
+    return not (isinstance(data, dict) and "error" in data)
+
+def skill_key(lat, lon, base_month):
+    # Clave del resultado: celda ERA5, mes base resuelto y huella de data_bsas
+    lat, lon = snap_point(lat, lon)
+    return ('skill', lat, lon, resolve_base_month(base_month), data_version())
+
+def forecast_key(lat, lon, mode='best'):
+    lat, lon = snap_point(lat, lon)
+    return ('forecast' if mode == 'best' else mode, lat, lon, data_version())
+
+def get_skill_matrix(lat, lon, base_month, progress=None):
+    key = skill_key(lat, lon, base_month)
+    _, lat, lon, base_month, _ = key
+    return result_cache.get_or_compute(key, lambda: _skill_matrix(lat, lon, base_month, progress), _is_cacheable)
+
+def _skill_matrix(lat, lon, base_month, progress=None):
+    # Camino rápido: cubo precalculado (manage.py build_skill_cube)
+    precomputed = skill_cube.lookup_skill(lat, lon, base_month)
+    metrics.inc('climate_skill_cube_total', result='hit' if precomputed is not None else 'miss')
+    if precomputed is not None:
+        return precomputed
+    return compute_skill_matrix(lat, lon, base_month, progress)
+
+def get_skill_matrix_batch(points, base_month):
+    """Skill para muchos puntos [(lat, lon), ...]: devuelve [(celda, resultado), ...].
+
+    La celda es None (y el resultado un error) si el punto cae fuera de la grilla.
+    Cada celda ERA5 se calcula una sola vez y comparte el cache con /api/skill;
+    las celdas que faltan se resuelven juntas, leyendo cada archivo una vez.
+    """
+    base_month = resolve_base_month(base_month)
+    lats, lons, inside = locate_points([p[0] for p in points], [p[1] for p in points])
+    cells = [cell if ok else None for cell, ok in zip(zip(lats.tolist(), lons.tolist()), inside.tolist())]
+    fp = data_version()
+
+    found = {None: {"error": "point is outside the data domain"}}
+    for cell in dict.fromkeys(cells):
+        if cell is None: continue
+        value = result_cache.get(('skill', *cell, base_month, fp))
+        if value is not None: found[cell] = value
+    missing = [cell for cell in dict.fromkeys(cells) if cell not in found]
+
+    if missing:
+        cube = skill_cube.load_skill_cube()
+        if cube is not None and cube.is_fresh():
+            computed = [cube.point(lat, lon, base_month) for lat, lon in missing]
+        else:
+            computed = compute_skill_points(missing, base_month)
+        for cell, value in zip(missing, computed):
+            if _is_cacheable(value): result_cache.set(('skill', *cell, base_month, fp), value)
+            found[cell] = value
+    return [(cell, found[cell]) for cell in cells]
+
+def compute_skill_matrix(lat, lon, base_month, progress=None):
     print(f"--- Iniciando análisis de Skill para {lat}, {lon} (Mes {base_month}) ---")
+    data = compute_skill_points([(lat, lon)], base_month, progress)[0]
+    print(f"--- Análisis finalizado para {lat}, {lon} ---")
+    return data
+
+def compute_skill_points(points, base_month, progress=None):
+    """Skill de todos los modelos para una lista de puntos, indexando los arrays en bloque.
+
+    progress(modelo, hechos, total, [(acc, bias) por punto]) se llama al fusionar cada modelo.
+    """
+    base_month = resolve_base_month(base_month)
+    lats = np.asarray([p[0] for p in points], dtype=float)
+    lons = np.asarray([p[1] for p in points], dtype=float)
+
+    responses = [({}, {}) for _ in points]
     
-    with file_lock:
-        # Si base_month es None o 'auto', usar el último disponible
-        if not base_month or base_month == 'auto':
-            _, op_m = get_latest_op_date()
-            base_month = int(op_m) if op_m else 1 # Default Enero simulado
+    # 1. Cargar Observaciones (ERA5)
+    era5_path = os.path.join(catalog.data_dir(), ERA5_FILE)
     
-        response_acc = {}
-        response_bias = {}
+    if not os.path.exists(era5_path):
+        return [{"error": "Falta archivo ERA5"} for _ in points]
         
-        # 1. Cargar Observaciones (ERA5)
-        ts_obs = None
-        era5_path = os.path.join(DATA_DIR, 'era5_obs_bsas_1993_2016.nc')
-        
-        if not os.path.exists(era5_path):
-            return {"error": "Falta archivo ERA5"}
-            
+    try:
+        # Series de las celdas pedidas por indexado entero sobre (lat, lon, año, mes): (tiempo, punto)
+        obs = store.observations(era5_path)
+        with metrics.span('point_extraction'):
+            obs_values = obs.points(lats, lons)
+        print(f"ERA5 cargado OK")
+    except Exception as e:
+        print(f"Error crítico leyendo ERA5: {e}")
+        return [{"error": f"Error leyendo ERA5: {e}"} for _ in points]
+
+    # 2. Evaluar cada modelo (en paralelo si settings.ANALYSIS_MODEL_WORKERS > 1)
+    model_files = []
+    for f in sorted(glob.glob(os.path.join(catalog.data_dir(), 'hc_*_bsas.nc'))):
+        model_name = hindcast_model_name(f)
+        if model_name: model_files.append((model_name, f))
+
+    def evaluate(item):
+        return _model_scores(*item, lats, lons, obs, obs_values, base_month)
+
+    executor = _model_executor()
+    results = None
+    if executor:
+        try:
+            # Cada tarea lleva la traza del pedido al hilo del pool
+            futures = [executor.submit(metrics.bind(evaluate), item) for item in model_files]
+            results = (future.result() for future in futures)
+        except RuntimeError:
+            # El pool se cerró entre medio (otro hilo lo reemplazó): se evalúa en secuencia
+            results = None
+    if results is None:
+        results = map(evaluate, model_files)
+
+    # Se fusiona en el orden de los archivos, sin importar cuál terminó primero
+    for done, ((model_name, _), scores) in enumerate(zip(model_files, results), 1):
+        for p, (acc, bias) in enumerate(responses):
+            acc[model_name], bias[model_name] = scores[p] if scores else ([None]*6, [None]*6)
+        if progress:
+            progress(model_name, done, len(model_files), [(acc[model_name], bias[model_name]) for acc, bias in responses])
+
+    return [{"acc": acc, "bias": bias, "base_month": int(base_month)} for acc, bias in responses]
+
+def _model_scores(model_name, f, lats, lons, obs, obs_values, base_month):
+    """(acc, bias) por punto para un modelo, o None si el modelo falla (queda [None]*6)."""
+    with metrics.scope(model=model_name):
         try:
-            # Abrimos sin lock=False para evitar que colisionen pedidos simultáneos
-            with xr.open_dataset(era5_path, engine='netcdf4') as ds_obs:
-                var_name = 'tp' if 'tp' in ds_obs else list(ds_obs.data_vars)[0]
-                # Extraer punto exacto y cargarlo en RAM
-                point_obs = ds_obs[var_name].sel(latitude=lat, longitude=lon, method='nearest').load()
-                ts_obs = point_obs.to_dataframe()[point_obs.name]
-                print(f"ERA5 cargado OK")
+            try:
+                hc = store.hindcast(f)
+            except ValueError as e:
+                print(f"Modelo {model_name} {e}")
+                return None
+
+            # Emparejar (año de inicio, lead) con ERA5 y calcular r, bias y percentiles
+            with metrics.span('point_extraction'):
+                series = hc.points(lats, lons)
+            stats = hc.skill_scores(series, obs_values, obs, base_month)
+            scores = [pairing.lead_scores(stats, (p,)) for p in range(len(lats))]
+            print(f"Modelo {model_name} procesado OK")
+            return scores
         except Exception as e:
-            print(f"Error crítico leyendo ERA5: {e}")
-            return {"error": f"Error leyendo ERA5: {e}"}
-    
-        # 2. Iterar sobre todos los modelos
-        model_files = sorted(glob.glob(os.path.join(DATA_DIR, 'hc_*_bsas.nc')))
-        
-        for f in model_files:
-            name_parts = os.path.basename(f).split('_')
-            if len(name_parts) < 2: continue
-            model_name = name_parts[1]
-            
+            print(f"Error procesando {model_name}: {e}")
+            return None
+
+def _model_executor():
+    # Pool de hilos compartido y acotado; None = evaluación secuencial
+    global _executor
+    from django.conf import settings
+    workers = int(getattr(settings, 'ANALYSIS_MODEL_WORKERS', 0) or 0)
+    if workers <= 1:
+        return None
+    with _executor_lock:
+        if _executor is None or _executor[0] != workers:
+            if _executor is not None:
+                # Cambió ANALYSIS_MODEL_WORKERS: los pedidos en curso terminan en el pool viejo
+                _executor[1].shutdown(wait=False)
+            _executor = (workers, ThreadPoolExecutor(max_workers=workers, thread_name_prefix='skill-model'))
+        return _executor[1]
+
+def get_probabilistic_skill(lat, lon, base_month):
+    """Skill por terciles (RPSS, ROC, CRPS) de cada modelo en la celda, cacheado como /api/skill."""
+    lat, lon = snap_point(lat, lon)
+    base_month = resolve_base_month(base_month)
+    key = ('probabilistic', lat, lon, base_month, data_version())
+    return result_cache.get_or_compute(key, lambda: compute_probabilistic_skill(lat, lon, base_month),
+                                       _is_cacheable)
+
+def compute_probabilistic_skill(lat, lon, base_month):
+    """Por modelo y lead: RPSS, áreas ROC, CRPS y terciles de ERA5, desde los miembros del ensamble.
+
+    Si base_month es el mes del último pronóstico operativo, agrega la
+    probabilidad de cada tercil del pronóstico de cada modelo con miembros.
+    """
+    from . import probabilistic
+
+    base_month = resolve_base_month(base_month)
+    era5_path = os.path.join(catalog.data_dir(), ERA5_FILE)
+    if not os.path.exists(era5_path):
+        return {"error": "Falta archivo ERA5"}
+    try:
+        obs = store.observations(era5_path)
+        obs_values = obs.points([lat], [lon])
+    except Exception as e:
+        print(f"Error crítico leyendo ERA5: {e}")
+        return {"error": f"Error leyendo ERA5: {e}"}
+
+    op_year, op_month = get_latest_op_date()
+    with_forecast = bool(op_year) and int(op_month) == base_month
+    skill, forecast = {}, {}
+    for f in sorted(glob.glob(os.path.join(catalog.data_dir(), 'hc_*_bsas.nc'))):
+        model_name = hindcast_model_name(f)
+        if not model_name: continue
+        with metrics.scope(model=model_name):
             try:
-                with xr.open_dataset(f, engine='netcdf4') as ds:
-                    # Normalización On-The-Fly
-                    if 'number' in ds.dims: ds = ds.mean(dim='number')
-                    
-                    for v in ['tprate', 'total_precipitation', 'precip', 'precipitation_flux']:
-                        if v in ds: ds = ds.rename({v: 'tp'})
-                    
-                    if 'tp' not in ds:
-                         print(f"Modelo {model_name} no tiene variable 'tp'")
-                         response_acc[model_name] = [None]*6
-                         response_bias[model_name] = [None]*6
-                         continue
-                         
-                    point_val = ds['tp'].sel(latitude=lat, longitude=lon, method='nearest').compute()
-                    df_mod = point_val.to_dataframe().reset_index()
-                    
-                    col_lead = None
-                    for c in ['lead', 'forecastMonth', 'leadtime_month', 'step']:
-                        if c in df_mod.columns:
-                            col_lead = c
-                            break
-                    
-                    col_date = None
-                    for c in ['start_date', 'time', 'forecast_reference_time', 'indexing_time', 'index']:
-                        if c in df_mod.columns and pd.api.types.is_datetime64_any_dtype(df_mod[c]):
-                            col_date = c
-                            break
-                                
-                    if not col_lead or not col_date:
-                        print(f"Modelo {model_name} tiene columnas incompatibles")
-                        response_acc[model_name] = [None]*6
-                        response_bias[model_name] = [None]*6
-                        continue
-    
-                    # Filtrar mes base
-                    df_mod['base_month_idx'] = df_mod[col_date].dt.month
-                    df_filtered = df_mod[df_mod['base_month_idx'] == int(base_month)]
-                    
-                    if df_filtered.empty:
-                        response_acc[model_name] = [None]*6
-                        response_bias[model_name] = [None]*6
-                        continue
-                    
-                    # Calcular correlaciones y bias
-                    scores_acc = []
-                    scores_bias = []
-                    
-                    for lead in range(1, 7):
-                        lead_data = df_filtered[df_filtered[col_lead] == lead]
-                        if lead_data.empty:
-                            scores_acc.append(None)
-                            scores_bias.append(None)
-                            continue
-                            
-                        preds_mm = []
-                        obs_mm = []
-                        
-                        for _, row in lead_data.iterrows():
-                            dt_ref = row[col_date]
-                            year = dt_ref.year
-                            target_m = (int(base_month) - 1 + lead)%12 + 1
-                            target_y = year if (int(base_month) - 1 + lead) < 12 else year + 1
-                            
-                            try:
-                                # Buscar en OBS (ERA5) de forma vectorizada/eficiente
-                                target_date = pd.Timestamp(f"{target_y}-{target_m:02d}-01")
-                                
-                                # Intentar acceso directo por índice si es posible (más rápido)
-                                if target_date in ts_obs.index:
-                                    val_obs = ts_obs.loc[target_date]
-                                else:
-                                    start_w = target_date - pd.Timedelta(days=5)
-                                    end_w = target_date + pd.Timedelta(days=35)
-                                    subset_obs = ts_obs[start_w:end_w]
-                                    subset_obs = subset_obs[(subset_obs.index.month == target_m) & (subset_obs.index.year == target_y)]
-                                    if subset_obs.empty: continue
-                                    val_obs = float(subset_obs.values[0])
-                                    
-                                val_pred = float(row['tp'])
-                                
-                                # OBSERVACION (ERA5)
-                                val_obs_mm = val_obs * 1000
-                                _, d_in_m = monthrange(target_y, target_m)
-                                if val_obs_mm < 20: 
-                                    val_obs_mm *= d_in_m
-    
-                                # PREDICCION (Modelos)
-                                if abs(val_pred) < 0.01:
-                                    secs_in_month = d_in_m * 24 * 3600
-                                    val_pred_mm = val_pred * secs_in_month * 1000
-                                else:
-                                    val_pred_mm = val_pred * 1000
-                                
-                                preds_mm.append(val_pred_mm)
-                                obs_mm.append(val_obs_mm)
-                            except: pass
-                        
-                        if len(preds_mm) > 10:
-                            r, _ = pearsonr(preds_mm, obs_mm)
-                            bias = np.mean(preds_mm) - np.mean(obs_mm)
-                            obs_stats = np.percentile(obs_mm, [20, 50, 80])
-                            
-                            scores_acc.append({
-                                "r": float(r) if not np.isnan(r) else 0.0,
-                                "bias": float(bias),
-                                "p20": float(obs_stats[0]),
-                                "p50": float(obs_stats[1]),
-                                "p80": float(obs_stats[2]),
-                                "mean_obs": float(np.mean(obs_mm))
-                            })
-                            scores_bias.append(float(bias))
-                        else:
-                            scores_acc.append(None)
-                            scores_bias.append(None)
-                            
-                    response_acc[model_name] = scores_acc
-                    response_bias[model_name] = scores_bias
-                    print(f"Modelo {model_name} procesado OK")
-                    
+                hc = store.hindcast_members(f)
+                stats = probabilistic.tercile_scores(hc.points([lat], [lon]), hc.start_dates, hc.leads,
+                                                     obs_values, obs.index, base_month)
             except Exception as e:
                 print(f"Error procesando {model_name}: {e}")
-                response_acc[model_name] = [None]*6
-                response_bias[model_name] = [None]*6
-    
-        print(f"--- Análisis finalizado para {lat}, {lon} ---")
-        return {"acc": response_acc, "bias": response_bias, "base_month": int(base_month)}
+                skill[model_name] = [None] * pairing.LEADS
+                continue
+            skill[model_name] = probabilistic.lead_scores(stats, (0,))
+            op_file = operational_path(model_name, op_year, op_month) if with_forecast else None
+            if op_file and os.path.exists(op_file):
+                forecast[model_name] = _tercile_forecast(store.operational_members(op_file), lat, lon,
+                                                         skill[model_name], stats)
+
+    result = {"skill": skill, "base_month": int(base_month), "members": True}
+    if with_forecast:
+        result["forecast"] = forecast
+        result["issue"] = f"{int(op_year):04d}-{int(op_month):02d}"
+    return result
+
+def _tercile_forecast(op, lat, lon, scores, stats):
+    # Probabilidades (debajo, normal, arriba) por lead, solo donde el hindcast tiene skill reportable
+    from . import probabilistic
+
+    values = op.point(lat, lon)
+    forecast = []
+    for lead in range(1, pairing.LEADS + 1):
+        found = np.flatnonzero(op.leads == lead)
+        if not len(found) or scores[lead - 1] is None:
+            forecast.append(None)
+            continue
+        probs = probabilistic.probabilities(values[found[0]], stats['bias'][lead - 1, 0],
+                                            stats['p33'][lead - 1, 0], stats['p66'][lead - 1, 0])
+        forecast.append({c: round(float(p), 3) for c, p in zip(probabilistic.CATEGORIES, probs)})
+    return forecast
 
-def get_best_models(lat, lon, base_month_ingored):
+def _lead_label(op_year, op_month, lead):
+    # "Feb 26": mes objetivo del lead para el pronóstico emitido en op_month
+    months_names = ["", "Ene", "Feb", "Mar", "Abr", "May", "Jun", "Jul", "Ago", "Sep", "Oct", "Nov", "Dic"]
+    start_m = int(op_month)
+    target_m_idx = (start_m + lead - 1) % 12 + 1
+    target_y = int(op_year) + (1 if (start_m + lead > 12) else 0)
+    return f"{months_names[target_m_idx]} {str(target_y)[2:]}"
+
+def _confidence(skill):
+    return "Alta" if skill > 0.5 else ("Media" if skill > 0.3 else "Baja")
+
+def get_best_models(lat, lon, base_month_ingored, progress=None):
+    key = forecast_key(lat, lon)
+    _, lat, lon, _ = key
+    return result_cache.get_or_compute(key, lambda: compute_best_models(lat, lon, progress))
+
+def compute_best_models(lat, lon, progress=None):
     
     OP_YEAR, OP_MONTH = get_latest_op_date()
     if not OP_YEAR: return []
     
-    data = get_skill_matrix(lat, lon, int(OP_MONTH))
+    data = get_skill_matrix(lat, lon, int(OP_MONTH), progress)
     if "error" in data: return []
     
     matrix_acc = data["acc"]
     
+    # Pronósticos operativos del mes de emisión, cargados una vez: (modelo, lead) en la celda
+    forecast_point = store.operational_forecasts(OP_YEAR, OP_MONTH).point(lat, lon)
+
     champions = []
-    start_m = int(OP_MONTH)
-    
-    months_names = ["", "Ene", "Feb", "Mar", "Abr", "May", "Jun", "Jul", "Ago", "Sep", "Oct", "Nov", "Dic"]
     model_names = list(matrix_acc.keys())
     
     for lead in range(1, 7):
-        target_m_idx = (start_m + lead - 1) % 12 + 1
-        target_y = int(OP_YEAR) + (1 if (start_m + lead > 12) else 0)
-        
-        month_label = f"{months_names[target_m_idx]} {str(target_y)[2:]}"
+        month_label = _lead_label(OP_YEAR, OP_MONTH, lead)
         # 1. Ranking de candidatos
         candidates = []
         for m in model_names:
@@ -233,51 +425,16 @@ def get_best_models(lat, lon, base_month_ingored):
         winner_stats = {"bias": 0, "p20": 0, "p50": 0, "p80": 0, "mean_obs": 0}
         skill_used = 0.0
 
-        # 2. Buscar el mejor disponible
+        # 2. Buscar el mejor disponible (pronóstico ya normalizado a mm)
         for acc, m_name, stats in candidates:
-             op_file = os.path.join(DATA_DIR, f'operational_{m_name.lower()}_{OP_YEAR}{OP_MONTH}.nc')
-             
-             if os.path.exists(op_file):
-                 try:
-                    print(f"Buscando pronóstico operativo: {m_name}...")
-                    with xr.open_dataset(op_file, engine='netcdf4') as ds_op:
-                        if 'number' in ds_op.dims or 'number' in ds_op.coords:
-                            ds_op = ds_op.mean(dim='number', keep_attrs=True)
-
-                        var_op = 'tp' if 'tp' in ds_op else ('tprate' if 'tprate' in ds_op else list(ds_op.data_vars)[0])
-                        val_point = ds_op[var_op].sel(latitude=lat, longitude=lon, method='nearest')
-                        
-                        if 'leadtime_month' in val_point.coords:
-                            val_final = val_point.sel(leadtime_month=lead).compute()
-                        elif 'forecastMonth' in val_point.coords:
-                            val_final = val_point.sel(forecastMonth=lead).compute()
-                        elif 'step' in val_point.coords:
-                             val_final = val_point.isel(step=lead-1).compute()
-                        else:
-                            val_final = val_point.compute()
-                            
-                        val_real = float(val_final.values)
-                        
-                        _, d_in_m_op = monthrange(target_y, target_m_idx)
-                        
-                        if abs(val_real) < 0.0001: 
-                             real_forecast_mm = val_real * d_in_m_op * 24 * 3600 * 1000
-                        elif abs(val_real) < 0.5: 
-                             if abs(val_real) < 0.02:
-                                 real_forecast_mm = val_real * 1000 * d_in_m_op 
-                             else:
-                                 real_forecast_mm = val_real * 1000 
-                        else:
-                             real_forecast_mm = val_real
-                             
-                    # Si llegamos aca, tenemos dato!
-                    best_model_used = m_name
-                    winner_stats = stats
-                    skill_used = acc
-                    break 
-                 except Exception as e:
-                     print(f"Error reading {m_name}: {e}")
-                     continue
+            op_values = forecast_point.get(m_name.lower())
+            if op_values is None or np.isnan(op_values[lead-1]):
+                continue
+            real_forecast_mm = float(op_values[lead-1])
+            best_model_used = m_name
+            winner_stats = stats
+            skill_used = acc
+            break
 
         best_model = best_model_used
         best_acc = skill_used
@@ -300,7 +457,63 @@ def get_best_models(lat, lon, base_month_ingored):
             "p20": round(winner_stats['p20'], 1),
             "p50": round(winner_stats.get('p50', 0), 1),
             "p80": round(winner_stats['p80'], 1),
-            "confianza": "Alta" if best_acc > 0.5 else ("Media" if best_acc > 0.3 else "Baja")
+            "confianza": _confidence(best_acc)
         })
         
     return champions
+
+def get_ensemble_forecast(lat, lon, progress=None):
+    key = forecast_key(lat, lon, 'ensemble')
+    _, lat, lon, _ = key
+    return result_cache.get_or_compute(key, lambda: compute_ensemble_forecast(lat, lon, progress))
+
+def skill_arrays(matrix_acc, model_names):
+    """{stat: (modelo, lead)} del dict 'acc' de /api/skill, NaN donde no hay skill reportable."""
+    from .ensemble import STATS as BLEND_STATS
+    missing = [None] * pairing.LEADS
+    values = np.asarray([[np.nan if stats is None else stats[s] for stats in (matrix_acc.get(m) or missing)
+                          for s in BLEND_STATS] for m in model_names], dtype=float)
+    values = values.reshape(len(model_names), pairing.LEADS, len(BLEND_STATS))
+    return {s: values[..., i] for i, s in enumerate(BLEND_STATS)}
+
+def compute_ensemble_forecast(lat, lon, progress=None):
+    """Ensamble multimodelo ponderado por skill: todos los centros con pronóstico, por lead."""
+    from . import ensemble
+
+    OP_YEAR, OP_MONTH = get_latest_op_date()
+    if not OP_YEAR: return []
+
+    data = get_skill_matrix(lat, lon, int(OP_MONTH), progress)
+    if "error" in data: return []
+
+    model_names = list(data["acc"].keys())
+    forecast_point = store.operational_forecasts(OP_YEAR, OP_MONTH).point(lat, lon)
+    missing = np.full(pairing.LEADS, np.nan)
+    forecast = np.asarray([forecast_point.get(m.lower(), missing) for m in model_names], dtype=float)
+    blended = ensemble.blend(forecast.reshape(len(model_names), pairing.LEADS),
+                             skill_arrays(data["acc"], model_names))
+
+    def rounded(values, lead, missing=None):
+        value = values[lead - 1]
+        return missing if np.isnan(value) else round(float(value), 1)
+
+    leads = []
+    for lead in range(1, pairing.LEADS + 1):
+        weights = blended["weights"][:, lead - 1]
+        skill = float(np.nan_to_num(blended["r"][lead - 1]))
+        leads.append({
+            "lead": lead,
+            "mes": _lead_label(OP_YEAR, OP_MONTH, lead),
+            "mejor_modelo": "MULTIMODELO" if blended["models"][lead - 1] else "N/A",
+            "modelos": {m.upper(): round(float(w), 3) for m, w in zip(model_names, weights) if w > 0},
+            "skill": skill,
+            "bias": float(np.nan_to_num(blended["bias"][lead - 1])),
+            "acumulado_mm": rounded(blended["forecast"], lead),
+            "anomalia_mm": rounded(blended["anomaly"], lead),
+            "spread_mm": rounded(blended["spread"], lead),
+            "p20": rounded(blended["p20"], lead, 0.0),
+            "p50": rounded(blended["p50"], lead, 0.0),
+            "p80": rounded(blended["p80"], lead, 0.0),
+            "confianza": _confidence(skill)
+        })
+    return leads
@@ -3,3 +3,17 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        # Precarga opcional de los datos (CLIMATE_WARMUP=thread|sync); ver core/warmup.py
+        from django.conf import settings
+        from django.core.signals import request_started
+        from . import jobs
+
+        # Trabajadores de /api/jobs: arrancan con el primer pedido de cada proceso (no en el master de gunicorn)
+        request_started.connect(jobs.start_on_request, dispatch_uid='core.jobs.start_on_request')
+
+        mode = getattr(settings, 'CLIMATE_WARMUP', '')
+        if mode:
+            from . import warmup
+            warmup.start(mode, getattr(settings, 'CLIMATE_WARMUP_QUERY', True))
@@ -0,0 +1,256 @@
+"""Benchmark reproducible de los caminos calientes con NetCDF sintéticos.
+
+make_fixtures() escribe un data_bsas de juguete con las variantes de nombres
+que el código ya soporta (tprate / total_precipitation / precip, forecastMonth /
+step / leadtime_month, con y sin 'number', distintas coordenadas de fecha).
+run() mide skill en frío y en caliente, smart forecast, batch y carga
+concurrente, y devuelve un dict listo para guardar como JSON y comparar corridas.
+memory_scaling() compara la memoria pico del cubo de skill en un solo bloque
+contra el cálculo por bloques a medida que crece la grilla.
+"""
+import io
+import os
+import sys
+import time
+import shutil
+import platform
+import tempfile
+import tracemalloc
+import statistics
+from contextlib import redirect_stdout
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Variantes de esquema que rotan entre los modelos sintéticos
+HINDCAST_VARIANTS = [
+    {"var": "tprate", "lead": "forecastMonth", "date": "indexing_time", "members": 5, "units": "m/s"},
+    {"var": "total_precipitation", "lead": "step", "date": "forecast_reference_time", "members": 0, "units": "m"},
+    {"var": "precip", "lead": "leadtime_month", "date": "start_date", "members": 3, "units": "m/s"},
+    {"var": "tprate", "lead": "lead", "date": "time", "members": 0, "units": "m/s"},
+]
+OPERATIONAL_VARIANTS = [
+    {"var": "tprate", "lead": "forecastMonth", "members": 5, "units": "m/s"},
+    {"var": "tprate", "lead": "step", "members": 0, "units": "m/day"},
+    {"var": "tp", "lead": "leadtime_month", "members": 3, "units": "m"},
+]
+SECONDS_PER_DAY = 86400
+
+
+def _grid(n_lat, n_lon, step):
+    # Grilla dentro de AREA_BSAS, de norte a sur como en los archivos de C3S
+    return -33.0 - step * np.arange(n_lat), -64.0 + step * np.arange(n_lon)
+
+
+def _days(years, months):
+    from .pairing import days_in_month
+    return days_in_month(np.asarray(years), np.asarray(months))
+
+
+def make_fixtures(directory, n_lat=37, n_lon=31, n_models=4, first_year=1993, years=24,
+                  issue=(2025, 12), seed=0):
+    """Escribe ERA5, n_models hindcasts y sus operativos en `directory`; devuelve la lista de archivos."""
+    import xarray as xr
+    from .analysis import ERA5_FILE
+
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    lats, lons = _grid(n_lat, n_lon, 0.25)
+    written = []
+
+    # ERA5: promedio diario en m/día, fechas a las 06:00 como el archivo real
+    n_months = (years + 1) * 12
+    months_idx = np.arange(n_months)
+    obs_years = first_year + months_idx // 12
+    obs_months = months_idx % 12 + 1
+    climatology = 2.5 + 1.5 * np.cos(2 * np.pi * (obs_months - 1) / 12)  # mm/día
+    obs_mm_day = climatology[:, None, None] * rng.gamma(4.0, 0.25, size=(n_months, n_lat, n_lon))
+    valid_time = (np.datetime64(f'{first_year}-01', 'M') + months_idx).astype('datetime64[ns]') + np.timedelta64(6, 'h')
+    era5 = xr.Dataset({'tp': (('valid_time', 'latitude', 'longitude'), (obs_mm_day / 1000).astype(np.float32))},
+                      coords={'valid_time': valid_time, 'latitude': lats, 'longitude': lons})
+    path = os.path.join(directory, ERA5_FILE)
+    era5.to_netcdf(path, engine='netcdf4')
+    written.append(path)
+
+    # Hindcasts: señal = ERA5 del mes objetivo + ruido, en la grilla (más gruesa) del modelo
+    h_lats, h_lons = _grid(max(2, n_lat // 4), max(2, n_lon // 4), 1.0)
+    ilat = np.abs(lats[None, :] - h_lats[:, None]).argmin(axis=1)
+    ilon = np.abs(lons[None, :] - h_lons[:, None]).argmin(axis=1)
+    starts = np.arange(years * 12)
+    start_dates = (np.datetime64(f'{first_year}-01', 'M') + starts).astype('datetime64[ns]')
+    leads = np.arange(1, 7)
+    target = starts[:, None] + leads[None, :]
+    for k in range(n_models):
+        variant = HINDCAST_VARIANTS[k % len(HINDCAST_VARIANTS)]
+        signal = obs_mm_day[target][:, :, ilat][:, :, :, ilon] * rng.normal(1.0, 0.3, size=(len(starts), 6, 1, 1))
+        days = _days(obs_years[target], obs_months[target])[:, :, None, None]
+        values = signal / 1000 / SECONDS_PER_DAY if variant['units'] == 'm/s' else signal * days / 1000
+        dims = (variant['date'], variant['lead'], 'latitude', 'longitude')
+        if variant['members']:
+            values = values[None] * rng.normal(1.0, 0.05, size=(variant['members'], 1, 1, 1, 1))
+            dims = ('number',) + dims
+        ds = xr.Dataset({variant['var']: (dims, values.astype(np.float32))},
+                        coords={variant['date']: start_dates, variant['lead']: leads,
+                                'latitude': h_lats, 'longitude': h_lons})
+        path = os.path.join(directory, f'hc_model{k}_{k + 1}_bsas.nc')
+        ds.to_netcdf(path, engine='netcdf4')
+        written.append(path)
+
+        # Operativo del mes de emisión
+        op_variant = OPERATIONAL_VARIANTS[k % len(OPERATIONAL_VARIANTS)]
+        op_mm_day = climatology[(issue[1] - 1 + leads) % 12][:, None, None] * rng.gamma(4.0, 0.25, size=(6, len(h_lats), len(h_lons)))
+        op_target = issue[1] - 1 + leads
+        op_days = _days(issue[0] + op_target // 12, op_target % 12 + 1)[:, None, None]
+        if op_variant['units'] == 'm/s':
+            op_values = op_mm_day / 1000 / SECONDS_PER_DAY
+        elif op_variant['units'] == 'm/day':
+            op_values = op_mm_day / 1000
+        else:
+            op_values = op_mm_day * op_days / 1000
+        dims = ('forecast_reference_time', op_variant['lead'], 'latitude', 'longitude')
+        op_values = op_values[None]
+        if op_variant['members']:
+            op_values = op_values[None] * rng.normal(1.0, 0.05, size=(op_variant['members'], 1, 1, 1, 1))
+            dims = ('number',) + dims
+        issued = np.asarray([np.datetime64(f'{issue[0]}-{issue[1]:02d}-01', 'ns')])
+        ds = xr.Dataset({op_variant['var']: (dims, op_values.astype(np.float32))},
+                        coords={'forecast_reference_time': issued, op_variant['lead']: leads,
+                                'latitude': h_lats, 'longitude': h_lons})
+        path = os.path.join(directory, f'operational_model{k}_{issue[0]}{issue[1]:02d}.nc')
+        ds.to_netcdf(path, engine='netcdf4')
+        written.append(path)
+    return written
+
+
+def _summary(samples):
+    ms = sorted(s * 1000 for s in samples)
+    return {
+        "n": len(ms),
+        "median_ms": round(statistics.median(ms), 3),
+        "p95_ms": round(ms[min(len(ms) - 1, int(round(0.95 * (len(ms) - 1))))], 3),
+        "min_ms": round(ms[0], 3),
+    }
+
+
+def _reset():
+    # Frío: sin datasets abiertos, sin arrays canónicos ni cubo en memoria
+    from . import datasets, skill_cube, store
+    datasets.pool.clear()
+    store._forecasts.clear()
+    skill_cube._loaded = None
+
+
+def _timed(fn, *args):
+    t0 = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - t0
+
+
+def run(points=20, batch=500, threads=(1, 4), requests=64, seed=0):
+    """Mide los caminos calientes sobre settings.CLIMATE_DATA_DIR (sin cache de resultados)."""
+    from . import analysis, catalog, store
+
+    rng = np.random.default_rng(seed)
+    obs = store.observations(os.path.join(catalog.data_dir(), analysis.ERA5_FILE))
+    lat_range = (float(obs.latitude.min()), float(obs.latitude.max()))
+    lon_range = (float(obs.longitude.min()), float(obs.longitude.max()))
+
+    def random_points(n):
+        return list(zip(rng.uniform(*lat_range, n).tolist(), rng.uniform(*lon_range, n).tolist()))
+
+    op_year, op_month = analysis.get_latest_op_date()
+    base_month = int(op_month) if op_month else 1
+    queries = random_points(points)
+    results = {}
+
+    with redirect_stdout(io.StringIO()):
+        cold = []
+        for lat, lon in queries[:3]:
+            _reset()
+            cold.append(_timed(analysis.compute_skill_matrix, lat, lon, base_month))
+        results["skill_cold"] = _summary(cold)
+        results["skill_warm"] = _summary([_timed(analysis.compute_skill_matrix, lat, lon, base_month)
+                                          for lat, lon in queries])
+
+        _reset()
+        results["forecast_cold"] = _summary([_timed(analysis.compute_best_models, *queries[0])])
+        results["forecast_warm"] = _summary([_timed(analysis.compute_best_models, lat, lon) for lat, lon in queries])
+        results["ensemble_warm"] = _summary([_timed(analysis.compute_ensemble_forecast, lat, lon)
+                                             for lat, lon in queries])
+
+        batch_points = random_points(batch)
+        results["batch"] = _summary([_timed(analysis.compute_skill_points, batch_points, base_month)
+                                     for _ in range(3)])
+        results["batch"]["points"] = batch
+
+        load = random_points(requests)
+        concurrent = {}
+        for n in threads:
+            latencies = []
+
+            def one(point):
+                latencies.append(_timed(analysis.compute_skill_matrix, point[0], point[1], base_month))
+
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=n) as executor:
+                list(executor.map(one, load))
+            elapsed = time.perf_counter() - t0
+            concurrent[str(n)] = dict(_summary(latencies), requests_per_s=round(len(load) / elapsed, 2))
+        results["concurrent"] = concurrent
+    return results
+
+
+def _peak(fn, *args, **kwargs):
+    # Pico de memoria de NumPy/Python (tracemalloc) y tiempo; las páginas del mmap no cuentan
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        fn(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"peak_mb": round(peak / 2 ** 20, 1), "seconds": round(time.perf_counter() - t0, 3)}
+
+
+def memory_scaling(grids, memory_mb=64, n_models=2, years=24):
+    """build_skill_cube en un solo bloque (SKILL_CUBE_MEMORY_MB=0) y por bloques, para cada grilla (lat, lon).
+
+    Cada grilla usa fixtures sintéticos normalizados al store, así ERA5 y los
+    hindcasts se leen por mmap como en producción.
+    """
+    from django.test import override_settings
+    from . import skill_cube, store
+
+    results = []
+    workdir = tempfile.mkdtemp(prefix='bench_memory_')
+    try:
+        for n_lat, n_lon in grids:
+            data_dir = os.path.join(workdir, f'data_{n_lat}x{n_lon}')
+            store_dir = os.path.join(workdir, f'store_{n_lat}x{n_lon}')
+            with override_settings(CLIMATE_DATA_DIR=data_dir, CLIMATE_STORE_DIR=store_dir), \
+                    redirect_stdout(io.StringIO()):
+                make_fixtures(data_dir, n_lat, n_lon, n_models, years=years)
+                store.ingest(data_dir, store_dir)
+                row = {"grid": [n_lat, n_lon], "cells": n_lat * n_lon}
+                for label, budget in (("in_memory", 0), ("tiled", memory_mb)):
+                    _reset()
+                    row[label] = _peak(skill_cube.build_skill_cube, os.path.join(workdir, 'skill_cube'),
+                                       data_dir, memory_mb=budget, progress=None)
+                _reset()
+            results.append(row)
+            shutil.rmtree(data_dir, ignore_errors=True)
+            shutil.rmtree(store_dir, ignore_errors=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {"memory_mb": memory_mb, "models": n_models, "years": years, "grids": results}
+
+
+def environment():
+    return {
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "at": datetime.now(timezone.utc).isoformat(),
+    }
@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import hashlib
+import uuid
+import zlib
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+def encode(value):
+    # JSON compacto + zlib: liviano de guardar en disco/Redis y legible desde cualquier worker
+    return zlib.compress(json.dumps(value, separators=(',', ':')).encode())
+
+
+def decode(blob):
+    return json.loads(zlib.decompress(blob))
+
+
+class ResultCache:
+    """LRU acotado con vencimiento (TTL) para resultados de análisis.
+
+    Es el primer nivel, dentro del proceso. Si se indica `backend` (un alias de
+    settings.CACHES) cada resultado también se guarda ahí, de modo que los
+    workers de gunicorn y los reinicios comparten lo ya calculado; mientras un
+    worker calcula una clave fría, los demás esperan su resultado en vez de
+    repetir el cálculo. El candado usa `add` del backend (atómico en Redis y
+    Memcached); con FileBasedCache, cuyo `add` no es atómico, es un archivo
+    .lock creado con O_CREAT | O_EXCL en el directorio del cache.
+
+    Las claves incluyen la huella de data_bsas, así que un archivo nuevo o
+    modificado deja de coincidir con las entradas viejas, que terminan
+    saliendo por LRU/TTL. Los valores se comparten entre pedidos: no mutarlos.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600, backend=None, lock_timeout=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+        self.lock_timeout = lock_timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _shared(self):
+        if not self.backend:
+            return None
+        from django.core.cache import caches
+        return caches[self.backend]
+
+    @staticmethod
+    def _key(key):
+        return ':'.join(str(part) for part in key) if isinstance(key, tuple) else str(key)
+
+    def _get_local(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > now:
+                self._data.move_to_end(key)
+                return entry[1]
+            if entry is not _MISSING:
+                del self._data[key]
+                self.evictions += 1
+            return _MISSING
+
+    def _set_local(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def _get_shared(self, key):
+        shared = self._shared()
+        if shared is None:
+            return _MISSING
+        blob = shared.get(self._key(key))
+        return _MISSING if blob is None else decode(blob)
+
+    def get(self, key, default=None):
+        value = self._get_local(key)
+        if value is _MISSING:
+            value = self._get_shared(key)
+            if value is not _MISSING:
+                self._set_local(key, value)
+                with self._lock:
+                    self.shared_hits += 1
+        with self._lock:
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self._set_local(key, value)
+        shared = self._shared()
+        if shared is not None:
+            shared.set(self._key(key), encode(value), self.ttl)
+
+    def _lock_path(self, shared, lock_key):
+        # Solo FileBasedCache: su add() es has_key() + set(), no atómico entre procesos
+        from django.core.cache.backends.filebased import FileBasedCache
+        if not isinstance(shared, FileBasedCache):
+            return None
+        return os.path.join(shared._dir, hashlib.sha1(lock_key.encode()).hexdigest() + '.lock')
+
+    def _stale(self, path):
+        try:
+            return time.time() - os.stat(path).st_mtime > self.lock_timeout
+        except FileNotFoundError:
+            return False
+
+    def _acquire(self, shared, lock_key, token):
+        path = self._lock_path(shared, lock_key)
+        if path is None:
+            return shared.add(lock_key, token, self.lock_timeout)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                # Un worker que murió con el candado tomado: vence a los lock_timeout segundos
+                if not self._stale(path):
+                    return False
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, 'w') as fh:
+                fh.write(token)
+            return True
+        return False
+
+    def _locked(self, shared, lock_key):
+        path = self._lock_path(shared, lock_key)
+        if path is None:
+            return shared.get(lock_key) is not None
+        return os.path.exists(path) and not self._stale(path)
+
+    def _release(self, shared, lock_key, token):
+        path = self._lock_path(shared, lock_key)
+        if path is None:
+            if shared.get(lock_key) == token:
+                shared.delete(lock_key)
+            return
+        try:
+            with open(path) as fh:
+                owned = fh.read() == token
+            if owned:
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def get_or_compute(self, key, compute, cacheable=lambda value: True):
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        shared = self._shared()
+        lock_key = f"lock:{self._key(key)}"
+        token = uuid.uuid4().hex
+        if shared is not None and not self._acquire(shared, lock_key, token):
+            # Otro worker ya está calculando esta clave: esperar su resultado
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                value = self._get_shared(key)
+                if value is not _MISSING:
+                    self._set_local(key, value)
+                    return value
+                if not self._locked(shared, lock_key):
+                    break
+        try:
+            value = compute()
+            if cacheable(value):
+                self.set(key, value)
+        finally:
+            if shared is not None:
+                self._release(shared, lock_key, token)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "backend": self.backend,
+            }
+
+
+def _from_settings():
+    from django.conf import settings
+    return ResultCache(maxsize=getattr(settings, 'ANALYSIS_CACHE_SIZE', 1024),
+                       ttl=getattr(settings, 'ANALYSIS_CACHE_TTL', 3600),
+                       backend=getattr(settings, 'ANALYSIS_CACHE_BACKEND', None),
+                       lock_timeout=getattr(settings, 'ANALYSIS_CACHE_LOCK_TIMEOUT', 60))
+
+
+result_cache = _from_settings()
@@ -0,0 +1,255 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from datetime import date, datetime, timezone
+
+# Directorio por defecto (raíz del repo / data_bsas)
+DEFAULT_DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../data_bsas'))
+
+# Catálogo de ingesta: qué hay en data_bsas, con checksums y rutas normalizadas
+MANIFEST = 'catalog.json'
+
+# Observaciones ERA5: su grilla define las celdas de resultados
+ERA5_FILE = 'era5_obs_bsas_1993_2016.nc'
+
+# C3S publica los pronósticos estacionales el día 13 de cada mes
+RELEASE_DAY = 13
+
+# Métodos para llevar los modelos a las celdas de ERA5 (settings.GRID_INTERPOLATION)
+INTERPOLATIONS = ('nearest', 'bilinear')
+
+_manifests = {}
+_manifest_lock = threading.Lock()
+# directorio -> ((mtime del catálogo, mtime del directorio), el catálogo coincide con el disco)
+_checked = {}
+
+
+def data_dir():
+    from django.conf import settings
+    return str(getattr(settings, 'CLIMATE_DATA_DIR', DEFAULT_DATA_DIR))
+
+
+def file_signature(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def scan_sources(directory=None):
+    """Archivos NetCDF presentes en disco con (tamaño, mtime_ns)."""
+    directory = directory or data_dir()
+    sources = {}
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return sources
+    for entry in entries:
+        if entry.name.endswith('.nc') and entry.is_file():
+            st = entry.stat()
+            sources[entry.name] = [st.st_size, st.st_mtime_ns]
+    return dict(sorted(sources.items()))
+
+
+def source_files(directory=None):
+    """Archivos NetCDF de origen con (tamaño, mtime_ns); define la "versión" de los datos.
+
+    Sale del catálogo si existe y sigue describiendo el directorio; si no
+    (no hay catálogo, o se agregó, borró o reemplazó un archivo), del directorio.
+    """
+    manifest = read_manifest(directory)
+    if manifest is None:
+        return scan_sources(directory)
+    return {name: [d['size'], d['mtime_ns']] for name, d in manifest['datasets'].items()}
+
+
+def fingerprint(directory=None):
+    sources = source_files(directory)
+    raw = ';'.join(f"{name}:{size}:{mtime}" for name, (size, mtime) in sources.items())
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def interpolation():
+    """Método para llevar los modelos a las celdas de ERA5 (settings.GRID_INTERPOLATION)."""
+    from django.conf import settings
+    method = getattr(settings, 'GRID_INTERPOLATION', 'nearest')
+    if method not in INTERPOLATIONS:
+        raise ValueError(f"GRID_INTERPOLATION must be one of {', '.join(INTERPOLATIONS)}")
+    return method
+
+
+def data_version(directory=None):
+    """Versión de los resultados: huella de data_bsas más el método de interpolación.
+
+    La usan las claves de caché de core.analysis y los ETag de core.conditional,
+    así que vive acá (sin NumPy) para que ambos lean exactamente lo mismo.
+    """
+    method = interpolation()
+    return fingerprint(directory) if method == 'nearest' else f"{fingerprint(directory)}:{method}"
+
+
+def classify(name):
+    """Tipo de dataset según el nombre del archivo, o None si no es uno conocido."""
+    stem = name[:-3] if name.endswith('.nc') else name
+    if stem.startswith('era5_'):
+        return {"kind": "observations"}
+    match = re.fullmatch(r'operational_(.+)_(\d{4})(\d{2})', stem)
+    if match:
+        return {"kind": "operational", "model": match.group(1), "issue": f"{match.group(2)}-{match.group(3)}"}
+    parts = stem.split('_')
+    if parts[0] == 'hc' and len(parts) >= 2:
+        return {"kind": "hindcast", "model": parts[1]}
+    return None
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _matches_directory(directory, manifest, manifest_mtime):
+    """¿El catálogo describe los NetCDF que hay en disco?
+
+    Agregar, borrar o renombrar un archivo (las descargas se renombran desde
+    .part) cambia el mtime del directorio: solo entonces se vuelve a recorrer.
+    """
+    try:
+        key = (manifest_mtime, os.stat(directory).st_mtime_ns)
+    except FileNotFoundError:
+        return False
+    cached = _checked.get(directory)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    on_disk = {name: sig for name, sig in scan_sources(directory).items() if classify(name)}
+    recorded = {name: [d['size'], d['mtime_ns']] for name, d in manifest['datasets'].items()}
+    fresh = on_disk == recorded
+    _checked[directory] = (key, fresh)
+    return fresh
+
+
+def read_manifest(directory=None, check=True):
+    """Catálogo de data_bsas, cacheado por mtime de catalog.json.
+
+    None si no existe o, con check, si ya no coincide con los archivos del
+    directorio (hasta el próximo update_manifest se usa scan_sources).
+    """
+    directory = directory or data_dir()
+    path = os.path.join(directory, MANIFEST)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _manifests.get(path)
+    if cached is not None and cached[0] == mtime:
+        manifest = cached[1]
+    else:
+        with _manifest_lock:
+            with open(path) as fh:
+                manifest = json.load(fh)
+            _manifests[path] = (mtime, manifest)
+    if check and not _matches_directory(directory, manifest, mtime):
+        return None
+    return manifest
+
+
+def update_manifest(directory=None, store_directory=None):
+    """Actualiza catalog.json con los NetCDF presentes.
+
+    Solo se recalcula el checksum de los archivos nuevos o modificados.
+    `normalized` es la entrada del store (relativa a data_bsas), o None si
+    todavía no se ingirió.
+    """
+    directory = directory or data_dir()
+    store_directory = store_directory or os.path.join(directory, 'store')
+    previous = (read_manifest(directory, check=False) or {}).get('datasets', {})
+
+    datasets = {}
+    for name, (size, mtime) in scan_sources(directory).items():
+        entry = classify(name)
+        if entry is None:
+            continue
+        old = previous.get(name)
+        unchanged = old is not None and old['size'] == size and old['mtime_ns'] == mtime
+        entry_dir = os.path.join(store_directory, name[:-3])
+        entry.update({
+            "size": size,
+            "mtime_ns": mtime,
+            "sha256": old['sha256'] if unchanged else _sha256(os.path.join(directory, name)),
+            "normalized": (os.path.relpath(entry_dir, directory)
+                           if os.path.exists(os.path.join(entry_dir, 'meta.json')) else None),
+        })
+        datasets[name] = entry
+
+    issues = [d['issue'] for d in datasets.values() if d['kind'] == 'operational']
+    manifest = {
+        "version": 1,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+        "latest_operational": max(issues) if issues else None,
+        "datasets": datasets,
+    }
+    path = os.path.join(directory, MANIFEST)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as fh:
+        json.dump(manifest, fh, indent=1)
+    os.replace(tmp, path)
+    return manifest
+
+
+def latest_operational(directory=None):
+    """(año, mes) como strings del último pronóstico operativo, o (None, None)."""
+    manifest = read_manifest(directory)
+    if manifest is not None:
+        issue = manifest.get('latest_operational')
+    else:
+        issues = [d['issue'] for d in map(classify, scan_sources(directory)) if d and d['kind'] == 'operational']
+        issue = max(issues) if issues else None
+    if not issue:
+        return None, None
+    year, month = issue.split('-')
+    return year, month
+
+
+def base_month(raw, directory=None):
+    """Mes base 1-12; None, '' o 'auto' = mes de emisión del último operativo (enero si no hay)."""
+    if raw in (None, '', 'auto'):
+        _, month = latest_operational(directory)
+        return int(month) if month else 1
+    month = int(raw)
+    if not 1 <= month <= 12:
+        raise ValueError("month must be 1-12")
+    return month
+
+
+def operational_issues(directory=None):
+    """{(modelo, 'AAAA-MM')} de los pronósticos operativos ya disponibles."""
+    manifest = read_manifest(directory)
+    names = manifest['datasets'] if manifest is not None else scan_sources(directory)
+    found = set()
+    for name in names:
+        entry = classify(name)
+        if entry and entry['kind'] == 'operational':
+            found.add((entry['model'], entry['issue']))
+    return found
+
+
+def latest_published_issue(today=None, release_day=RELEASE_DAY):
+    """Último mes de emisión que C3S ya publicó a la fecha (año, mes)."""
+    today = today or datetime.now(timezone.utc).date()
+    if today.day >= release_day:
+        return today.year, today.month
+    previous = date(today.year, today.month, 1).toordinal() - 1
+    previous = date.fromordinal(previous)
+    return previous.year, previous.month
+
+
+def recent_issues(count=1, today=None):
+    """Los últimos `count` meses de emisión publicados, del más viejo al más nuevo."""
+    year, month = latest_published_issue(today)
+    issues = []
+    for _ in range(count):
+        issues.append((year, month))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return issues[::-1]
@@ -0,0 +1,232 @@
+"""Descargas concurrentes desde la API de CDS (Copernicus Climate Data Store).
+
+Reemplaza el `cdsapi.Client.retrieve` de a un pedido por vez: todos los pedidos
+se envían y se siguen en paralelo, con un tope de pedidos activos (CDS encola
+por usuario). Cada resultado se baja a <destino>.part y se renombra al
+terminar, así un archivo a medias nunca queda con el nombre final.
+
+El estado (jobID de cada destino) se guarda en un JSON: si la corrida se corta,
+la siguiente retoma los pedidos ya encolados en CDS en vez de reenviarlos, y
+continúa las descargas parciales con HTTP Range. Solo usa requests: se puede
+importar desde los scripts de descarga sin Django.
+"""
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DEFAULT_URL = 'https://cds.climate.copernicus.eu/api'
+CHUNK_SIZE = 1 << 20
+
+
+class CDSError(Exception):
+    pass
+
+
+class JobFailed(CDSError):
+    """CDS terminó el pedido con error: la próxima corrida lo reenvía."""
+
+
+def read_config(path=None):
+    """(url, key) desde CDS_API_URL / CDS_API_KEY o, si faltan, desde ~/.cdsapirc."""
+    url = os.environ.get('CDS_API_URL')
+    key = os.environ.get('CDS_API_KEY')
+    path = path or os.environ.get('CDSAPI_RC', os.path.expanduser('~/.cdsapirc'))
+    if (not url or not key) and os.path.exists(path):
+        with open(path) as fh:
+            for line in fh:
+                name, _, value = line.partition(':')
+                if name.strip() == 'url' and not url: url = value.strip()
+                if name.strip() == 'key' and not key: key = value.strip()
+    return url or DEFAULT_URL, key
+
+
+class Job:
+    """Un pedido a CDS: dataset + request, bajado a `target`."""
+
+    def __init__(self, name, dataset, request, target):
+        self.name = name
+        self.dataset = dataset
+        self.request = request
+        self.target = target
+        self.job_id = None
+        self.status = 'pending'
+        self.error = None
+        self.size = 0
+        self.timings = {}
+
+    def report(self):
+        return {"name": self.name, "target": self.target, "job_id": self.job_id, "status": self.status,
+                "error": self.error, "bytes": self.size, "timings": self.timings}
+
+
+class Downloader:
+    """Envía, sigue y descarga varios pedidos de CDS en paralelo.
+
+    max_active acota los pedidos en curso a la vez; state_path guarda los jobID
+    para retomar una corrida interrumpida.
+    """
+
+    def __init__(self, url=None, key=None, max_active=4, poll_interval=5.0, timeout=6 * 3600,
+                 retries=3, state_path=None, session=None):
+        default_url, default_key = read_config() if (url is None or key is None) else (url, key)
+        self.url = (url or default_url).rstrip('/')
+        self.key = key or default_key
+        self.max_active = max_active
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.retries = retries
+        self.state_path = state_path
+        self.session = session or requests.Session()
+        if self.key:
+            self.session.headers['PRIVATE-TOKEN'] = self.key
+        self._state_lock = threading.Lock()
+
+    # --- Estado para reanudar ---
+
+    def _load_state(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path) as fh:
+            return json.load(fh)
+
+    def _update_state(self, target, job_id):
+        if not self.state_path:
+            return
+        with self._state_lock:
+            state = self._load_state()
+            if job_id is None:
+                state.pop(target, None)
+            else:
+                state[target] = job_id
+            tmp = self.state_path + '.tmp'
+            with open(tmp, 'w') as fh:
+                json.dump(state, fh, indent=1)
+            os.replace(tmp, self.state_path)
+
+    # --- API de CDS ---
+
+    def _call(self, method, url, retry=True, **kwargs):
+        # Reintenta errores de red, timeouts de lectura y 5xx con espera creciente (retry=False: un intento)
+        attempts = self.retries + 1 if retry else 1
+        for attempt in range(attempts):
+            try:
+                response = self.session.request(method, url, timeout=60, **kwargs)
+                if response.status_code < 500:
+                    return response
+                error = CDSError(f"{response.status_code} en {url}")
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            if attempt < attempts - 1:
+                time.sleep(min(self.poll_interval, 1.0) * 2 ** attempt)
+        raise error
+
+    def _json(self, method, path, not_found=CDSError, retry=True, **kwargs):
+        response = self._call(method, f"{self.url}{path}", retry=retry, **kwargs)
+        if response.status_code == 404:
+            raise not_found(f"404: {response.text[:200]}")
+        if response.status_code >= 400:
+            raise CDSError(f"{response.status_code}: {response.text[:200]}")
+        return response.json()
+
+    def submit(self, job):
+        # Sin reintentos: un 5xx o un timeout pueden haber encolado el pedido igual, y reenviarlo lo duplicaría
+        data = self._json('POST', f"/retrieve/v1/processes/{job.dataset}/execution", retry=False,
+                          json={"inputs": job.request})
+        return data['jobID']
+
+    def wait(self, job):
+        """Espera a que el pedido termine en CDS y devuelve la URL del resultado."""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            # Un jobID guardado que CDS ya no conoce se descarta como un pedido fallido
+            data = self._json('GET', f"/retrieve/v1/jobs/{job.job_id}", not_found=JobFailed)
+            job.status = data.get('status', 'unknown')
+            if job.status == 'successful':
+                results = self._json('GET', f"/retrieve/v1/jobs/{job.job_id}/results")
+                return results['asset']['value']['href']
+            if job.status in ('failed', 'rejected', 'dismissed', 'deleted'):
+                detail = data.get('message') or data.get('detail') or job.status
+                raise JobFailed(f"pedido {job.status}: {detail}")
+            if time.monotonic() > deadline:
+                raise CDSError(f"sin resultado después de {self.timeout} s")
+            time.sleep(self.poll_interval)
+
+    def download(self, href, target):
+        """Baja href a target.part (retomando lo ya bajado) y lo renombra a target."""
+        part = target + '.part'
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        response = self._call('GET', href, headers=headers, stream=True)
+        if offset and response.status_code == 416:
+            # El .part ya llega al final del archivo: completo si coincide con el tamaño remoto
+            response.close()
+            if self._remote_size(href, response) == offset:
+                os.replace(part, target)
+                return offset
+            os.remove(part)
+            return self.download(href, target)
+        if response.status_code >= 400:
+            raise CDSError(f"{response.status_code} al descargar {href}")
+        mode = 'ab' if offset and response.status_code == 206 else 'wb'
+        with response, open(part, mode) as fh:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                fh.write(chunk)
+        os.replace(part, target)
+        return os.path.getsize(target)
+
+    def _remote_size(self, href, response):
+        """Tamaño total del resultado: Content-Range del 416 ("bytes */N") o Content-Length de un HEAD."""
+        total = response.headers.get('Content-Range', '').rpartition('/')[2]
+        if total.isdigit():
+            return int(total)
+        head = self._call('HEAD', href, allow_redirects=True)
+        length = head.headers.get('Content-Length', '')
+        return int(length) if head.status_code < 400 and length.isdigit() else None
+
+    # --- Orquestación ---
+
+    def _run(self, job, known):
+        t0 = time.perf_counter()
+        try:
+            job.job_id = known.get(job.target)
+            if job.job_id is None:
+                job.job_id = self.submit(job)
+                self._update_state(job.target, job.job_id)
+            job.timings['submit'] = time.perf_counter() - t0
+            href = self.wait(job)
+            job.timings['queue'] = time.perf_counter() - t0 - job.timings['submit']
+            t1 = time.perf_counter()
+            job.size = self.download(href, job.target)
+            job.timings['download'] = time.perf_counter() - t1
+            job.status = 'done'
+            self._update_state(job.target, None)
+        except Exception as e:
+            job.status = 'error'
+            job.error = str(e)
+            if isinstance(e, JobFailed):
+                self._update_state(job.target, None)
+        job.timings['total'] = time.perf_counter() - t0
+        print(f"{job.name}: {job.status} en {job.timings['total']:.1f} s" + (f" ({job.error})" if job.error else ""))
+        return job
+
+    def run(self, jobs):
+        """Ejecuta los pedidos cuyo destino no existe; devuelve un reporte por pedido."""
+        known = self._load_state()
+        reports = []
+        todo = []
+        for job in jobs:
+            if os.path.exists(job.target):
+                job.status = 'exists'
+                reports.append(job)
+            else:
+                os.makedirs(os.path.dirname(os.path.abspath(job.target)), exist_ok=True)
+                todo.append(job)
+        if todo:
+            with ThreadPoolExecutor(max_workers=self.max_active, thread_name_prefix='cds') as executor:
+                reports.extend(executor.map(lambda job: self._run(job, known), todo))
+        order = {id(job): i for i, job in enumerate(jobs)}
+        return [job.report() for job in sorted(reports, key=lambda job: order[id(job)])]
@@ -0,0 +1,100 @@
+"""Formatos compactos para las respuestas de skill (negociados por Accept u ?output=).
+
+columnar: b'CVS1' + uint32 largo del encabezado JSON + encabezado + un bloque
+float32 little-endian con forma (mes, punto, modelo, lead, estadístico), NaN
+donde el JSON tiene null. Es el mismo esquema que el CVG1 de /api/grid: se lee
+con un frombuffer, sin parsear un número por vez.
+
+msgpack: el mismo objeto que el JSON, en MessagePack (dependencia opcional).
+"""
+import json
+import struct
+
+import numpy as np
+
+from .pairing import LEADS, STATS
+
+MAGIC = b'CVS1'
+CONTENT_TYPES = {
+    'json': 'application/json',
+    'columnar': 'application/vnd.climate-viewer.columnar',
+    'msgpack': 'application/msgpack',
+}
+MEDIA_TYPES = {ct: name for name, ct in CONTENT_TYPES.items()}
+MEDIA_TYPES['application/x-msgpack'] = 'msgpack'
+
+
+class NotAcceptable(Exception):
+    pass
+
+
+def negotiate(request, allowed=('json', 'columnar', 'msgpack')):
+    """Formato pedido: ?output=... o el primer tipo de Accept que se sepa servir; JSON por defecto."""
+    requested = request.GET.get('output')
+    if requested is None:
+        accept = [part.split(';')[0].strip() for part in request.headers.get('Accept', '').split(',')]
+        requested = next((MEDIA_TYPES[media] for media in accept if media in MEDIA_TYPES), 'json')
+    if requested not in allowed:
+        raise NotAcceptable(f"output must be one of {', '.join(allowed)}")
+    if requested == 'msgpack':
+        try:
+            import msgpack  # noqa: F401
+        except ImportError:
+            raise NotAcceptable("msgpack output needs the optional 'msgpack' package") from None
+    return requested
+
+
+def pack_msgpack(data):
+    import msgpack
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def skill_models(results):
+    # Modelos en el orden de aparición (el de los archivos hc_*)
+    models = {}
+    for data in results:
+        models.update(dict.fromkeys(data.get('acc', {})))
+    return list(models)
+
+
+def skill_array(results, models):
+    """(punto, modelo, lead, estadístico) float32 desde los dicts de /api/skill."""
+    missing = [None] * LEADS
+    values = [np.nan if stats is None else stats[s]
+              for data in results
+              for model in models
+              for stats in (data.get('acc', {}).get(model) or missing)
+              for s in STATS]
+    return np.asarray(values, dtype=np.float32).reshape(len(results), len(models), LEADS, len(STATS))
+
+
+def encode_skill(per_month, points):
+    """CVS1 para {mes: [resultado por punto]} y la lista de puntos (dicts con id/lat/lon/cell).
+
+    Los meses son las claves tal como en el JSON ("1", "auto", ...).
+    """
+    months = list(per_month)
+    models = skill_models(r for results in per_month.values() for r in results)
+    block = np.stack([skill_array(per_month[m], models) for m in months]) if months else np.zeros((0,))
+    header = {
+        "kind": "skill",
+        "months": [str(m) for m in months],
+        "points": points,
+        "models": models,
+        "leads": list(range(1, LEADS + 1)),
+        "stats": STATS,
+        "shape": list(block.shape),
+        "dtype": "float32",
+        "byteorder": "little",
+    }
+    raw = json.dumps(header, separators=(',', ':')).encode()
+    return MAGIC + struct.pack('<I', len(raw)) + raw + block.astype('<f4').tobytes()
+
+
+def decode_skill(blob):
+    if blob[:4] != MAGIC:
+        raise ValueError("not a CVS1 skill block")
+    (size,) = struct.unpack('<I', blob[4:8])
+    header = json.loads(blob[8:8 + size])
+    header["values"] = np.frombuffer(blob[8 + size:], dtype='<f4').reshape(header["shape"])
+    return header
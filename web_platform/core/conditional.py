@@ -0,0 +1,129 @@
+"""Caché HTTP condicional (ETag / Last-Modified / Cache-Control) de las vistas de análisis.
+
+Los resultados solo cambian cuando llega un archivo a data_bsas, así que el
+ETag es un hash de la huella del catálogo más la consulta normalizada: celda
+ERA5, mes base resuelto, modo y formato negociado. Armarlo es un stat por
+archivo y un índice entero sobre la grilla de ERA5: un If-None-Match que
+coincide recibe 304 sin importar core.analysis ni calcular nada, y el
+navegador o un CDN delante absorben los clics repetidos del mapa.
+"""
+import os
+import hashlib
+import functools
+from datetime import datetime, timezone
+
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from . import catalog
+
+
+def _setting(name, default):
+    from django.conf import settings
+    return getattr(settings, name, default)
+
+
+def cell(lat, lon):
+    """Celda ERA5 (lat, lon) del punto, o None si cae fuera de la grilla."""
+    from . import store
+    obs = store.observations(os.path.join(catalog.data_dir(), catalog.ERA5_FILE))
+    ilat, ilon, inside = obs.grid_index.nearest([float(lat)], [float(lon)])
+    if not inside[0]:
+        return None
+    return float(obs.latitude[ilat[0]]), float(obs.longitude[ilon[0]])
+
+
+def base_month(raw):
+    # La misma validación que usan las vistas (analysis.resolve_base_month): 'auto' o 1-12
+    return catalog.base_month(raw)
+
+
+def _output(request, allowed):
+    from . import columnar
+    return columnar.negotiate(request, allowed)
+
+
+def skill_query(request):
+    params = request.GET
+    return (cell(params['lat'], params['lon']), base_month(params.get('month', '1')),
+            _output(request, ('json', 'columnar', 'msgpack')))
+
+
+def probabilistic_query(request):
+    params = request.GET
+    return (cell(params['lat'], params['lon']), base_month(params.get('month', '1')),
+            _output(request, ('json', 'msgpack')))
+
+
+def forecast_query(request):
+    # El pronóstico usa siempre el último mes de emisión: `month` no cambia la respuesta
+    params = request.GET
+    mode = str(params.get('mode') or 'best').lower()
+    if mode not in ('best', 'ensemble'):
+        raise ValueError(mode)
+    return cell(params['lat'], params['lon']), base_month('auto'), mode, _output(request, ('json', 'msgpack'))
+
+
+def grid_query(request):
+    params = request.GET
+    output = params.get('output', 'json')
+    if output == 'msgpack':
+        _output(request, ('msgpack',))
+    return (str(params.get('model', 'best')).lower(), base_month(params.get('month', 'auto')),
+            int(params.get('lead', 1)), output)
+
+
+def etag(kind, query, request):
+    """ETag fuerte de la respuesta, o None si la consulta no es válida (la vista responde el error)."""
+    # Se calcula una vez por pedido: también decide si hay Last-Modified
+    cached = getattr(request, '_climate_etag', False)
+    if cached is not False:
+        return cached
+    try:
+        normalized = query(request)
+    except Exception:
+        normalized = (None,)
+    value = None
+    if normalized[0] is not None:
+        raw = repr((kind, normalized, catalog.data_version()))
+        value = '"' + hashlib.sha1(raw.encode()).hexdigest()[:20] + '"'
+    request._climate_etag = value
+    return value
+
+
+def last_modified():
+    """Fecha del archivo más nuevo de data_bsas."""
+    sources = catalog.source_files()
+    if not sources:
+        return None
+    newest = max(mtime for _, mtime in sources.values())
+    return datetime.fromtimestamp(newest / 1e9, tz=timezone.utc)
+
+
+def cacheable(kind, query):
+    """Decorador: ETag/Last-Modified, 304 ante If-None-Match/If-Modified-Since y Cache-Control.
+
+    Sin ETag (consulta inválida) tampoco hay Last-Modified, y solo las
+    respuestas 200/304 con algún validador quedan cacheables.
+    """
+    def decorator(view):
+        def last_modified_func(request, *args, **kwargs):
+            return last_modified() if etag(kind, query, request) else None
+
+        conditional = condition(etag_func=lambda request, *args, **kwargs: etag(kind, query, request),
+                                last_modified_func=last_modified_func)(view)
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            validated = response.has_header('ETag') or response.has_header('Last-Modified')
+            if response.status_code in (200, 304) and validated:
+                patch_cache_control(response, public=True, max_age=_setting('HTTP_CACHE_MAX_AGE', 3600))
+                patch_vary_headers(response, ('Accept',))
+            else:
+                for header in ('ETag', 'Last-Modified'):
+                    if response.has_header(header):
+                        del response[header]
+            return response
+        return wrapper
+    return decorator
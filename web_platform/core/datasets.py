@@ -0,0 +1,65 @@
+import os
+import time
+import threading
+
+from . import metrics
+
+
+class DatasetPool:
+    """Datasets NetCDF abiertos una sola vez y compartidos entre hilos.
+
+    Cada archivo se carga completo en memoria (solo lectura) la primera vez que
+    se pide, con una clave (ruta, mtime): si el archivo cambia en disco se vuelve
+    a leer. El lock es por archivo y solo cubre la carga, así que los pedidos
+    concurrentes leen en paralelo sin esperar a los demás.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def _lock_for(self, key):
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def derive(self, path, name, build):
+        """Resultado de build(dataset) cacheado por (ruta, mtime, name)."""
+        return self.cached(path, name, lambda p: build(self.get(p)))
+
+    def cached(self, path, name, build):
+        """Resultado de build(ruta) cacheado por (ruta, mtime, name); name=None es el dataset."""
+        mtime = os.stat(path).st_mtime_ns
+        key = (path, name)
+        entry = self._entries.get(key)
+        kind = 'dataset' if name is None else (name[0] if isinstance(name, tuple) else name)
+        if entry is not None and entry[0] == mtime:
+            metrics.inc('climate_dataset_pool_total', kind=kind, result='hit')
+            return entry[1]
+        t0 = time.perf_counter()
+        with self._lock_for(key):
+            # Espera del lock: otro hilo cargando el mismo archivo
+            metrics.record('pool_wait', time.perf_counter() - t0)
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != mtime:
+                metrics.inc('climate_dataset_pool_total', kind=kind, result='load')
+                value = build(path) if name is not None else self._open(path)
+                entry = (mtime, value)
+                self._entries[key] = entry
+        return entry[1]
+
+    def get(self, path):
+        return self.cached(path, None, None)
+
+    def _open(self, path):
+        import xarray as xr
+        with metrics.span('dataset_open'), xr.open_dataset(path, engine='netcdf4') as ds:
+            return ds.load()
+
+    def clear(self):
+        with self._guard:
+            self._entries.clear()
+            self._locks.clear()
+
+
+pool = DatasetPool()
@@ -0,0 +1,65 @@
+"""Ensamble multimodelo ponderado por skill del hindcast.
+
+Cada centro aporta su pronóstico operativo calibrado (menos su bias) con peso
+proporcional a su r positivo; los modelos con r <= 0 no pesan, salvo que
+ninguno tenga skill positivo (ahí pesan igual todos los disponibles). El
+spread es el desvío estándar ponderado de los pronósticos calibrados.
+
+Las entradas son arrays (modelo, ...) que ya están en memoria —el skill de
+la celda o de la grilla y OperationalForecasts—, así que todos los modelos y
+leads se combinan en una sola operación, sin abrir archivos.
+"""
+import numpy as np
+
+STATS = ['r', 'bias', 'p20', 'p50', 'p80']
+
+
+def weights(r, available):
+    """Pesos normalizados (modelo, ...): r positivo, o iguales si ningún modelo tiene r > 0."""
+    r = np.where(available, np.nan_to_num(r), 0.0)
+    raw = np.where(available, np.clip(r, 0, None), 0.0)
+    fallback = raw.sum(axis=0) == 0
+    raw = np.where(fallback, available.astype(float), raw)
+    total = raw.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(total > 0, raw / total, 0.0)
+
+
+def blend(forecast, stats, require_forecast=True):
+    """Pronóstico combinado de arrays (modelo, ...).
+
+    forecast: pronóstico operativo en mm/mes, NaN donde el modelo no lo tiene.
+    stats: {'r', 'bias', 'p20', 'p50', 'p80'} del hindcast, NaN sin skill reportable.
+    Devuelve {'forecast', 'spread', 'anomaly', 'r', 'bias', 'p20', 'p50', 'p80', 'models'} sobre (...)
+    más 'weights' (modelo, ...); NaN donde ningún modelo aplica. Con
+    require_forecast=False (meses base sin pronóstico emitido) pesan todos los
+    modelos con skill: r, bias y percentiles salen igual y forecast, spread y
+    anomaly quedan en NaN.
+    """
+    forecast = np.asarray(forecast, dtype=np.float64)
+    stats = {s: np.asarray(stats[s], dtype=np.float64) for s in STATS}
+    available = np.isfinite(stats['r']) & np.isfinite(stats['bias'])
+    if require_forecast:
+        available &= np.isfinite(forecast)
+    w = weights(stats['r'], available)
+    calibrated = np.where(available, forecast - np.nan_to_num(stats['bias']), 0.0)
+    count = available.sum(axis=0)
+    some = count > 0
+
+    def weighted(values):
+        return np.where(some, (w * np.where(available, np.nan_to_num(values), 0.0)).sum(axis=0), np.nan)
+
+    mean = weighted(calibrated)
+    spread = np.sqrt(np.clip(weighted((calibrated - mean) ** 2), 0, None))
+    if not require_forecast:
+        mean = np.full(mean.shape, np.nan)
+        spread = np.full(spread.shape, np.nan)
+    result = {s: weighted(stats[s]) for s in STATS}
+    result.update({
+        "forecast": mean,
+        "spread": spread,
+        "anomaly": mean - result['p50'],
+        "models": count,
+        "weights": w,
+    })
+    return result
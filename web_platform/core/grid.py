@@ -0,0 +1,113 @@
+import numpy as np
+
+from .catalog import INTERPOLATIONS, interpolation  # noqa: F401
+
+
+def nearest_index(coords, values):
+    """Índice de la celda más cercana para cada valor, como .sel(method='nearest').
+
+    Solo usa NumPy. Ante un empate (punto justo en el borde entre dos celdas)
+    gana la coordenada de mayor valor, igual que pandas/xarray, sin importar
+    si el eje es creciente o decreciente.
+    """
+    coords = np.asarray(coords, dtype=float)
+    values = np.atleast_1d(np.asarray(values, dtype=float))
+    dist = np.abs(coords[None, :] - values[:, None])
+    best = dist == dist.min(axis=1, keepdims=True)
+    return np.argmax(np.where(best, coords[None, :], -np.inf), axis=1)
+
+
+class Axis:
+    """Un eje de coordenadas ordenado una vez, para ubicar valores por búsqueda binaria."""
+
+    def __init__(self, coords):
+        self.coords = np.asarray(coords, dtype=float)
+        self.order = np.argsort(self.coords, kind='stable')
+        self.sorted = self.coords[self.order]
+        step = np.diff(self.sorted)
+        self.half = float(np.median(step)) / 2 if len(step) else 0.0
+
+    def contains(self, values):
+        # Dentro del dominio: a no más de media celda de la primera o la última coordenada
+        tol = self.half * (1 + 1e-9)
+        return (values >= self.sorted[0] - tol) & (values <= self.sorted[-1] + tol)
+
+    def nearest(self, values):
+        """Igual que nearest_index (empates a la coordenada mayor) en O(log n) por valor."""
+        if len(self.sorted) == 1:
+            return np.zeros(values.shape, dtype=int)
+        pos = np.clip(np.searchsorted(self.sorted, values), 1, len(self.sorted) - 1)
+        pick = np.where(values - self.sorted[pos - 1] < self.sorted[pos] - values, pos - 1, pos)
+        return self.order[pick]
+
+    def bracket(self, values):
+        """(i0, i1, t): coordenadas vecinas y fracción hacia i1; fuera del rango se usa el borde."""
+        if len(self.sorted) == 1:
+            zeros = np.zeros(values.shape, dtype=int)
+            return zeros, zeros, np.zeros(values.shape)
+        pos = np.clip(np.searchsorted(self.sorted, values), 1, len(self.sorted) - 1)
+        lo, hi = self.sorted[pos - 1], self.sorted[pos]
+        t = np.clip((values - lo) / (hi - lo), 0, 1)
+        return self.order[pos - 1], self.order[pos], t
+
+
+class GridIndex:
+    """Índice espacial de una grilla (lat, lon), armado una vez por dataset.
+
+    Ubica puntos con una búsqueda binaria por eje y devuelve índices enteros
+    (y pesos, para bilineal) con los que se indexan directamente los arrays
+    (lat, lon, ...) del store. Un punto a más de media celda del borde queda
+    fuera del dominio: sample() devuelve NaN en vez de la celda del borde.
+    """
+
+    def __init__(self, latitude, longitude):
+        self.lat = Axis(latitude)
+        self.lon = Axis(longitude)
+
+    def _points(self, lats, lons):
+        return np.atleast_1d(np.asarray(lats, dtype=float)), np.atleast_1d(np.asarray(lons, dtype=float))
+
+    def inside(self, lats, lons):
+        lats, lons = self._points(lats, lons)
+        return self.lat.contains(lats) & self.lon.contains(lons)
+
+    def nearest(self, lats, lons):
+        """(ilat, ilon, inside) de la celda más cercana a cada punto."""
+        lats, lons = self._points(lats, lons)
+        return self.lat.nearest(lats), self.lon.nearest(lons), self.lat.contains(lats) & self.lon.contains(lons)
+
+    def bilinear(self, lats, lons):
+        """(ilat, ilon, pesos) de las cuatro celdas vecinas, (punto, 4) cada uno, e inside."""
+        lats, lons = self._points(lats, lons)
+        i0, i1, a = self.lat.bracket(lats)
+        j0, j1, b = self.lon.bracket(lons)
+        ilat = np.stack([i0, i0, i1, i1], axis=-1)
+        ilon = np.stack([j0, j1, j0, j1], axis=-1)
+        weights = np.stack([(1 - a) * (1 - b), (1 - a) * b, a * (1 - b), a * b], axis=-1)
+        return ilat, ilon, weights, self.lat.contains(lats) & self.lon.contains(lons)
+
+    def sample(self, values, lats, lons, method='nearest'):
+        """values (lat, lon, ...) en cada punto: (punto, ...), NaN fuera del dominio."""
+        if method == 'bilinear':
+            ilat, ilon, weights, inside = self.bilinear(lats, lons)
+            corners = np.asarray(values[ilat, ilon], dtype=np.float64)
+            weights = weights.reshape(weights.shape + (1,) * (corners.ndim - 2))
+            # Esquinas sin dato (NaN) no pesan; se renormaliza con las demás
+            present = np.isfinite(corners)
+            total = np.where(present, weights, 0).sum(axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out = np.where(present, corners * weights, 0).sum(axis=1) / total
+        else:
+            ilat, ilon, inside = self.nearest(lats, lons)
+            out = np.asarray(values[ilat, ilon])
+        if inside.all():
+            return out
+        return np.where(inside.reshape(inside.shape + (1,) * (out.ndim - 1)), out, np.nan)
+
+    def sample_grid(self, values, lats, lons, method='nearest'):
+        """values (lat, lon, ...) en cada centro de la grilla lats x lons: (lat, lon, ...)."""
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        mesh_lat, mesh_lon = np.meshgrid(lats, lons, indexing='ij')
+        out = self.sample(values, mesh_lat.ravel(), mesh_lon.ravel(), method)
+        return out.reshape((len(lats), len(lons)) + out.shape[1:])
@@ -0,0 +1,260 @@
+"""Cola de análisis en segundo plano sobre la base de Django (sin broker externo).
+
+POST /api/jobs guarda un AnalysisJob y responde enseguida con su id. Lo toman
+los hilos trabajadores del proceso (JOB_WORKERS) o `manage.py run_jobs`,
+reclamándolo con un UPDATE condicional, así varios procesos comparten la
+misma tabla sin tomar dos veces un job. Cada modelo que termina deja su
+resultado parcial en `progress`; el cliente consulta GET /api/jobs/<id> o
+recibe los cambios por server-sent events en /api/jobs/<id>/events.
+
+Un pedido con la misma clave (celda ERA5, mes y huella de data_bsas) que un job
+en cola, corriendo o terminado devuelve ese job: el resultado se guarda una vez.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from datetime import timedelta
+
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+KINDS = ('skill', 'forecast', 'grid')
+FINISHED = ('done', 'error')
+
+_wake = threading.Event()
+_workers = {"pid": None, "threads": []}
+_workers_lock = threading.Lock()
+
+
+def _setting(name, default):
+    from django.conf import settings
+    return getattr(settings, name, default)
+
+
+def parse(kind, params):
+    """Parámetros normalizados del pedido; ValueError si no son válidos."""
+    if kind in ('skill', 'forecast'):
+        raw_month = params.get('month', '1' if kind == 'skill' else 'auto')
+        parsed = {
+            "lat": float(params['lat']),
+            "lon": float(params['lon']),
+            "month": 'auto' if raw_month == 'auto' else int(raw_month),
+        }
+        if kind == 'forecast':
+            parsed["mode"] = str(params.get('mode', 'best')).lower()
+            if parsed["mode"] not in ('best', 'ensemble'):
+                raise ValueError("mode must be 'best' or 'ensemble'")
+        return parsed
+    if kind == 'grid':
+        raw_month = params.get('month', 'auto')
+        parsed = {
+            "model": str(params.get('model', 'best')).lower(),
+            "month": 'auto' if raw_month == 'auto' else int(raw_month),
+            "lead": int(params.get('lead', 1)),
+        }
+        if not 1 <= parsed['lead'] <= 6 or parsed['month'] not in ['auto', *range(1, 13)]:
+            raise ValueError("month must be 1-12 and lead 1-6")
+        return parsed
+    raise ValueError(f"kind must be one of {', '.join(KINDS)}")
+
+
+def job_key(kind, params):
+    from . import analysis
+
+    if kind == 'skill':
+        key = analysis.skill_key(params['lat'], params['lon'], params['month'])
+    elif kind == 'forecast':
+        key = analysis.forecast_key(params['lat'], params['lon'], params.get('mode', 'best'))
+    else:
+        key = ('grid', params['model'], analysis.resolve_base_month(params['month']), params['lead'],
+               analysis.data_version())
+    return hashlib.sha1(repr(key).encode()).hexdigest()
+
+
+def submit(kind, params):
+    """(job, creado): un job vivo con la misma clave se reutiliza en vez de encolar otro."""
+    from .models import AnalysisJob
+
+    params = parse(kind, params)
+    key = job_key(kind, params)
+    while True:
+        existing = AnalysisJob.objects.filter(key=key).exclude(status='error').first()
+        if existing is not None:
+            return existing, False
+        try:
+            with transaction.atomic():
+                job = AnalysisJob.objects.create(kind=kind, params=params, key=key)
+            break
+        except IntegrityError:
+            continue  # otro pedido lo creó entre la consulta y el insert
+    ensure_workers()
+    _wake.set()
+    return job, True
+
+
+def describe(job, with_result=True):
+    data = {
+        "id": str(job.id),
+        "kind": job.kind,
+        "params": job.params,
+        "status": job.status,
+        "progress": job.progress,
+        "error": job.error or None,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if with_result:
+        data["result"] = job.result
+    return data
+
+
+def _execute(job):
+    from . import analysis
+    from . import maps
+    from .models import AnalysisJob
+
+    params = job.params
+    partial = {}
+
+    def report(model_name, done, total, scores):
+        acc, bias = scores[0]
+        partial[model_name] = {"acc": acc, "bias": bias}
+        job.progress = {"done": done, "total": total, "partial": dict(partial)}
+        AnalysisJob.objects.filter(pk=job.pk).update(progress=job.progress)
+
+    if job.kind == 'skill':
+        return analysis.get_skill_matrix(params['lat'], params['lon'], params['month'], progress=report)
+    if job.kind == 'forecast' and params.get('mode') == 'ensemble':
+        return analysis.get_ensemble_forecast(params['lat'], params['lon'], progress=report)
+    if job.kind == 'forecast':
+        return analysis.get_best_models(params['lat'], params['lon'], params['month'], progress=report)
+    month = analysis.resolve_base_month(params['month'])
+    return maps.to_json(maps.grid_map(params['model'], month, params['lead']))
+
+
+def claim(worker):
+    """El job en cola más viejo, marcado como corriendo para `worker`; None si no hay."""
+    from .models import AnalysisJob
+
+    while True:
+        job = AnalysisJob.objects.filter(status='queued').order_by('created_at').first()
+        if job is None:
+            return None
+        claimed = AnalysisJob.objects.filter(pk=job.pk, status='queued').update(
+            status='running', started_at=timezone.now(), worker=worker)
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def run_one(worker='inline'):
+    """Ejecuta un job de la cola; False si estaba vacía."""
+    from .models import AnalysisJob
+
+    job = claim(worker)
+    if job is None:
+        return False
+    try:
+        result = _execute(job)
+        if isinstance(result, dict) and "error" in result:
+            raise ValueError(result["error"])
+        fields = {"status": 'done', "result": result, "error": ''}
+    except Exception as e:
+        print(f"Job {job.id} ({job.kind}) falló: {e}")
+        fields = {"status": 'error', "error": str(e)}
+    AnalysisJob.objects.filter(pk=job.pk).update(finished_at=timezone.now(), **fields)
+    return True
+
+
+def run_pending(worker='inline'):
+    """Vacía la cola en este hilo; devuelve cuántos jobs ejecutó."""
+    count = 0
+    while run_one(worker):
+        count += 1
+    return count
+
+
+def housekeeping():
+    """Reencola jobs de trabajadores caídos y borra resultados vencidos."""
+    from .models import AnalysisJob
+
+    now = timezone.now()
+    stale = now - timedelta(seconds=_setting('JOB_STALE_AFTER', 600))
+    AnalysisJob.objects.filter(status='running', started_at__lt=stale).update(status='queued', worker='')
+    expired = now - timedelta(seconds=_setting('JOB_RESULT_TTL', 86400))
+    AnalysisJob.objects.filter(status__in=FINISHED, finished_at__lt=expired).delete()
+
+
+def worker_loop(name, stop=None):
+    poll = _setting('JOB_POLL_INTERVAL', 1.0)
+    while stop is None or not stop.is_set():
+        close_old_connections()
+        try:
+            if run_one(name):
+                continue
+            housekeeping()
+        except Exception as e:
+            print(f"Cola de jobs ({name}): {e}")
+        _wake.wait(poll)
+        _wake.clear()
+
+
+def ensure_workers():
+    """Arranca JOB_WORKERS hilos trabajadores en este proceso (una vez por proceso)."""
+    count = int(_setting('JOB_WORKERS', 2))
+    with _workers_lock:
+        # Después de un fork (gunicorn --preload) los hilos del padre no existen
+        if _workers["pid"] != os.getpid():
+            _workers.update(pid=os.getpid(), threads=[])
+        alive = [t for t in _workers["threads"] if t.is_alive()]
+        for i in range(len(alive), count):
+            thread = threading.Thread(target=worker_loop, args=(f"{os.getpid()}-{i}",), name=f'job-worker-{i}',
+                                      daemon=True)
+            thread.start()
+            alive.append(thread)
+        _workers["threads"] = alive
+
+
+def start_on_request(sender=None, **kwargs):
+    """request_started: arranca los trabajadores con el primer pedido del proceso.
+
+    Así los jobs que un reinicio dejó en 'queued' (o en 'running', que
+    housekeeping reencola) se retoman sin esperar al próximo submit. En los
+    pedidos siguientes solo se compara el pid.
+    """
+    if _workers["pid"] != os.getpid() and int(_setting('JOB_WORKERS', 2)) > 0:
+        ensure_workers()
+
+
+def events(job_id, poll=0.25, timeout=None):
+    """Server-sent events del job: 'progress' en cada cambio y 'done'/'error' al terminar.
+
+    El stream se cierra a los JOB_EVENTS_TIMEOUT segundos (muy por debajo del
+    timeout de gunicorn) para no retener un worker sync; el campo 'retry' hace
+    que EventSource reconecte solo y retome el progreso.
+    """
+    from .models import AnalysisJob
+
+    timeout = timeout if timeout is not None else _setting('JOB_EVENTS_TIMEOUT', 25)
+    deadline = time.monotonic() + timeout
+    last = None
+    yield f"retry: {_setting('JOB_EVENTS_RETRY_MS', 1000)}\n\n"
+    while True:
+        job = AnalysisJob.objects.filter(pk=job_id).first()
+        if job is None:
+            yield f"event: error\ndata: {json.dumps({'error': 'job not found'})}\n\n"
+            return
+        if job.status in FINISHED:
+            yield f"event: {job.status}\ndata: {json.dumps(describe(job))}\n\n"
+            return
+        state = (job.status, job.progress)
+        if state != last:
+            last = state
+            yield f"event: progress\ndata: {json.dumps(describe(job, with_result=False))}\n\n"
+        if time.monotonic() > deadline:
+            # Cierre sin evento de error: EventSource reconecta tras 'retry'
+            return
+        time.sleep(poll)
@@ -0,0 +1,73 @@
+import os
+import json
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from core import benchmark, store
+
+
+class Command(BaseCommand):
+    help = ("Benchmark de skill (frío/caliente), smart forecast, batch y carga concurrente "
+            "sobre NetCDF sintéticos o sobre data_bsas; guarda el resultado en JSON")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grid', default='37x31', help="Grilla ERA5 sintética LATxLON (ej. 37x31)")
+        parser.add_argument('--models', type=int, default=4, help="Cantidad de modelos sintéticos")
+        parser.add_argument('--years', type=int, default=24, help="Años de hindcast sintético")
+        parser.add_argument('--data-dir', help="Medir sobre este directorio real en vez de datos sintéticos")
+        parser.add_argument('--ingest', action='store_true', help="Normalizar al store antes de medir")
+        parser.add_argument('--points', type=int, default=20, help="Consultas puntuales en caliente")
+        parser.add_argument('--batch', type=int, default=500, help="Puntos por consulta batch")
+        parser.add_argument('--threads', default='1,4', help="Hilos para la carga concurrente (ej. 1,4,8)")
+        parser.add_argument('--requests', type=int, default=64, help="Pedidos por corrida concurrente")
+        parser.add_argument('--memory-scaling', help="Grillas para comparar la memoria pico del cubo en un bloque "
+                                                     "y por bloques (ej. 37x31,74x62,148x124)")
+        parser.add_argument('--memory-mb', type=float, default=64, help="Presupuesto por bloque para --memory-scaling")
+        parser.add_argument('--output', help="Archivo JSON de salida (por defecto, solo stdout)")
+
+    def handle(self, *args, **options):
+        n_lat, n_lon = (int(n) for n in options['grid'].lower().split('x'))
+        workdir = tempfile.mkdtemp(prefix='bench_analysis_')
+        try:
+            data_dir = options['data_dir']
+            if not data_dir:
+                data_dir = os.path.join(workdir, 'data')
+                benchmark.make_fixtures(data_dir, n_lat, n_lon, options['models'], years=options['years'])
+            store_dir = os.path.join(workdir, 'store')
+            # Sin cubo ni cache de resultados: se mide el camino de cálculo
+            with override_settings(CLIMATE_DATA_DIR=data_dir, CLIMATE_STORE_DIR=store_dir,
+                                   SKILL_CUBE_DIR=os.path.join(workdir, 'skill_cube')):
+                if options['ingest']:
+                    # Store en el directorio temporal: no toca el catálogo de data_dir
+                    store.ingest(data_dir, store_dir)
+                timings = benchmark.run(points=options['points'], batch=options['batch'],
+                                        threads=[int(t) for t in options['threads'].split(',')],
+                                        requests=options['requests'])
+                benchmark._reset()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        report = {
+            "config": {
+                "data": options['data_dir'] or "synthetic",
+                "grid": [n_lat, n_lon] if not options['data_dir'] else None,
+                "models": options['models'] if not options['data_dir'] else None,
+                "years": options['years'] if not options['data_dir'] else None,
+                "store": options['ingest'],
+            },
+            "environment": benchmark.environment(),
+            "timings": timings,
+        }
+        if options['memory_scaling']:
+            grids = [tuple(int(n) for n in g.lower().split('x')) for g in options['memory_scaling'].split(',')]
+            report["memory"] = benchmark.memory_scaling(grids, options['memory_mb'], options['models'],
+                                                        options['years'])
+        text = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(text + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Resultado guardado en {options['output']}"))
+        self.stdout.write(text)
@@ -0,0 +1,55 @@
+import io
+import time
+import random
+import threading
+from contextlib import redirect_stdout
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from core.analysis import compute_skill_matrix
+from core.datasets import pool
+
+
+class Command(BaseCommand):
+    help = "Mide el throughput de compute_skill_matrix sobre data_bsas según la cantidad de hilos"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', default='1,2,4,8', help="Cantidades de hilos a probar (ej. 1,2,4,8)")
+        parser.add_argument('--requests', type=int, default=64, help="Pedidos por corrida")
+        parser.add_argument('--serialize', action='store_true',
+                            help="Emula el file_lock global anterior (un pedido por vez, reabriendo archivos)")
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        points = [(rng.uniform(-42, -33), rng.uniform(-64, -56.5), rng.randint(1, 12))
+                  for _ in range(options['requests'])]
+        global_lock = threading.Lock()
+
+        def one(point):
+            if options['serialize']:
+                with global_lock:
+                    pool.clear()
+                    return compute_skill_matrix(*point)
+            return compute_skill_matrix(*point)
+
+        with redirect_stdout(io.StringIO()):
+            one(points[0])  # precarga del pool
+
+        self.stdout.write(f"{'hilos':>6} {'req/s':>10} {'p50 ms':>10}")
+        for threads in [int(t) for t in options['threads'].split(',')]:
+            latencies = []
+
+            def timed(point):
+                t0 = time.perf_counter()
+                one(point)
+                latencies.append(time.perf_counter() - t0)
+
+            with redirect_stdout(io.StringIO()):
+                t0 = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=threads) as executor:
+                    list(executor.map(timed, points))
+                elapsed = time.perf_counter() - t0
+            latencies.sort()
+            p50 = latencies[len(latencies) // 2] * 1000
+            self.stdout.write(f"{threads:>6} {len(points) / elapsed:>10.1f} {p50:>10.1f}")
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.skill_cube import build_skill_cube
+
+
+class Command(BaseCommand):
+    help = "Precalcula el cubo de skill (r, bias, percentiles) para toda la grilla de ERA5"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="Directorio destino (por defecto settings.SKILL_CUBE_DIR)")
+        parser.add_argument('--memory-mb', type=float,
+                            help="Memoria por bloque lat/lon en MB (por defecto settings.SKILL_CUBE_MEMORY_MB; 0 = sin bloques)")
+
+    def handle(self, *args, **options):
+        t0 = time.perf_counter()
+
+        def progress(done, total):
+            self.stdout.write(f"Bloque {done}/{total} ({100 * done // total}%) - {time.perf_counter() - t0:.1f} s")
+
+        path = build_skill_cube(out_dir=options['output'], memory_mb=options['memory_mb'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"Cubo de skill generado en {path} ({time.perf_counter() - t0:.1f} s)"))
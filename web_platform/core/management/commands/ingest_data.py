@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import catalog
+from core.store import ingest, store_dir
+
+
+class Command(BaseCommand):
+    help = "Normaliza hindcasts y pronósticos operativos de data_bsas al store canónico (mm/mes, float32)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="Directorio destino (por defecto settings.CLIMATE_STORE_DIR)")
+        parser.add_argument('--force', action='store_true', help="Reescribe también las entradas al día")
+
+    def handle(self, *args, **options):
+        t0 = time.perf_counter()
+        out_dir = options['output'] or store_dir()
+        report = ingest(out_dir=out_dir, force=options['force'])
+        for name, status in report.items():
+            self.stdout.write(f"{name}: {status}")
+        manifest = catalog.update_manifest(store_directory=out_dir)
+        self.stdout.write(f"Catálogo: {len(manifest['datasets'])} datasets, "
+                          f"último operativo {manifest['latest_operational']}")
+        self.stdout.write(self.style.SUCCESS(f"Store en {out_dir} ({time.perf_counter() - t0:.1f} s)"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    help = "Procesa la cola de análisis en segundo plano (/api/jobs) sin broker externo"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Vaciar la cola y terminar")
+        parser.add_argument('--name', default='run_jobs', help="Nombre del trabajador (queda en cada job)")
+
+    def handle(self, *args, **options):
+        if options['once']:
+            count = jobs.run_pending(options['name'])
+            self.stdout.write(self.style.SUCCESS(f"{count} jobs ejecutados"))
+            return
+        self.stdout.write(f"Esperando jobs ({options['name']})... Ctrl+C para salir")
+        try:
+            jobs.worker_loop(options['name'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,161 @@
+"""Mapas de skill y pronóstico calibrado sobre toda la grilla de ERA5 (AREA_BSAS)."""
+import json
+import struct
+
+import numpy as np
+
+from . import pairing
+from . import skill_cube
+from . import store
+
+FIELDS = ['best_model', 'r', 'bias', 'anomaly']
+ENSEMBLE_FIELDS = FIELDS + ['spread']
+MAGIC = b'CVG1'
+
+
+def skill_grid(base_month):
+    # Cubo precalculado si está al día; si no, una pasada vectorizada sobre la grilla
+    cube = skill_cube.load_skill_cube()
+    if cube is not None and cube.is_fresh():
+        return cube.grid(base_month)
+    return skill_cube.compute_grid(base_month)
+
+
+def operational_grid(models, lats, lons, lead):
+    """Pronóstico operativo en mm (modelo, lat, lon) sobre la grilla, NaN si el modelo no lo tiene."""
+    from . import analysis
+
+    op_year, op_month = analysis.get_latest_op_date()
+    if not op_year:
+        return np.full((len(models), len(lats), len(lons)), np.nan), None
+    return store.operational_forecasts(op_year, op_month).field(models, lead), int(op_month)
+
+
+def grid_map(model, base_month, lead):
+    """Campos de la grilla para un modelo (o 'best' / 'ensemble') en un mes base y lead.
+
+    best_model es el índice en `models` (NaN si ninguno aplica); anomaly es el
+    pronóstico operativo calibrado (menos bias) respecto de p50, y solo existe
+    cuando el mes base es el de emisión del último pronóstico operativo (en
+    los demás meses 'best' elige por r y anomaly queda en NaN). Con
+    'ensemble' los campos son los del ensamble ponderado (best_model es el
+    modelo de mayor peso) más su spread; sin pronóstico emitido para el mes
+    base se pondera por skill y solo r y bias tienen valor.
+    """
+    grid = skill_grid(base_month)
+    models = list(grid["models"])
+    lats = np.asarray(grid["latitude"])
+    lons = np.asarray(grid["longitude"])
+    if model not in ('best', 'ensemble') and model not in models:
+        raise ValueError(f"unknown model '{model}'")
+
+    L = lead - 1
+    # Celdas fuera de la grilla de un modelo tienen bias NaN: quedan sin skill, como get_skill_matrix
+    valid = (np.asarray(grid["n"])[:, L] > pairing.MIN_PAIRS)[:, None, None] & np.isfinite(grid["stats"]["bias"][:, L])
+    r = np.where(valid, grid["stats"]["r"][:, L], np.nan)
+    bias = np.where(valid, grid["stats"]["bias"][:, L], np.nan)
+    p50 = np.where(valid, grid["stats"]["p50"][:, L], np.nan)
+
+    forecast, op_month = operational_grid(models, lats, lons, lead)
+    has_forecast = op_month == int(base_month)
+    if not has_forecast:
+        forecast[:] = np.nan
+    anomaly = (forecast - bias) - p50
+
+    if model == 'ensemble':
+        from . import ensemble
+        stats = {s: np.where(valid, grid["stats"][s][:, L], np.nan) for s in ensemble.STATS}
+        blended = ensemble.blend(forecast, stats, require_forecast=has_forecast) if models else None
+        if blended is None:
+            fields = {name: np.full((len(lats), len(lons)), np.nan) for name in ENSEMBLE_FIELDS}
+        else:
+            top = np.argmax(blended["weights"], axis=0)
+            fields = {"best_model": np.where(blended["models"] > 0, top, np.nan), "r": blended["r"],
+                      "bias": blended["bias"], "anomaly": blended["anomaly"], "spread": blended["spread"]}
+    elif model == 'best':
+        # Igual que get_best_models: mayor r entre los modelos con pronóstico operativo; en los
+        # demás meses base no hay pronóstico y se elige por r entre los modelos con skill
+        ranked = np.where(np.isnan(anomaly) if has_forecast else ~valid, -np.inf, r)
+        if not models:
+            ranked = np.full((1, len(lats), len(lons)), -np.inf)
+        best = np.argmax(ranked, axis=0)[None]
+        has_best = np.isfinite(np.take_along_axis(ranked, best, axis=0)[0])
+
+        def pick(values):
+            if not models: return np.full(has_best.shape, np.nan)
+            return np.where(has_best, np.take_along_axis(values, best, axis=0)[0], np.nan)
+
+        fields = {"best_model": np.where(has_best, best[0], np.nan), "r": pick(r), "bias": pick(bias),
+                  "anomaly": pick(anomaly)}
+    else:
+        k = models.index(model)
+        fields = {"best_model": np.where(valid[k], float(k), np.nan), "r": r[k], "bias": bias[k],
+                  "anomaly": anomaly[k]}
+
+    return {
+        "model": model,
+        "models": models,
+        "base_month": int(base_month),
+        "lead": lead,
+        "latitude": lats.tolist(),
+        "longitude": lons.tolist(),
+        "fields": {name: np.asarray(fields[name], dtype=np.float32) for name in fields},
+    }
+
+
+def _header(result):
+    header = {k: v for k, v in result.items() if k != 'fields'}
+    header.update({"fields": list(result["fields"]), "shape": [len(result["latitude"]), len(result["longitude"])],
+                   "dtype": "float32", "byteorder": "little"})
+    return header
+
+
+def encode_binary(result):
+    """b'CVG1' + uint32 largo del encabezado JSON + encabezado + un float32 (lat, lon) por campo."""
+    header = json.dumps(_header(result), separators=(',', ':')).encode()
+    body = b''.join(values.astype('<f4').tobytes() for values in result["fields"].values())
+    return MAGIC + struct.pack('<I', len(header)) + header + body
+
+
+def decode_binary(blob):
+    if blob[:4] != MAGIC:
+        raise ValueError("not a CVG1 grid")
+    (size,) = struct.unpack('<I', blob[4:8])
+    header = json.loads(blob[8:8 + size])
+    shape = tuple(header["shape"])
+    count = shape[0] * shape[1]
+    data = np.frombuffer(blob[8 + size:], dtype='<f4')
+    header["fields"] = {name: data[i * count:(i + 1) * count].reshape(shape) for i, name in enumerate(header["fields"])}
+    return header
+
+
+def _nullable(values):
+    return [None if np.isnan(v) else round(float(v), 4) for v in values]
+
+
+def to_json(result):
+    data = _header(result)
+    del data["dtype"], data["byteorder"]
+    data["fields"] = {name: [_nullable(row) for row in values] for name, values in result["fields"].items()}
+    return data
+
+
+def to_geojson(result):
+    # Un polígono por celda, listo para pintar en Leaflet
+    lats = np.asarray(result["latitude"])
+    lons = np.asarray(result["longitude"])
+    half_lat = abs(lats[1] - lats[0]) / 2 if len(lats) > 1 else 0.125
+    half_lon = abs(lons[1] - lons[0]) / 2 if len(lons) > 1 else 0.125
+    features = []
+    for i, lat in enumerate(lats):
+        for j, lon in enumerate(lons):
+            props = {name: _nullable([values[i, j]])[0] for name, values in result["fields"].items()}
+            if props["best_model"] is not None:
+                props["model_name"] = result["models"][int(props["best_model"])]
+            ring = [[lon - half_lon, lat - half_lat], [lon + half_lon, lat - half_lat],
+                    [lon + half_lon, lat + half_lat], [lon - half_lon, lat + half_lat],
+                    [lon - half_lon, lat - half_lat]]
+            features.append({"type": "Feature", "properties": props,
+                             "geometry": {"type": "Polygon", "coordinates": [[[float(x), float(y)] for x, y in ring]]}})
+    meta = {k: v for k, v in _header(result).items() if k not in ('latitude', 'longitude', 'dtype', 'byteorder', 'shape')}
+    return {"type": "FeatureCollection", "properties": meta, "features": features}
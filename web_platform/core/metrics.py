@@ -0,0 +1,231 @@
+"""Tiempos por etapa del análisis y contadores, en formato de texto de Prometheus.
+
+Cada etapa (espera del lock del pool, apertura del NetCDF, normalización,
+media del ensamble, lectura del store, extracción de puntos, emparejamiento y
+estadísticos) se mide con span(); scope(model=...) agrega la etiqueta del
+modelo a todo lo que se mide adentro. Los tiempos van a histogramas del
+proceso (GET /metrics) y, dentro de una vista con instrument(), a la traza del
+pedido que se puede devolver como header Server-Timing.
+
+Solo usa la biblioteca estándar: las vistas lo importan sin cargar NumPy.
+Los valores son por proceso (cada worker de gunicorn expone los suyos).
+"""
+import time
+import bisect
+import inspect
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Límites superiores (segundos) de los histogramas
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    "climate_stage_seconds": ("histogram", "Tiempo por etapa del análisis"),
+    "climate_request_seconds": ("histogram", "Tiempo total por pedido a la API"),
+    "climate_dataset_pool_total": ("counter", "Accesos al pool de datasets: hit (ya en memoria) o load"),
+    "climate_skill_cube_total": ("counter", "Consultas al cubo de skill: hit o miss (se calcula)"),
+    "climate_async_total": ("counter", "Cálculos de las vistas async: submitted, coalesced, busy o timeout"),
+    "climate_result_cache_hits_total": ("counter", "Aciertos del cache de resultados en memoria"),
+    "climate_result_cache_shared_hits_total": ("counter", "Aciertos del cache compartido entre workers"),
+    "climate_result_cache_misses_total": ("counter", "Fallos del cache de resultados"),
+    "climate_result_cache_evictions_total": ("counter", "Entradas descartadas por LRU o TTL"),
+}
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_trace = contextvars.ContextVar('metrics_trace', default=None)
+_scope = contextvars.ContextVar('metrics_scope', default=())
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def observe(name, seconds, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+
+def inc(name, value=1, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+class Trace:
+    """Etapas medidas durante un pedido (puede recibirlas desde varios hilos)."""
+
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds, model=None):
+        with self._lock:
+            self.spans.append((stage, model, seconds))
+
+    def totals(self):
+        # Suma por (etapa, modelo), en el orden en que aparecieron
+        totals = {}
+        with self._lock:
+            for stage, model, seconds in self.spans:
+                totals[(stage, model)] = totals.get((stage, model), 0.0) + seconds
+        return totals
+
+    def server_timing(self, total=None):
+        parts = []
+        for (stage, model), seconds in self.totals().items():
+            desc = f';desc="{model}"' if model else ''
+            parts.append(f"{stage}{desc};dur={seconds * 1000:.2f}")
+        if total is not None:
+            parts.append(f"total;dur={total * 1000:.2f}")
+        return ', '.join(parts)
+
+
+@contextmanager
+def scope(**labels):
+    """Etiquetas (p. ej. model=...) para todos los span() de este bloque."""
+    token = _scope.set(_scope.get() + tuple(labels.items()))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+@contextmanager
+def span(stage):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - t0)
+
+
+def record(stage, seconds):
+    labels = dict(_scope.get())
+    observe('climate_stage_seconds', seconds, stage=stage, **labels)
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(stage, seconds, labels.get('model'))
+
+
+def bind(fn):
+    """fn para correr en otro hilo conservando la traza y las etiquetas actuales."""
+    context = contextvars.copy_context()
+    return functools.partial(context.run, fn)
+
+
+def _server_timing(response, trace, elapsed):
+    from django.conf import settings
+    if getattr(settings, 'METRICS_SERVER_TIMING', False):
+        response['Server-Timing'] = trace.server_timing(elapsed)
+    return response
+
+
+def instrument(endpoint):
+    """Decorador de vistas (sync o async): traza del pedido, histograma y Server-Timing opcional."""
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                trace = Trace()
+                token = _trace.set(trace)
+                t0 = time.perf_counter()
+                try:
+                    response = await view(request, *args, **kwargs)
+                finally:
+                    _trace.reset(token)
+                    elapsed = time.perf_counter() - t0
+                    observe('climate_request_seconds', elapsed, endpoint=endpoint)
+                return _server_timing(response, trace, elapsed)
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            trace = Trace()
+            token = _trace.set(trace)
+            t0 = time.perf_counter()
+            try:
+                response = view(request, *args, **kwargs)
+            finally:
+                _trace.reset(token)
+                elapsed = time.perf_counter() - t0
+                observe('climate_request_seconds', elapsed, endpoint=endpoint)
+            return _server_timing(response, trace, elapsed)
+        return wrapper
+    return decorator
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+
+def render():
+    """Todas las métricas del proceso en formato de texto de Prometheus (0.0.4)."""
+    from . import warmup
+    from .cache import result_cache
+
+    with _lock:
+        histograms = {key: (list(h.counts), h.sum, h.count) for key, h in _histograms.items()}
+        counters = dict(_counters)
+
+    stats = result_cache.stats()
+    for name in ('hits', 'shared_hits', 'misses', 'evictions'):
+        counters[(f'climate_result_cache_{name}_total', ())] = stats[name]
+    lines = []
+    emitted = set()
+
+    def header(name, kind, text):
+        if name not in emitted:
+            emitted.add(name)
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), (counts, total, count) in sorted(histograms.items()):
+        header(name, *HELP.get(name, ("histogram", name)))
+        cumulative = 0
+        for bound, n in zip(BUCKETS + (float('inf'),), counts):
+            cumulative += n
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    for (name, labels), value in sorted(counters.items()):
+        header(name, *HELP.get(name, ("counter", name.replace('_', ' '))))
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    header('climate_result_cache_size', 'gauge', "Entradas en el cache de resultados del proceso")
+    lines.append(f"climate_result_cache_size {stats['size']}")
+    header('climate_ready', 'gauge', "1 si el worker terminó la precarga (o no la usa)")
+    lines.append(f"climate_ready {int(warmup.is_ready())}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,39 @@
+import re
+
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+re_accepts_br = re.compile(r'\bbr\b')
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Brotli si el cliente lo acepta y el paquete `brotli` está instalado; si no, gzip.
+
+    Los streams de eventos (text/event-stream) no se comprimen: cada evento
+    tiene que llegar apenas se emite.
+    """
+
+    brotli_quality = 5
+
+    def process_response(self, request, response):
+        if response.get('Content-Type', '').startswith('text/event-stream'):
+            return response
+        if (response.streaming or len(response.content) < 200 or response.has_header('Content-Encoding')
+                or not re_accepts_br.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))):
+            return super().process_response(request, response)
+        try:
+            import brotli
+        except ImportError:
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(response.content, quality=self.brotli_quality)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
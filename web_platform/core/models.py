@@ -1,3 +1,35 @@
+import uuid
+
 from django.db import models
 
-# Create your models here.
+
+class AnalysisJob(models.Model):
+    """Análisis pedido en segundo plano (skill, smart forecast o grilla); ver core/jobs.py.
+
+    `key` identifica el pedido (celda ERA5, mes y huella de data_bsas): solo puede
+    haber un job vivo (en cola, corriendo o terminado) por clave.
+    """
+    KINDS = [('skill', 'Skill'), ('forecast', 'Smart forecast'), ('grid', 'Grid')]
+    STATUSES = [('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('error', 'Error')]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=16, choices=KINDS)
+    params = models.JSONField()
+    key = models.CharField(max_length=40)
+    status = models.CharField(max_length=8, choices=STATUSES, default='queued', db_index=True)
+    progress = models.JSONField(default=dict)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    worker = models.CharField(max_length=64, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['key'], condition=~models.Q(status='error'), name='unique_live_job_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.id} ({self.status})"
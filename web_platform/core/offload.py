@@ -0,0 +1,93 @@
+"""Ejecución del análisis fuera del event loop para las vistas async (ASGI).
+
+El cálculo (NumPy / lectura de archivos) corre en un pool de hilos acotado
+(ANALYSIS_ASYNC_WORKERS); el loop solo espera el resultado, así que el proceso
+sigue aceptando conexiones mientras corren consultas pesadas. Los pedidos
+idénticos en curso se coalescen: diez clics en la misma celda comparten un
+solo cálculo. Si la espera supera ANALYSIS_ASYNC_TIMEOUT el pedido termina con
+Timeout, pero el cálculo sigue y su resultado queda en el cache.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics
+
+
+class Busy(Exception):
+    """Demasiados cálculos pendientes (ANALYSIS_ASYNC_MAX_PENDING)."""
+
+
+class Timeout(Exception):
+    pass
+
+
+class Offloader:
+    """Pool acotado con coalescencia de pedidos por clave."""
+
+    def __init__(self, workers=4, max_pending=64):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analysis-async')
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def submit(self, key, fn, *args):
+        """Future (concurrent.futures) del cálculo de `key`; reutiliza el que ya esté en curso."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                metrics.inc('climate_async_total', result='coalesced')
+                return future
+            if len(self._inflight) >= self.max_pending:
+                metrics.inc('climate_async_total', result='busy')
+                raise Busy(f"more than {self.max_pending} analyses pending")
+            future = self._executor.submit(metrics.bind(fn), *args)
+            self._inflight[key] = future
+            metrics.inc('climate_async_total', result='submitted')
+        future.add_done_callback(lambda _: self._done(key, future))
+        return future
+
+    def _done(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def run(self, key, fn, *args, timeout=None):
+        """Espera el resultado sin bloquear el loop; Timeout si tarda más de `timeout` s."""
+        future = asyncio.wrap_future(self.submit(key, fn, *args))
+        try:
+            # shield: el vencimiento de un pedido no cancela la espera de los demás
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            metrics.inc('climate_async_total', result='timeout')
+            raise Timeout(f"analysis did not finish within {timeout} s") from None
+
+    def pending(self):
+        with self._lock:
+            return len(self._inflight)
+
+
+_offloader = None
+_offloader_lock = threading.Lock()
+
+
+def offloader():
+    """Offloader del proceso, dimensionado desde settings."""
+    global _offloader
+    from django.conf import settings
+    workers = int(getattr(settings, 'ANALYSIS_ASYNC_WORKERS', 4))
+    max_pending = int(getattr(settings, 'ANALYSIS_ASYNC_MAX_PENDING', 64))
+    with _offloader_lock:
+        if _offloader is None or (_offloader.workers, _offloader.max_pending) != (workers, max_pending):
+            if _offloader is not None:
+                _offloader._executor.shutdown(wait=False)
+            _offloader = Offloader(workers, max_pending)
+        return _offloader
+
+
+async def call(fn, *args):
+    """Trabajo corto (p. ej. ubicar la celda) fuera del loop, sin pasar por el pool acotado."""
+    return await asyncio.get_running_loop().run_in_executor(None, metrics.bind(fn), *args)
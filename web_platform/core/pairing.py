@@ -0,0 +1,215 @@
+"""Motor vectorizado de emparejamiento hindcast / ERA5.
+
+Convención de ejes: el tiempo va adelante y el espacio atrás. Un hindcast es
+(fecha_inicio, lead, *espacio) y ERA5 es (tiempo, *espacio), donde *espacio
+puede ser vacío (un punto), (puntos,) o (lat, lon). Así el mismo código sirve
+para /api/skill, el batch y la grilla completa.
+"""
+import numpy as np
+
+from . import metrics
+
+STATS = ['r', 'bias', 'p20', 'p50', 'p80', 'mean_obs']
+LEADS = 6
+MIN_PAIRS = 10  # Se exigen más de 10 pares año/lead para reportar skill
+PERCENTILES = np.asarray([20, 50, 80]) / 100
+
+
+def year_month(times):
+    months = np.asarray(times, dtype='datetime64[M]')
+    years = months.astype('datetime64[Y]')
+    return years.astype(int) + 1970, (months - years).astype(int) + 1
+
+
+def days_in_month(years, months):
+    start = ((np.asarray(years) - 1970) * 12 + np.asarray(months) - 1).astype('datetime64[M]')
+    return ((start + 1).astype('datetime64[D]') - start.astype('datetime64[D]')).astype(int).astype(float)
+
+
+class MonthIndex:
+    """(año, mes) -> posición en el eje de tiempo de ERA5 por aritmética entera, -1 si falta.
+
+    positions: (años, 12) empezando en first_year.
+    """
+
+    def __init__(self, first_year, positions):
+        self.first_year = int(first_year)
+        self.positions = np.asarray(positions)
+
+    def lookup(self, years, months):
+        row = np.asarray(years) - self.first_year
+        inside = (row >= 0) & (row < len(self.positions))
+        found = self.positions[np.clip(row, 0, max(len(self.positions) - 1, 0)), np.asarray(months) - 1]
+        return np.where(inside, found, -1)
+
+
+def month_positions(times):
+    """MonthIndex con la primera posición de cada (año, mes) de una serie temporal."""
+    years, months = year_month(times)
+    if not len(years):
+        return MonthIndex(0, np.full((0, 12), -1))
+    first_year = years.min()
+    positions = np.full((years.max() - first_year + 1, 12), -1)
+    for pos in range(len(years) - 1, -1, -1):
+        positions[years[pos] - first_year, months[pos] - 1] = pos
+    return MonthIndex(first_year, positions)
+
+
+def lead_positions(lead_coord):
+    """Posición de cada lead 1..LEADS en la coordenada de lead, -1 si falta."""
+    lead_coord = np.asarray(lead_coord)
+    lead_pos = np.full(LEADS, -1)
+    if lead_coord.dtype.kind in 'iuf':  # 'step' como timedelta no coincide con ningún lead
+        for lead in range(1, LEADS + 1):
+            found = np.flatnonzero(lead_coord == lead)
+            if len(found): lead_pos[lead - 1] = found[0]
+    return lead_pos
+
+
+def _targets(years, months, leads):
+    # Año y mes objetivo de cada (inicio, lead): el lead L de un inicio en el mes m apunta a m + L
+    idx = np.asarray(months)[:, None] - 1 + np.asarray(leads, dtype=int)[None, :]
+    return np.asarray(years)[:, None] + idx // 12, idx % 12 + 1
+
+
+def target_days(dates, leads):
+    """Días del mes objetivo (fecha_inicio + lead) para cada (fecha de inicio, lead)."""
+    return days_in_month(*_targets(*year_month(dates), leads))
+
+
+def align(dates, lead_coord, base_month, obs_index):
+    """Indices de emparejamiento para los inicios de `base_month`.
+
+    Devuelve (rows, lead_pos, obs_idx, days):
+      rows     (n_inicios,)        posiciones de las fechas de inicio del mes base
+      lead_pos (LEADS,)            posición de cada lead 1..6 en el hindcast, -1 si falta
+      obs_idx  (n_inicios, LEADS)  posición del mes objetivo en ERA5, -1 si falta
+      days     (n_inicios, LEADS)  días del mes objetivo
+    """
+    years, months = year_month(dates)
+    rows = np.flatnonzero(months == int(base_month))
+    target_y, target_m = _targets(years[rows], months[rows], np.arange(1, LEADS + 1))
+    return rows, lead_positions(lead_coord), obs_index.lookup(target_y, target_m), days_in_month(target_y, target_m)
+
+
+def obs_to_mm(values, days):
+    # OBSERVACION (ERA5): m -> mm; si parece un promedio diario, se acumula al mes
+    obs_mm = np.asarray(values, dtype=np.float64) * 1000
+    return np.where(obs_mm < 20, obs_mm * days, obs_mm)
+
+
+def pred_to_mm(values, days):
+    # PREDICCION (Modelos): tasa en m/s -> mm/mes; si no, m -> mm
+    values = np.asarray(values, dtype=np.float64)
+    secs_in_month = days * 24 * 3600
+    return np.where(np.abs(values) < 0.01, values * secs_in_month * 1000, values * 1000)
+
+
+def operational_to_mm(values, days):
+    # PRONOSTICO OPERATIVO: tasa (m/s), promedio diario (m/día), total (m) o ya en mm
+    values = np.asarray(values, dtype=np.float64)
+    magnitude = np.abs(values)
+    return np.where(magnitude < 0.0001, values * days * 24 * 3600 * 1000,
+                    np.where(magnitude < 0.02, values * 1000 * days,
+                             np.where(magnitude < 0.5, values * 1000, values)))
+
+
+def _lerp(a, b, t):
+    # Misma interpolación que np.percentile(method='linear')
+    diff_b_a = b - a
+    return np.where(t >= 0.5, b - diff_b_a * (1 - t), a + diff_b_a * t)
+
+
+def percentiles(obs_mm, valid, qs):
+    """Percentiles qs (fracciones) de obs_mm sobre los pares válidos, por lead: [(LEADS, *espacio), ...]."""
+    extra = (1,) * (obs_mm.ndim - 2)
+    mask = valid.reshape(valid.shape + extra)
+    n = valid.sum(axis=0)
+    # Los pares inválidos quedan al final del orden (NaN)
+    ranked = np.sort(np.where(mask, obs_mm, np.nan), axis=0)
+    lead_idx = np.arange(LEADS)
+    result = []
+    for q in qs:
+        virtual = n * q + (1 + q * -1) - 1
+        below = np.floor(virtual)
+        gamma = (virtual - below).reshape(n.shape + extra)
+        lo = np.clip(below.astype(int), 0, None)
+        hi = np.clip(np.minimum(lo + 1, n - 1), 0, None)
+        result.append(_lerp(ranked[lo, lead_idx], ranked[hi, lead_idx], gamma))
+    return result
+
+
+def score(pred_mm, obs_mm, valid):
+    """Pearson r, bias, p20/p50/p80 y mean_obs de los seis leads en una pasada.
+
+    pred_mm, obs_mm: (n_inicios, LEADS, *espacio) en mm/mes.
+    valid: (n_inicios, LEADS), pares con observación disponible.
+    Devuelve {stat: (LEADS, *espacio)} más 'n': (LEADS,) pares por lead.
+    """
+    extra = (1,) * (pred_mm.ndim - 2)
+    mask = valid.reshape(valid.shape + extra)
+    n = valid.sum(axis=0)
+    count = n.reshape(n.shape + extra)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pred_mean = np.where(mask, pred_mm, 0).sum(axis=0) / count
+        obs_mean = np.where(mask, obs_mm, 0).sum(axis=0) / count
+        xm = np.where(mask, pred_mm - pred_mean, 0)
+        ym = np.where(mask, obs_mm - obs_mean, 0)
+        r = (xm * ym).sum(axis=0) / np.sqrt((xm * xm).sum(axis=0) * (ym * ym).sum(axis=0))
+    r = np.where(np.isnan(r), 0.0, np.clip(r, -1.0, 1.0))
+
+    p20, p50, p80 = percentiles(obs_mm, valid, PERCENTILES)
+    return {
+        "r": r,
+        "bias": pred_mean - obs_mean,
+        "p20": p20,
+        "p50": p50,
+        "p80": p80,
+        "mean_obs": obs_mean,
+        "n": n,
+    }
+
+
+def skill_scores(hc_values, dates, lead_coord, obs_values, obs_index, base_month, in_mm=False):
+    """Empareja un hindcast con ERA5 y calcula el skill de los seis leads.
+
+    hc_values: (fecha_inicio, lead, *espacio) en unidades crudas del modelo.
+    obs_values: (tiempo, *espacio) en unidades crudas de ERA5, misma grilla/puntos;
+    obs_index ubica cada (año, mes) en ese eje de tiempo.
+    Con in_mm ambos ya vienen en mm/mes (arrays canónicos del store).
+    """
+    with metrics.span('pairing'):
+        rows, lead_pos, obs_idx, days = align(dates, lead_coord, base_month, obs_index)
+        valid = (obs_idx >= 0) & (lead_pos >= 0)[None, :]
+        hc_values = np.asarray(hc_values)
+        obs_values = np.asarray(obs_values)
+        extra = (1,) * (hc_values.ndim - 2)
+
+        pred_raw = hc_values[rows[:, None], np.maximum(lead_pos, 0)[None, :]]
+        obs_raw = obs_values[np.maximum(obs_idx, 0)]
+        d_in_m = days.reshape(days.shape + extra)
+        if in_mm:
+            pred_mm, obs_mm = np.asarray(pred_raw, dtype=np.float64), np.asarray(obs_raw, dtype=np.float64)
+        else:
+            pred_mm, obs_mm = pred_to_mm(pred_raw, d_in_m), obs_to_mm(obs_raw, d_in_m)
+    with metrics.span('stats'):
+        return score(pred_mm, obs_mm, valid)
+
+
+def lead_scores(stats, index=()):
+    """Listas por lead (acc, bias) con el formato de /api/skill para un punto del espacio.
+
+    Un bias NaN (el punto cae fuera de la grilla del modelo) cuenta como sin skill.
+    """
+    scores_acc = []
+    scores_bias = []
+    for lead in range(LEADS):
+        if stats['n'][lead] <= MIN_PAIRS or np.isnan(stats['bias'][(lead,) + tuple(index)]):
+            scores_acc.append(None)
+            scores_bias.append(None)
+            continue
+        at = (lead,) + tuple(index)
+        scores_acc.append({s: float(stats[s][at]) for s in STATS})
+        scores_bias.append(float(stats['bias'][at]))
+    return scores_acc, scores_bias
@@ -0,0 +1,137 @@
+"""Skill probabilístico por terciles a partir de los miembros del ensamble.
+
+Los terciles son los p33/p66 de ERA5 sobre los años del hindcast, por lead y
+celda. La probabilidad de cada categoría es la fracción de miembros (con el
+bias medio del modelo corregido, como en el pronóstico calibrado) que cae
+debajo de p33, entre ambos o arriba de p66. Por lead y celda se reportan:
+
+  rpss       1 - RPS / RPS de la climatología (1/3, 1/3, 1/3)
+  roc_below  área ROC del evento "debajo de lo normal" (Mann-Whitney)
+  roc_above  área ROC del evento "arriba de lo normal"
+  crps       CRPS del ensamble en mm: E|X - y| - E|X - X'| / 2
+
+Todo se calcula con arrays (n_inicios, LEADS, *espacio, miembro); el eje de
+miembros se recorre en bloques cuyo tamaño sale de PROBABILISTIC_CHUNK_MB,
+así la memoria no crece con 25 o 50 miembros (el término E|X - X'| compara
+bloques de a pares).
+"""
+import numpy as np
+
+from . import metrics
+from . import pairing
+
+PROB_STATS = ['rpss', 'roc_below', 'roc_above', 'crps', 'p33', 'p66']
+TERCILES = np.asarray([1, 2]) / 3
+CATEGORIES = ['below', 'normal', 'above']
+
+
+def chunk_budget():
+    from django.conf import settings
+    return int(getattr(settings, 'PROBABILISTIC_CHUNK_MB', 64)) * 2 ** 20
+
+
+def member_chunk(base_size, n_members, budget=None):
+    """Miembros por bloque para que el bloque de a pares (base x k x k float64) entre en el presupuesto."""
+    budget = chunk_budget() if budget is None else budget
+    k = int(np.sqrt(budget / (8 * max(int(base_size), 1))))
+    return int(np.clip(k, 1, max(n_members, 1)))
+
+
+def _roc_area(score, event, valid):
+    # Área ROC por Mann-Whitney sobre el eje de pares: P(score_evento > score_no_evento), empates a la mitad
+    pos = event & valid
+    neg = ~event & valid
+    diff = score[:, None] - score[None, :]
+    wins = np.where(pos[:, None] & neg[None, :], (diff > 0) + 0.5 * (diff == 0), 0).sum(axis=(0, 1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return wins / (pos.sum(axis=0) * neg.sum(axis=0))
+
+
+def tercile_scores(members, dates, lead_coord, obs_values, obs_index, base_month, chunk=None):
+    """RPSS, áreas ROC, CRPS y terciles de ERA5 de los seis leads.
+
+    members: (fecha_inicio, lead, *espacio, miembro) en mm/mes (HindcastMembers).
+    obs_values: (tiempo, *espacio) en mm/mes, mismas celdas; obs_index ubica cada (año, mes).
+    Devuelve {stat: (LEADS, *espacio)} con PROB_STATS más 'bias' y 'n': (LEADS,).
+    """
+    with metrics.span('pairing'):
+        rows, lead_pos, obs_idx, _ = pairing.align(dates, lead_coord, base_month, obs_index)
+        valid = (obs_idx >= 0) & (lead_pos >= 0)[None, :]
+        obs_mm = np.asarray(obs_values, dtype=np.float64)[np.maximum(obs_idx, 0)]
+        extra = (1,) * (obs_mm.ndim - 2)
+        mask = valid.reshape(valid.shape + extra)
+        n = valid.sum(axis=0)
+        count = n.reshape(n.shape + extra)
+        lead_sel = np.maximum(lead_pos, 0)[None, :]
+        n_members = members.shape[-1]
+        step = chunk or member_chunk(obs_mm.size, n_members)
+        bounds = [(s, min(s + step, n_members)) for s in range(0, n_members, step)]
+
+        def block(bound):
+            # Bloque de miembros emparejado: (pares, LEADS, *espacio, k)
+            return np.asarray(members[..., bound[0]:bound[1]][rows[:, None], lead_sel], dtype=np.float64)
+
+    with metrics.span('stats'):
+        p33, p66 = pairing.percentiles(obs_mm, valid, TERCILES)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ens_mean = sum(block(b).sum(axis=-1) for b in bounds) / n_members
+            bias = (np.where(mask, ens_mean, 0).sum(axis=0) - np.where(mask, obs_mm, 0).sum(axis=0)) / count
+        bias = np.where(np.isfinite(bias), bias, 0.0)
+
+        below = np.zeros(obs_mm.shape)
+        above = np.zeros(obs_mm.shape)
+        abs_err = np.zeros(obs_mm.shape)
+        spread = np.zeros(obs_mm.shape)
+        for a, bound_a in enumerate(bounds):
+            xa = block(bound_a) - bias[..., None]
+            below += (xa < p33[..., None]).sum(axis=-1)
+            above += (xa > p66[..., None]).sum(axis=-1)
+            abs_err += np.abs(xa - obs_mm[..., None]).sum(axis=-1)
+            for bound_b in bounds[a:]:
+                xb = xa if bound_b == bound_a else block(bound_b) - bias[..., None]
+                pairs = np.abs(xa[..., :, None] - xb[..., None, :]).sum(axis=(-2, -1))
+                spread += pairs if bound_b == bound_a else 2 * pairs
+
+        prob_below = below / n_members
+        prob_above = above / n_members
+        obs_below = obs_mm < p33
+        obs_above = obs_mm > p66
+        # RPS con tres categorías: las acumuladas son P(debajo) y 1 - P(arriba)
+        rps = (prob_below - obs_below) ** 2 + (prob_above - obs_above) ** 2
+        rps_clim = (1 / 3 - obs_below) ** 2 + (1 / 3 - obs_above) ** 2
+        crps = abs_err / n_members - spread / (2 * n_members ** 2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rpss = 1 - np.where(mask, rps, 0).sum(axis=0) / np.where(mask, rps_clim, 0).sum(axis=0)
+            crps_mean = np.where(mask, crps, 0).sum(axis=0) / count
+
+        return {
+            "rpss": rpss,
+            "roc_below": _roc_area(prob_below, obs_below, mask),
+            "roc_above": _roc_area(prob_above, obs_above, mask),
+            "crps": crps_mean,
+            "p33": p33,
+            "p66": p66,
+            "bias": bias,
+            "n": n,
+        }
+
+
+def probabilities(members, bias, p33, p66):
+    """Probabilidad (debajo, normal, arriba) de un pronóstico por miembros (..., miembro) ya en mm/mes."""
+    corrected = np.asarray(members, dtype=np.float64) - np.asarray(bias)[..., None]
+    below = (corrected < np.asarray(p33)[..., None]).mean(axis=-1)
+    above = (corrected > np.asarray(p66)[..., None]).mean(axis=-1)
+    return below, 1 - below - above, above
+
+
+def lead_scores(stats, index=()):
+    """Lista por lead de {stat: valor} (None con pocos pares) para un punto del espacio."""
+    scores = []
+    for lead in range(pairing.LEADS):
+        at = (lead,) + tuple(index)
+        if stats['n'][lead] <= pairing.MIN_PAIRS or np.isnan(stats['crps'][at]):
+            scores.append(None)
+            continue
+        values = {s: float(stats[s][at]) for s in PROB_STATS}
+        scores.append({s: (None if np.isnan(v) else v) for s, v in values.items()})
+    return scores
@@ -0,0 +1,27 @@
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+
+
+class _EncodedRenderer(BaseRenderer):
+    # Solo para que la negociación de DRF acepte el tipo: las vistas arman el cuerpo (core/columnar.py)
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+class ColumnarRenderer(_EncodedRenderer):
+    media_type = 'application/vnd.climate-viewer.columnar'
+    format = 'columnar'
+
+
+class MsgpackRenderer(_EncodedRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+
+
+class NdjsonRenderer(_EncodedRenderer):
+    # /api/skill/batch con Accept: application/x-ndjson responde un StreamingHttpResponse propio
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+NEGOTIATED_RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarRenderer, MsgpackRenderer]
@@ -0,0 +1,264 @@
+import os
+import json
+import glob
+import shutil
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+from . import catalog
+from . import pairing
+from . import store
+from .grid import GridIndex, interpolation
+from .pairing import STATS, LEADS
+
+_loaded = None
+_load_lock = threading.Lock()
+
+
+def cube_dir():
+    from django.conf import settings
+    path = getattr(settings, 'SKILL_CUBE_DIR', None)
+    return str(path) if path else os.path.join(catalog.data_dir(), 'skill_cube')
+
+
+class SkillCube:
+    """Cubo (modelo, mes base, lead, lat, lon) sobre la grilla de ERA5, en memoria compartida (mmap).
+
+    n.npy guarda los pares año/lead usados (modelo, mes base, lead).
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, 'index.json')) as fh:
+            index = json.load(fh)
+        self.path = path
+        self.models = index['models']
+        self.latitude = np.asarray(index['latitude'])
+        self.longitude = np.asarray(index['longitude'])
+        self.sources = index['sources']
+        self.interpolation = index.get('interpolation', 'nearest')
+        self.grid_index = GridIndex(self.latitude, self.longitude)
+        self.stats = {s: np.load(os.path.join(path, f'{s}.npy'), mmap_mode='r') for s in STATS}
+        self.n = np.load(os.path.join(path, 'n.npy'), mmap_mode='r')
+
+    def is_fresh(self, directory=None):
+        return self.sources == catalog.source_files(directory) and self.interpolation == interpolation()
+
+    def grid(self, base_month):
+        """Mismo formato que compute_grid(): stats (modelo, lead, lat, lon) de un mes base."""
+        m = int(base_month) - 1
+        return {
+            "models": self.models,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "stats": {s: self.stats[s][:, m] for s in STATS},
+            "n": self.n[:, m],
+        }
+
+    def point(self, lat, lon, base_month):
+        ilat, ilon, _ = self.grid_index.nearest([lat], [lon])
+        i, j = ilat[0], ilon[0]
+        m = int(base_month) - 1
+        response_acc = {}
+        response_bias = {}
+        for k, model_name in enumerate(self.models):
+            stats = {s: self.stats[s][k, m, :, i, j] for s in STATS}
+            stats['n'] = self.n[k, m]
+            response_acc[model_name], response_bias[model_name] = pairing.lead_scores(stats)
+        return {"acc": response_acc, "bias": response_bias, "base_month": int(base_month)}
+
+
+def load_skill_cube(path=None):
+    global _loaded
+    path = path or cube_dir()
+    try:
+        mtime = os.stat(os.path.join(path, 'index.json')).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    key = (path, mtime)
+    loaded = _loaded
+    if loaded is None or loaded[0] != key:
+        with _load_lock:
+            if _loaded is None or _loaded[0] != key:
+                _loaded = (key, SkillCube(path))
+            loaded = _loaded
+    return loaded[1]
+
+
+def lookup_skill(lat, lon, base_month):
+    """Matriz de skill desde el cubo, o None si no hay cubo o quedó viejo respecto de data_bsas."""
+    cube = load_skill_cube()
+    if cube is None or not cube.is_fresh():
+        return None
+    return cube.point(lat, lon, base_month)
+
+
+def _grid_inputs(directory):
+    # ERA5 canónico y la lista de hindcasts disponibles
+    from . import analysis
+
+    obs = store.observations(os.path.join(directory, analysis.ERA5_FILE))
+    models = []
+    for f in sorted(glob.glob(os.path.join(directory, 'hc_*_bsas.nc'))):
+        name = analysis.hindcast_model_name(f)
+        if name: models.append((name, f))
+    return obs, models
+
+
+def memory_budget(memory_mb=None):
+    """Presupuesto de memoria por bloque en bytes (settings.SKILL_CUBE_MEMORY_MB); 0 = toda la grilla de una vez."""
+    if memory_mb is None:
+        from django.conf import settings
+        memory_mb = getattr(settings, 'SKILL_CUBE_MEMORY_MB', 256)
+    return max(int(float(memory_mb) * 2 ** 20), 0)
+
+
+def cell_bytes(n_time, n_starts):
+    """Memoria de trabajo estimada por celda y modelo: serie ERA5, hindcast llevado a la celda y temporales de score()."""
+    # Medido con tracemalloc: bilineal arma las 4 esquinas en float64 más máscaras y productos (~14 series)
+    samples = 14 if interpolation() == 'bilinear' else 1
+    n_years = n_starts // 12 + 1
+    return 8 * (n_time + samples * n_starts * LEADS + 4 * n_years * LEADS)
+
+
+def tile_shape(n_lat, n_lon, budget, per_cell):
+    """(filas, columnas) del bloque: franjas de longitud completa mientras entren en el presupuesto."""
+    if budget <= 0:
+        return n_lat, n_lon
+    cells = max(budget // max(per_cell, 1), 1)
+    cols = int(min(n_lon, cells))
+    rows = int(np.clip(cells // cols, 1, n_lat))
+    return rows, cols
+
+
+def tiles(n_lat, n_lon, shape):
+    """Bloques (slice de lat, slice de lon) que cubren la grilla en orden de filas."""
+    rows, cols = shape
+    return [(slice(i, min(i + rows, n_lat)), slice(j, min(j + cols, n_lon)))
+            for i in range(0, n_lat, rows) for j in range(0, n_lon, cols)]
+
+
+def iter_grid_stats(base_months, directory=None, memory_mb=None, progress=None):
+    """Genera (modelo, mes base, (filas, columnas), stats) bloque por bloque sobre la grilla de ERA5.
+
+    Cada celda usa la serie ERA5 de la celda y cada hindcast llevado a su
+    centro (GRID_INTERPOLATION), con las mismas reglas que get_skill_matrix.
+    Los bloques salen de memory_budget(): con el store en mmap la memoria
+    pico queda acotada sin importar el tamaño del dominio ni del período.
+    stats: {stat: (LEADS, filas, columnas), 'n': (LEADS,)}. Un modelo que
+    falla no genera bloques. progress(hechos, total) se llama al cerrar cada bloque.
+    """
+    obs, models = _grid_inputs(directory or catalog.data_dir())
+    hindcasts = []
+    for model_name, f in models:
+        try:
+            hindcasts.append((model_name, store.hindcast(f)))
+        except Exception as e:
+            print(f"Error procesando {model_name}: {e}")
+
+    n_lat, n_lon = len(obs.latitude), len(obs.longitude)
+    n_starts = max([len(hc.start_dates) for _, hc in hindcasts], default=0)
+    shape = tile_shape(n_lat, n_lon, memory_budget(memory_mb), cell_bytes(obs.available.size, n_starts))
+    blocks = tiles(n_lat, n_lon, shape)
+    for done, (rows, cols) in enumerate(blocks, 1):
+        obs_values = obs.grid(rows, cols)
+        lats, lons = obs.latitude[rows], obs.longitude[cols]
+        for model_name, hc in hindcasts:
+            try:
+                # Hindcast en el centro de cada celda del bloque (NaN fuera de la grilla del modelo)
+                values = hc.grid(lats, lons)
+            except Exception as e:
+                print(f"Error procesando {model_name}: {e}")
+                continue
+            for base_month in base_months:
+                yield model_name, base_month, (rows, cols), hc.skill_scores(values, obs_values, obs, base_month)
+        if progress:
+            progress(done, len(blocks))
+
+
+def compute_grid(base_month, directory=None, memory_mb=None):
+    """Skill de todos los modelos en toda la grilla para un mes base, sin usar el cubo."""
+    directory = directory or catalog.data_dir()
+    obs, models = _grid_inputs(directory)
+    names = [name for name, _ in models]
+    shape = (len(models), LEADS, len(obs.latitude), len(obs.longitude))
+    grid = {
+        "models": names,
+        "latitude": obs.latitude,
+        "longitude": obs.longitude,
+        "stats": {s: np.full(shape, np.nan) for s in STATS},
+        "n": np.zeros(shape[:2], dtype=int),
+    }
+    for model_name, _, (rows, cols), stats in iter_grid_stats([base_month], directory, memory_mb):
+        k = names.index(model_name)
+        grid["n"][k] = stats['n']
+        for s in STATS:
+            grid["stats"][s][k, :, rows, cols] = stats[s]
+    return grid
+
+
+def _report(done, total):
+    print(f"Cubo de skill: bloque {done}/{total} ({100 * done // total}%)")
+
+
+def build_skill_cube(out_dir=None, directory=None, memory_mb=None, progress=_report):
+    """Precalcula r, bias, p20/p50/p80 y mean_obs para toda la grilla de ERA5 y los 12 meses base.
+
+    Se calcula por bloques de lat/lon (memory_budget) y cada bloque se escribe
+    directo en los .npy del directorio temporal (np.lib.format.open_memmap),
+    así el cubo completo nunca está en memoria.
+    """
+    directory = directory or catalog.data_dir()
+    out_dir = out_dir or cube_dir()
+    sources = catalog.source_files(directory)
+
+    obs, models = _grid_inputs(directory)
+    lats = obs.latitude
+    lons = obs.longitude
+    names = [name for name, _ in models]
+
+    tmp_dir = out_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    shape = (len(models), 12, LEADS, len(lats), len(lons))
+    cube = {}
+    for s in STATS:
+        cube[s] = np.lib.format.open_memmap(os.path.join(tmp_dir, f'{s}.npy'), mode='w+',
+                                            dtype=np.float32, shape=shape)
+        cube[s][...] = np.nan
+    counts = np.zeros(shape[:3], dtype=np.uint8)
+
+    for model_name, base_month, (rows, cols), stats in iter_grid_stats(range(1, 13), directory,
+                                                                        memory_mb, progress):
+        k = names.index(model_name)
+        counts[k, base_month - 1] = np.minimum(stats['n'], 255)
+        for s in STATS:
+            cube[s][k, base_month - 1, :, rows, cols] = stats[s]
+
+    for s in STATS:
+        cube[s].flush()
+    del cube
+
+    np.save(os.path.join(tmp_dir, 'n.npy'), counts)
+    index = {
+        "models": names,
+        "latitude": lats.tolist(),
+        "longitude": lons.tolist(),
+        "stats": STATS,
+        "leads": list(range(1, LEADS + 1)),
+        "sources": sources,
+        "interpolation": interpolation(),
+        "built_at": datetime.now(timezone.utc).isoformat(),
+    }
+    with open(os.path.join(tmp_dir, 'index.json'), 'w') as fh:
+        json.dump(index, fh)
+
+    # Reemplazo atómico del directorio anterior
+    old_dir = out_dir + '.old'
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(out_dir):
+        os.rename(out_dir, old_dir)
+    os.rename(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return out_dir
@@ -0,0 +1,458 @@
+"""Store canónico de ERA5, hindcasts y pronósticos operativos (manage.py ingest_data).
+
+Cada NetCDF de data_bsas se normaliza una sola vez: variable 'tp', media del
+ensamble, leads 1..6 y mm/mes. Queda en store/<archivo sin .nc>/ como
+values.npy (float32) + meta.json. Los hindcasts se guardan con la serie de un
+punto contigua, (lat, lon, fecha_inicio, lead), para que extraer puntos desde
+el mmap sea leer unos pocos KB; ERA5 como (lat, lon, año, mes), así cada mes
+observado es un índice entero. Los operativos se guardan como (lead, lat, lon). Si el NetCDF trae miembros
+del ensamble ('number'), la entrada suma members.npy con un eje de miembro al
+final, para el skill probabilístico.
+Los .npy se abren con mmap: los workers de gunicorn comparten las páginas a
+través del page cache del sistema operativo.
+
+Si falta la entrada o quedó vieja respecto del NetCDF (tamaño/mtime), se
+normaliza el NetCDF en memoria con las mismas reglas, así que el resultado no
+depende de haber corrido la ingesta (salvo la precisión float32 del store).
+"""
+import os
+import re
+import json
+import shutil
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+from . import catalog
+from . import datasets
+from . import metrics
+from . import pairing
+from .grid import GridIndex, interpolation
+
+OBSERVATION_DIMS = ['latitude', 'longitude', 'year', 'month']
+HINDCAST_DIMS = ['latitude', 'longitude', 'start_date', 'lead']
+OPERATIONAL_DIMS = ['lead', 'latitude', 'longitude']
+
+
+def store_dir():
+    from django.conf import settings
+    path = getattr(settings, 'CLIMATE_STORE_DIR', None)
+    return str(path) if path else os.path.join(catalog.data_dir(), 'store')
+
+
+def entry_dir(path, directory=None):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(directory or store_dir(), name)
+
+
+class Observations:
+    """ERA5 canónico: values (lat, lon, año, mes) en mm/mes desde first_year.
+
+    available (años, 12) marca los meses presentes en el NetCDF; el eje de
+    tiempo de points()/grid() es año * 12 + mes, el que ubica `index`.
+    """
+
+    def __init__(self, values, first_year, available, latitude, longitude):
+        self.values = values
+        self.first_year = int(first_year)
+        self.available = np.asarray(available, dtype=bool).reshape(-1, 12)
+        self.latitude = np.asarray(latitude)
+        self.longitude = np.asarray(longitude)
+        positions = np.arange(self.available.size).reshape(self.available.shape)
+        self.index = pairing.MonthIndex(self.first_year, np.where(self.available, positions, -1))
+        self.grid_index = GridIndex(self.latitude, self.longitude)
+
+    def points(self, lats, lons):
+        """Series de las celdas más cercanas: (tiempo, punto), NaN fuera del dominio."""
+        series = self.grid_index.sample(self.values, lats, lons)
+        return series.reshape(len(series), -1).T
+
+    def grid(self, rows=slice(None), cols=slice(None)):
+        """Toda la grilla, o un bloque de filas/columnas: (tiempo, lat, lon).
+
+        Con el store en mmap solo se leen las celdas del bloque.
+        """
+        block = np.asarray(self.values[rows, cols])
+        return np.moveaxis(block.reshape(block.shape[0], block.shape[1], -1), -1, 0)
+
+
+class Hindcast:
+    """Hindcast canónico: values (lat, lon, fecha_inicio, lead) en mm/mes."""
+
+    def __init__(self, values, start_dates, leads, latitude, longitude):
+        self.values = values
+        self.start_dates = np.asarray(start_dates, dtype='datetime64[M]')
+        self.leads = np.asarray(leads)
+        self.latitude = np.asarray(latitude)
+        self.longitude = np.asarray(longitude)
+        self.grid_index = GridIndex(self.latitude, self.longitude)
+
+    def points(self, lats, lons):
+        """Series en cada punto (celda más cercana o bilineal, GRID_INTERPOLATION): (fecha_inicio, lead, punto).
+
+        Los puntos fuera de la grilla del modelo quedan en NaN.
+        """
+        return np.moveaxis(self.grid_index.sample(self.values, lats, lons, interpolation()), 0, -1)
+
+    def grid(self, lats, lons):
+        """Series en cada centro de la grilla lats x lons: (fecha_inicio, lead, lat, lon)."""
+        return np.moveaxis(self.grid_index.sample_grid(self.values, lats, lons, interpolation()), (0, 1), (2, 3))
+
+    def skill_scores(self, series, obs_series, obs, base_month):
+        """Skill de `series` contra `obs_series`, las series de las mismas celdas de `obs` (Observations)."""
+        return pairing.skill_scores(series, self.start_dates, self.leads, obs_series, obs.index,
+                                    base_month, in_mm=True)
+
+
+class HindcastMembers(Hindcast):
+    """Miembros del hindcast: values (lat, lon, fecha_inicio, lead, miembro) en mm/mes."""
+
+    def points(self, lats, lons):
+        """Series en cada punto: (fecha_inicio, lead, punto, miembro)."""
+        return np.moveaxis(self.grid_index.sample(self.values, lats, lons, interpolation()), 0, 2)
+
+
+class Operational:
+    """Pronóstico operativo canónico: values (lead, lat, lon) en mm/mes, emitido en year/month.
+
+    Con miembros (operational_members) values es (lead, lat, lon, miembro).
+    """
+
+    def __init__(self, values, leads, latitude, longitude, year, month):
+        self.values = values
+        self.leads = np.asarray(leads)
+        self.latitude = np.asarray(latitude)
+        self.longitude = np.asarray(longitude)
+        self.year = int(year)
+        self.month = int(month)
+        self.grid_index = GridIndex(self.latitude, self.longitude)
+
+    def field(self, lead):
+        """Campo (lat, lon) del lead pedido, o None si el archivo no lo tiene."""
+        found = np.flatnonzero(self.leads == lead)
+        return np.asarray(self.values[found[0]]) if len(found) else None
+
+    def point(self, lat, lon):
+        """Valores en el punto: (lead,) o (lead, miembro), NaN fuera de la grilla del modelo."""
+        return self.grid_index.sample(np.moveaxis(self.values, 0, 2), [lat], [lon], interpolation())[0]
+
+    def regrid(self, lats, lons):
+        """Todos los leads en los centros de la grilla lats x lons: (lead, lat, lon)."""
+        field = self.grid_index.sample_grid(np.moveaxis(self.values, 0, -1), lats, lons, interpolation())
+        return np.moveaxis(field, -1, 0)
+
+
+def observations_from_dataset(ds):
+    var_name = 'tp' if 'tp' in ds else list(ds.data_vars)[0]
+    obs = ds[var_name]
+    time_dim = [d for d in obs.dims if d not in ('latitude', 'longitude')][0]
+    obs = obs.transpose(time_dim, 'latitude', 'longitude')
+    years, months = pairing.year_month(obs[time_dim].values)
+    first_year = int(years.min())
+    n_years = int(years.max()) - first_year + 1
+
+    # Primera ocurrencia de cada (año, mes), igual que la serie original
+    keys, first = np.unique((years - first_year) * 12 + months - 1, return_index=True)
+    mm = pairing.obs_to_mm(obs.values[first], pairing.days_in_month(years[first], months[first])[:, None, None])
+    values = np.full((obs.sizes['latitude'], obs.sizes['longitude'], n_years * 12), np.nan)
+    values[:, :, keys] = mm.transpose(1, 2, 0)
+    available = np.zeros(n_years * 12, dtype=bool)
+    available[keys] = True
+    return Observations(values.reshape(values.shape[:2] + (n_years, 12)), first_year, available,
+                        obs['latitude'].values, obs['longitude'].values)
+
+
+def hindcast_from_dataset(ds, keep_members=False):
+    from .analysis import normalize_hindcast
+
+    da, col_lead, col_date = normalize_hindcast(ds, keep_members)
+    da = da.transpose(col_date, col_lead, 'latitude', 'longitude', *(('number',) if keep_members else ()))
+    lead_pos = pairing.lead_positions(da[col_lead].values)
+    present = np.flatnonzero(lead_pos >= 0)
+    leads = present + 1
+    dates = da[col_date].values
+    raw = da.values[:, lead_pos[present]]
+    days = pairing.target_days(dates, leads)
+    mm = pairing.pred_to_mm(raw, days.reshape(days.shape + (1,) * (raw.ndim - 2)))
+    if keep_members:
+        # float32: el ensamble completo pesa `miembros` veces la media
+        return HindcastMembers(np.ascontiguousarray(mm.transpose(2, 3, 0, 1, 4), dtype=np.float32), dates, leads,
+                               da['latitude'].values, da['longitude'].values)
+    return Hindcast(np.ascontiguousarray(mm.transpose(2, 3, 0, 1)), dates, leads,
+                    da['latitude'].values, da['longitude'].values)
+
+
+def issue_date(path):
+    match = re.search(r'_(\d{4})(\d{2})\.nc$', os.path.basename(path))
+    if not match:
+        raise ValueError(f"{os.path.basename(path)} no indica el mes de emisión (_AAAAMM.nc)")
+    return int(match.group(1)), int(match.group(2))
+
+
+def operational_from_dataset(ds, year, month, keep_members=False):
+    from .analysis import normalize_operational
+
+    values, leads, lats, lons = normalize_operational(ds, keep_members)
+    if leads is None:
+        # Sin coordenada de lead el mismo campo vale para todos: se replica con los días de cada mes objetivo
+        leads = np.arange(1, pairing.LEADS + 1)
+        values = np.repeat(values, len(leads), axis=0)
+    issue = np.asarray([f'{year:04d}-{month:02d}'], dtype='datetime64[M]')
+    days = pairing.target_days(issue, leads)[0]
+    mm = pairing.operational_to_mm(values, days.reshape(days.shape + (1,) * (values.ndim - 1)))
+    return Operational(mm.astype(np.float32) if keep_members else mm, leads, lats, lons, year, month)
+
+
+def _read_meta(path, directory=None):
+    # meta.json de la entrada si coincide con el NetCDF actual; None si falta o quedó vieja
+    try:
+        with open(os.path.join(entry_dir(path, directory), 'meta.json')) as fh:
+            meta = json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return None
+    return meta if meta.get('source_sig') == catalog.file_signature(path) else None
+
+
+def _load_observations(path):
+    meta = _read_meta(path)
+    if meta is None or meta['kind'] != 'observations':
+        ds = datasets.pool.get(path)
+        with metrics.span('normalize'):
+            return observations_from_dataset(ds)
+    with metrics.span('store_load'):
+        values = np.load(os.path.join(entry_dir(path), 'values.npy'), mmap_mode='r')
+    return Observations(values, meta['first_year'], meta['available'], meta['latitude'], meta['longitude'])
+
+
+def _load_hindcast(path):
+    meta = _read_meta(path)
+    if meta is None or meta['kind'] != 'hindcast':
+        ds = datasets.pool.get(path)
+        with metrics.span('normalize'):
+            return hindcast_from_dataset(ds)
+    with metrics.span('store_load'):
+        values = np.load(os.path.join(entry_dir(path), 'values.npy'), mmap_mode='r')
+    return Hindcast(values, meta['start_dates'], meta['leads'], meta['latitude'], meta['longitude'])
+
+
+def _load_operational(path):
+    meta = _read_meta(path)
+    if meta is None or meta['kind'] != 'operational':
+        ds = datasets.pool.get(path)
+        with metrics.span('normalize'):
+            return operational_from_dataset(ds, *issue_date(path))
+    with metrics.span('store_load'):
+        values = np.load(os.path.join(entry_dir(path), 'values.npy'), mmap_mode='r')
+    year, month = issue_date(path)
+    return Operational(values, meta['leads'], meta['latitude'], meta['longitude'], year, month)
+
+
+def _load_hindcast_members(path):
+    meta = _read_meta(path)
+    if meta is None or meta['kind'] != 'hindcast' or not meta.get('members'):
+        ds = datasets.pool.get(path)
+        with metrics.span('normalize'):
+            return hindcast_from_dataset(ds, keep_members=True)
+    with metrics.span('store_load'):
+        values = np.load(os.path.join(entry_dir(path), 'members.npy'), mmap_mode='r')
+    return HindcastMembers(values, meta['start_dates'], meta['leads'], meta['latitude'], meta['longitude'])
+
+
+def _load_operational_members(path):
+    meta = _read_meta(path)
+    year, month = issue_date(path)
+    if meta is None or meta['kind'] != 'operational' or not meta.get('members'):
+        ds = datasets.pool.get(path)
+        with metrics.span('normalize'):
+            return operational_from_dataset(ds, year, month, keep_members=True)
+    with metrics.span('store_load'):
+        values = np.load(os.path.join(entry_dir(path), 'members.npy'), mmap_mode='r')
+    return Operational(values, meta['leads'], meta['latitude'], meta['longitude'], year, month)
+
+
+def observations(path):
+    """ERA5 canónico: del store si está al día, si no normalizado en memoria."""
+    return datasets.pool.cached(path, ('canonical', store_dir()), _load_observations)
+
+
+def hindcast(path):
+    """Hindcast canónico de un NetCDF hc_*: del store si está al día, si no normalizado en memoria."""
+    return datasets.pool.cached(path, ('canonical', store_dir()), _load_hindcast)
+
+
+def operational(path):
+    """Pronóstico operativo canónico de un NetCDF operational_*_AAAAMM.nc."""
+    return datasets.pool.cached(path, ('canonical', store_dir()), _load_operational)
+
+
+def hindcast_members(path):
+    """HindcastMembers de un NetCDF hc_* (un solo miembro si el archivo no trae 'number')."""
+    return datasets.pool.cached(path, ('members', store_dir()), _load_hindcast_members)
+
+
+def operational_members(path):
+    """Pronóstico operativo con miembros: values (lead, lat, lon, miembro)."""
+    return datasets.pool.cached(path, ('members', store_dir()), _load_operational_members)
+
+
+class OperationalForecasts:
+    """Pronósticos operativos de un mes de emisión sobre la grilla de ERA5.
+
+    values (modelo, lead, lat, lon) en mm/mes para leads 1..6: cada modelo en el
+    centro de cada celda (GRID_INTERPOLATION), NaN si el modelo no tiene ese lead
+    o la celda cae fuera de su grilla.
+    """
+
+    def __init__(self, models, values, latitude, longitude, year, month):
+        self.models = list(models)
+        self.values = values
+        self.latitude = np.asarray(latitude)
+        self.longitude = np.asarray(longitude)
+        self.year = int(year)
+        self.month = int(month)
+        self.grid_index = GridIndex(self.latitude, self.longitude)
+
+    def point(self, lat, lon):
+        """{modelo: (LEADS,) mm/mes} en la celda más cercana."""
+        i, j, _ = self.grid_index.nearest([lat], [lon])
+        return {name: self.values[k, :, i[0], j[0]] for k, name in enumerate(self.models)}
+
+    def field(self, models, lead):
+        """(modelo, lat, lon) para la lista `models`, NaN en los que no tienen pronóstico."""
+        out = np.full((len(models), len(self.latitude), len(self.longitude)), np.nan)
+        for k, name in enumerate(models):
+            if name.lower() in self.models:
+                out[k] = self.values[self.models.index(name.lower()), lead - 1]
+        return out
+
+
+_forecasts = {}
+_forecasts_lock = threading.Lock()
+
+
+def _operational_files(year, month, directory):
+    issue = f'{int(year):04d}-{int(month):02d}'
+    files = {}
+    for name in catalog.scan_sources(directory):
+        entry = catalog.classify(name)
+        if entry and entry['kind'] == 'operational' and entry['issue'] == issue:
+            files[entry['model'].lower()] = os.path.join(directory, name)
+    return dict(sorted(files.items()))
+
+
+def operational_forecasts(year, month, directory=None):
+    """OperationalForecasts del mes de emisión, armado una vez y cacheado mientras los archivos no cambien."""
+    from .analysis import ERA5_FILE
+
+    directory = directory or catalog.data_dir()
+    files = _operational_files(year, month, directory)
+    era5_path = os.path.join(directory, ERA5_FILE)
+    key = (directory, store_dir(), int(year), int(month), tuple(files),
+           tuple(tuple(catalog.file_signature(p)) for p in list(files.values()) + [era5_path]), interpolation())
+    cached = _forecasts.get(key[:4])
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    with _forecasts_lock:
+        cached = _forecasts.get(key[:4])
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        obs = observations(era5_path)
+        values = np.full((len(files), pairing.LEADS, len(obs.latitude), len(obs.longitude)), np.nan)
+        for k, (name, path) in enumerate(files.items()):
+            try:
+                op = operational(path)
+            except Exception as e:
+                print(f"Error leyendo {name}: {e}")
+                continue
+            # Índice del modelo sobre los centros de ERA5; fuera de su grilla queda NaN
+            regridded = op.regrid(obs.latitude, obs.longitude)
+            for lead in range(1, pairing.LEADS + 1):
+                found = np.flatnonzero(op.leads == lead)
+                if len(found):
+                    values[k, lead - 1] = regridded[found[0]]
+        forecasts = OperationalForecasts(files, values, obs.latitude, obs.longitude, year, month)
+        _forecasts[key[:4]] = (key, forecasts)
+    return forecasts
+
+
+def _write_entry(path, values, meta, directory, members=None):
+    out_dir = entry_dir(path, directory)
+    tmp_dir = out_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, 'values.npy'), np.asarray(values, dtype=np.float32))
+    if members is not None:
+        np.save(os.path.join(tmp_dir, 'members.npy'), np.asarray(members, dtype=np.float32))
+        meta["members"] = int(members.shape[-1])
+    meta.update({
+        "source": os.path.basename(path),
+        "source_sig": catalog.file_signature(path),
+        "units": "mm/month",
+        "dtype": "float32",
+        "ingested_at": datetime.now(timezone.utc).isoformat(),
+    })
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as fh:
+        json.dump(meta, fh)
+
+    # Reemplazo atómico de la entrada anterior
+    old_dir = out_dir + '.old'
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(out_dir):
+        os.rename(out_dir, old_dir)
+    os.rename(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return out_dir
+
+
+def ingest_file(path, out_dir=None):
+    """Normaliza un NetCDF (era5_*, hc_* u operational_*) y lo escribe en el store."""
+    import xarray as xr
+
+    name = os.path.basename(path)
+    with xr.open_dataset(path, engine='netcdf4') as ds:
+        if name.startswith('era5_'):
+            obs = observations_from_dataset(ds.load())
+            meta = {"kind": "observations", "dims": OBSERVATION_DIMS, "first_year": obs.first_year,
+                    "available": obs.available.ravel().astype(int).tolist(),
+                    "latitude": obs.latitude.tolist(), "longitude": obs.longitude.tolist()}
+            return _write_entry(path, obs.values, meta, out_dir or store_dir())
+        if name.startswith('hc_'):
+            ds = ds.load()
+            hc = hindcast_from_dataset(ds)
+            members = hindcast_from_dataset(ds, keep_members=True).values if 'number' in ds.dims else None
+            meta = {"kind": "hindcast", "dims": HINDCAST_DIMS,
+                    "start_dates": [str(d) for d in hc.start_dates], "leads": hc.leads.tolist(),
+                    "latitude": hc.latitude.tolist(), "longitude": hc.longitude.tolist()}
+            return _write_entry(path, hc.values, meta, out_dir or store_dir(), members)
+        if name.startswith('operational_'):
+            ds = ds.load()
+            op = operational_from_dataset(ds, *issue_date(path))
+            members = (operational_from_dataset(ds, *issue_date(path), keep_members=True).values
+                       if 'number' in ds.dims else None)
+            meta = {"kind": "operational", "dims": OPERATIONAL_DIMS, "issue": f'{op.year:04d}-{op.month:02d}',
+                    "leads": op.leads.tolist(), "latitude": op.latitude.tolist(),
+                    "longitude": op.longitude.tolist()}
+            return _write_entry(path, op.values, meta, out_dir or store_dir(), members)
+    raise ValueError(f"{name} no es ERA5, un hindcast ni un pronóstico operativo")
+
+
+def ingest(directory=None, out_dir=None, force=False):
+    """Ingesta de ERA5, hindcasts y operativos de data_bsas; devuelve {archivo: estado}."""
+    directory = directory or catalog.data_dir()
+    out_dir = out_dir or store_dir()
+    report = {}
+    for name in catalog.scan_sources(directory):
+        if not name.startswith(('era5_', 'hc_', 'operational_')):
+            continue
+        path = os.path.join(directory, name)
+        if not force and _read_meta(path, out_dir) is not None:
+            report[name] = 'al día'
+            continue
+        try:
+            ingest_file(path, out_dir)
+            report[name] = 'ok'
+        except Exception as e:
+            report[name] = f'error: {e}'
+    return report
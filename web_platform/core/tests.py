@@ -1,8 +1,43 @@
-from django.test import TestCase
+import io
+import asyncio
+import os
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+import uuid
+import signal
+import unittest
+import gzip
+from contextlib import redirect_stdout
+from datetime import date
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from scipy.stats import pearsonr
+from django.core.cache import caches
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from core import (analysis, benchmark, catalog, cds, columnar, conditional, ensemble, jobs, maps, metrics, offload,
+                  pairing, probabilistic, skill_cube, store, warmup)
+from core.analysis import compute_skill_matrix, get_skill_matrix
+from core.cache import ResultCache, result_cache
+from core.catalog import DEFAULT_DATA_DIR
+from core.datasets import DatasetPool
+from core.grid import GridIndex, nearest_index
+from core.models import AnalysisJob
+from core.skill_cube import build_skill_cube, compute_grid, lookup_skill, tile_shape, tiles
+
 class APITests(APITestCase):
     def test_skill_endpoint_exists(self):
         """Test that the skill API endpoint exists and requires parameters"""
@@ -18,8 +53,1400 @@ class APITests(APITestCase):
         # Similar logic: proves connectivity
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_skill_rejects_month_out_of_range(self):
+        """Base months outside 1-12 are a 400 instead of wrapping around or returning empty skill"""
+        for month in ('0', '-1', '13'):
+            response = self.client.get(reverse('api_skill'), {'lat': -34.6, 'lon': -58.4, 'month': month})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, month)
+            self.assertIn('month must be 1-12', response.json()['error'])
+
     def test_docs_page(self):
         """Test that the Swagger UI page loads"""
         url = reverse('swagger-ui')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+# Cache compartido en memoria para que los tests no dependan de lo guardado en disco
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'analysis': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'analysis-tests'},
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SkillCubeTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp = tempfile.mkdtemp()
+        cls.cube_path = os.path.join(cls.tmp, 'skill_cube')
+        with redirect_stdout(io.StringIO()):
+            build_skill_cube(out_dir=cls.cube_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_cube_matches_point_computation(self):
+        """The precomputed cube gives the same skill as the per-point NetCDF path"""
+        with override_settings(SKILL_CUBE_DIR=self.cube_path), redirect_stdout(io.StringIO()):
+            expected = compute_skill_matrix(-34.5, -58.5, 1)
+            cached = get_skill_matrix(-34.5, -58.5, 1)
+        self.assertEqual(cached['base_month'], 1)
+        self.assertEqual(set(cached['acc']), set(expected['acc']))
+        for model, leads in expected['acc'].items():
+            for want, got in zip(leads, cached['acc'][model]):
+                if want is None:
+                    self.assertIsNone(got)
+                    continue
+                for stat, value in want.items():
+                    self.assertAlmostEqual(got[stat], value, delta=1e-4 * max(1.0, abs(value)))
+
+    def test_cube_rejects_month_out_of_range(self):
+        with override_settings(SKILL_CUBE_DIR=self.cube_path):
+            for month in ('-1', '13'):
+                response = self.client.get(reverse('api_skill'), {'lat': -34.5, 'lon': -58.5, 'month': month})
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, month)
+
+    def test_stale_cube_is_ignored(self):
+        """A cube built from other source files falls back to the NetCDF path"""
+        stale = os.path.join(self.tmp, 'stale_cube')
+        shutil.copytree(self.cube_path, stale)
+        index_path = os.path.join(stale, 'index.json')
+        with open(index_path) as fh:
+            index = json.load(fh)
+        index['sources'] = {}
+        with open(index_path, 'w') as fh:
+            json.dump(index, fh)
+        with override_settings(SKILL_CUBE_DIR=stale):
+            self.assertIsNone(lookup_skill(-34.5, -58.5, 1))
+            with override_settings(SKILL_CUBE_DIR=self.cube_path):
+                self.assertIsNotNone(lookup_skill(-34.5, -58.5, 1))
+
+
+class PairingEngineTests(TestCase):
+    def test_scores_match_scalar_reference(self):
+        """The vectorized engine reproduces pearsonr / np.percentile on each lead"""
+        rng = np.random.default_rng(0)
+        pred = rng.gamma(2.0, 40.0, size=(24, 6, 3))
+        obs = rng.gamma(2.0, 45.0, size=(24, 6, 3))
+        valid = np.ones((24, 6), dtype=bool)
+        valid[-1, 3:] = False  # el último año no tiene observación para los leads largos
+        stats = pairing.score(pred, obs, valid)
+        for lead in range(6):
+            rows = valid[:, lead]
+            for cell in range(3):
+                x, y = pred[rows, lead, cell], obs[rows, lead, cell]
+                self.assertAlmostEqual(stats['r'][lead, cell], pearsonr(x, y)[0], places=12)
+                self.assertAlmostEqual(stats['bias'][lead, cell], np.mean(x) - np.mean(y), places=10)
+                for name, q in zip(['p20', 'p50', 'p80'], [20, 50, 80]):
+                    self.assertEqual(stats[name][lead, cell], np.percentile(y, q))
+        self.assertEqual(stats['n'].tolist(), [24, 24, 24, 23, 23, 23])
+
+    def test_point_skill_regression(self):
+        """Per-point skill for JMA at Buenos Aires matches the original row-by-row output"""
+        empty_store = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, empty_store, ignore_errors=True)
+        with override_settings(CLIMATE_STORE_DIR=empty_store), redirect_stdout(io.StringIO()):
+            data = compute_skill_matrix(-34.6, -58.4, 1)
+        lead2 = data['acc']['jma'][1]
+        self.assertAlmostEqual(lead2['r'], 0.22808030970057805, places=12)
+        self.assertAlmostEqual(lead2['bias'], -7.019080694751281, places=10)
+        self.assertAlmostEqual(lead2['p80'], 136.79809570312503, places=10)
+        self.assertAlmostEqual(lead2['mean_obs'], 112.14943726857503, places=10)
+        self.assertAlmostEqual(data['bias']['jma'][5], -18.931572698771035, places=10)
+
+
+class StoreTests(TestCase):
+    def setUp(self):
+        self.store_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.store_path, ignore_errors=True)
+
+    def test_ingest_matches_on_the_fly_normalization(self):
+        """The ingested float32 store gives the same series and skill as normalizing the NetCDF per request"""
+        hc_path = os.path.join(DEFAULT_DATA_DIR, 'hc_jma_3_bsas.nc')
+        with override_settings(CLIMATE_STORE_DIR=self.store_path):
+            report = store.ingest()
+            self.assertEqual(report['hc_jma_3_bsas.nc'], 'ok')
+            self.assertEqual(store.ingest()['hc_jma_3_bsas.nc'], 'al día')
+            stored = store.hindcast(hc_path)
+            self.assertIsInstance(stored.values, np.memmap)
+            with redirect_stdout(io.StringIO()):
+                from_store = compute_skill_matrix(-34.6, -58.4, 1)['acc']['jma']
+        with open(os.path.join(self.store_path, 'hc_jma_3_bsas', 'meta.json')) as fh:
+            meta = json.load(fh)
+        self.assertEqual(meta['dims'], ['latitude', 'longitude', 'start_date', 'lead'])
+        self.assertEqual(meta['units'], 'mm/month')
+
+        with override_settings(CLIMATE_STORE_DIR=os.path.join(self.store_path, 'missing')):
+            fresh = store.hindcast(hc_path)
+            self.assertNotIsInstance(fresh.values, np.memmap)
+            with redirect_stdout(io.StringIO()):
+                on_the_fly = compute_skill_matrix(-34.6, -58.4, 1)['acc']['jma']
+        np.testing.assert_allclose(stored.values, fresh.values, rtol=1e-6)
+        for a, b in zip(from_store, on_the_fly):
+            for name in pairing.STATS:
+                self.assertAlmostEqual(a[name], b[name], delta=1e-4 * max(1, abs(b[name])))
+
+    def test_era5_month_index(self):
+        """ERA5 is stored as (lat, lon, year, month) in mm/month and looked up by integer arithmetic"""
+        era5_path = os.path.join(DEFAULT_DATA_DIR, 'era5_obs_bsas_1993_2016.nc')
+        store.ingest_file(era5_path, self.store_path)
+        with override_settings(CLIMATE_STORE_DIR=self.store_path):
+            stored = store.observations(era5_path)
+        self.assertIsInstance(stored.values, np.memmap)
+        self.assertEqual(stored.values.shape[2:], (24, 12))
+        self.assertEqual(stored.index.lookup(np.array([1993, 2016, 2017]), np.array([1, 12, 1])).tolist(),
+                         [0, 287, -1])
+
+        fresh = store.observations_from_dataset(DatasetPool().get(era5_path))
+        np.testing.assert_allclose(stored.values, fresh.values, rtol=1e-6)
+        # Enero de 1993 en Buenos Aires: m/día -> mm/mes con 31 días
+        raw = DatasetPool().get(era5_path)['tp'].sel(latitude=-34.5, longitude=-58.5).values[0]
+        self.assertAlmostEqual(float(fresh.points([-34.5], [-58.5])[0, 0]), float(raw) * 1000 * 31, places=6)
+
+    def test_month_index_keeps_first_occurrence(self):
+        times = np.array(['2000-01-01', '2000-01-15', '2000-03-01'], dtype='datetime64[ns]')
+        index = pairing.month_positions(times)
+        self.assertEqual(index.lookup(np.array([2000, 2000, 2000, 1999]), np.array([1, 2, 3, 12])).tolist(),
+                         [0, -1, 2, -1])
+
+    def test_stale_entry_falls_back_to_netcdf(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        path = os.path.join(tmp, 'operational_ncep_202512.nc')
+        shutil.copy(os.path.join(DEFAULT_DATA_DIR, 'operational_ncep_202512.nc'), path)
+        store.ingest_file(path, self.store_path)
+        with override_settings(CLIMATE_STORE_DIR=self.store_path):
+            self.assertIsInstance(store.operational(path).values, np.memmap)
+            os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000))
+            op = store.operational(path)
+        self.assertNotIsInstance(op.values, np.memmap)
+        self.assertEqual((op.year, op.month), (2025, 12))
+
+    def test_operational_without_lead_uses_each_target_month(self):
+        """A daily-mean field without lead coordinate is accumulated with the days of each target month"""
+        import xarray as xr
+        ds = xr.Dataset({'tprate': (('number', 'latitude', 'longitude'), np.full((2, 1, 1), 0.003))},
+                        coords={'latitude': [-34.75], 'longitude': [-58.5]})
+        op = store.operational_from_dataset(ds, 2025, 12)
+        self.assertEqual(op.leads.tolist(), [1, 2, 3, 4, 5, 6])
+        self.assertAlmostEqual(float(op.field(1)[0, 0]), 3 * 31)  # enero
+        self.assertAlmostEqual(float(op.field(2)[0, 0]), 3 * 28)  # febrero 2026
+
+
+class ParallelModelsTests(TestCase):
+    def test_parallel_matches_sequential(self):
+        """The per-model thread pool merges results in file order and keeps per-model failures"""
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        os.symlink(os.path.join(DEFAULT_DATA_DIR, 'era5_obs_bsas_1993_2016.nc'),
+                   os.path.join(tmp, 'era5_obs_bsas_1993_2016.nc'))
+        for name in ['zeta', 'alfa', 'meteo']:
+            os.symlink(os.path.join(DEFAULT_DATA_DIR, 'hc_jma_3_bsas.nc'), os.path.join(tmp, f'hc_{name}_1_bsas.nc'))
+        with open(os.path.join(tmp, 'hc_roto_1_bsas.nc'), 'wb') as fh:
+            fh.write(b'not a netcdf')
+
+        points = [(-34.6, -58.4), (-38.0, -61.0)]
+        with override_settings(CLIMATE_DATA_DIR=tmp), redirect_stdout(io.StringIO()):
+            sequential = analysis.compute_skill_points(points, 4)
+            with override_settings(ANALYSIS_MODEL_WORKERS=4):
+                parallel = analysis.compute_skill_points(points, 4)
+        self.assertEqual(parallel, sequential)
+        self.assertEqual(list(parallel[0]['acc']), ['alfa', 'meteo', 'roto', 'zeta'])
+        self.assertEqual(parallel[1]['acc']['roto'], [None] * 6)
+        self.assertEqual(parallel[1]['acc']['alfa'], parallel[1]['acc']['zeta'])
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "needs os.fork")
+    def test_model_pool_survives_fork(self):
+        """A pool created before fork (preload warm-up) is rebuilt in the child instead of hanging"""
+        self.addCleanup(setattr, analysis, '_executor', None)
+        points = [(-34.6, -58.4)]
+        with override_settings(ANALYSIS_MODEL_WORKERS=2), redirect_stdout(io.StringIO()):
+            expected = analysis.compute_skill_points(points, 4)
+            parent_pool = analysis._model_executor()
+            pid = os.fork()
+            if pid == 0:
+                code = 1
+                try:
+                    signal.alarm(30)
+                    child = analysis.compute_skill_points(points, 4)
+                    code = 0 if child == expected and analysis._model_executor() is not parent_pool else 2
+                finally:
+                    os._exit(code)
+            _, status_code = os.waitpid(pid, 0)
+        self.assertTrue(os.WIFEXITED(status_code), "child was killed (hung on the parent's pool)")
+        self.assertEqual(os.WEXITSTATUS(status_code), 0)
+        self.assertIs(analysis._executor[1], parent_pool)
+
+    def test_resized_model_pool_shuts_down_the_old_one(self):
+        """Changing ANALYSIS_MODEL_WORKERS replaces the shared pool and stops the previous one"""
+        self.addCleanup(setattr, analysis, '_executor', None)
+        with override_settings(ANALYSIS_MODEL_WORKERS=2):
+            old = analysis._model_executor()
+        with override_settings(ANALYSIS_MODEL_WORKERS=3):
+            new = analysis._model_executor()
+            self.assertIs(analysis._model_executor(), new)
+        self.assertIsNot(new, old)
+        with self.assertRaises(RuntimeError):
+            old.submit(int)
+        new.shutdown(wait=False)
+
+
+class FakeCDSHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for the CDS retrieve API: jobs succeed after one poll unless marked to fail."""
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code, body, content_type='application/json'):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))['inputs']
+        with server.lock:
+            job_id = f"job{len(server.jobs)}"
+            server.jobs[job_id] = {'request': request, 'polls': 0}
+            server.events.append(('submit', job_id))
+        self._send(201, {'jobID': job_id, 'status': 'accepted'})
+
+    def do_GET(self):
+        server = self.server
+        parts = self.path.strip('/').split('/')
+        if parts[0] == 'files':
+            payload = f"netcdf:{parts[1]}".encode() * 100
+            start = int(self.headers['Range'].split('=')[1].rstrip('-')) if self.headers.get('Range') else 0
+            with server.lock:
+                server.events.append(('download', parts[1], start))
+            if start >= len(payload):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(payload)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            return self._send(206 if start else 200, payload[start:], 'application/x-netcdf')
+        job = server.jobs.get(parts[4])  # /api/retrieve/v1/jobs/<id>[/results]
+        if job is None:
+            return self._send(404, {'detail': 'job not found'})
+        if len(parts) == 6:
+            return self._send(200, {'asset': {'value': {'href': f"{server.base}/files/{parts[4]}"}}})
+        job['polls'] += 1
+        if job['request'].get('fail'):
+            return self._send(200, {'status': 'failed', 'message': 'no data'})
+        self._send(200, {'status': 'successful' if job['polls'] > 1 else 'running'})
+
+
+class CDSDownloaderTests(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeCDSHandler)
+        self.server.jobs, self.server.events, self.server.lock = {}, [], threading.Lock()
+        self.server.base = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+    def fetch(self, jobs):
+        downloader = cds.Downloader(url=f"{self.server.base}/api", key='test', max_active=4, poll_interval=0.01,
+                                    state_path=os.path.join(self.tmp, 'state.json'))
+        with redirect_stdout(io.StringIO()):
+            return downloader.run(jobs)
+
+    def test_jobs_are_submitted_together_and_renamed_atomically(self):
+        jobs = [cds.Job(name, 'seasonal-monthly-single-levels', {'centre': name}, os.path.join(self.tmp, f'{name}.nc'))
+                for name in ['ecmwf', 'jma', 'ncep']]
+        reports = self.fetch(jobs)
+        self.assertEqual([r['status'] for r in reports], ['done'] * 3)
+        kinds = [event[0] for event in self.server.events]
+        self.assertEqual(kinds[:3], ['submit'] * 3)  # nadie espera a que termine otro pedido
+        self.assertEqual(sorted(os.listdir(self.tmp)), ['ecmwf.nc', 'jma.nc', 'ncep.nc', 'state.json'])
+        self.assertTrue(all(set(r['timings']) >= {'queue', 'download', 'total'} for r in reports))
+        with open(os.path.join(self.tmp, 'state.json')) as fh:
+            self.assertEqual(json.load(fh), {})
+
+        # Una segunda corrida no vuelve a pedir nada
+        self.assertEqual([r['status'] for r in self.fetch(jobs)], ['exists'] * 3)
+        self.assertEqual(len(self.server.jobs), 3)
+
+    def test_resume_reuses_queued_jobs_and_partial_files(self):
+        target = os.path.join(self.tmp, 'dwd.nc')
+        self.server.jobs['job0'] = {'request': {}, 'polls': 0}
+        with open(os.path.join(self.tmp, 'state.json'), 'w') as fh:
+            json.dump({target: 'job0'}, fh)
+        with open(target + '.part', 'wb') as fh:
+            fh.write(b'netcdf:job0')
+
+        failing = cds.Job('eccc', 'seasonal-monthly-single-levels', {'fail': True}, os.path.join(self.tmp, 'eccc.nc'))
+        reports = self.fetch([cds.Job('dwd', 'seasonal-monthly-single-levels', {}, target), failing])
+        self.assertEqual(reports[0]['status'], 'done')
+        self.assertEqual(reports[1]['status'], 'error')
+        self.assertIn('no data', reports[1]['error'])
+        self.assertNotIn(('submit', 'job0'), self.server.events)
+        self.assertIn(('download', 'job0', 11), self.server.events)
+        with open(target, 'rb') as fh:
+            self.assertEqual(fh.read(), b'netcdf:job0' * 100)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, 'eccc.nc')))
+
+    def test_complete_partial_file_is_accepted_on_416(self):
+        """A resumed download whose .part already holds the whole file finishes instead of failing"""
+        target = os.path.join(self.tmp, 'cmcc.nc')
+        self.server.jobs['job0'] = {'request': {}, 'polls': 0}
+        with open(os.path.join(self.tmp, 'state.json'), 'w') as fh:
+            json.dump({target: 'job0'}, fh)
+        with open(target + '.part', 'wb') as fh:
+            fh.write(b'netcdf:job0' * 100)
+        reports = self.fetch([cds.Job('cmcc', 'seasonal-monthly-single-levels', {}, target)])
+        self.assertEqual(reports[0]['status'], 'done')
+        self.assertIn(('download', 'job0', 1100), self.server.events)
+        with open(target, 'rb') as fh:
+            self.assertEqual(fh.read(), b'netcdf:job0' * 100)
+
+    def test_timeouts_are_retried_but_submission_is_not(self):
+        """Read timeouts on polls are retried; a failed POST is never resent (it may already be queued)"""
+        ok = types.SimpleNamespace(status_code=200, json=lambda: {'status': 'running'}, text='')
+        unavailable = types.SimpleNamespace(status_code=503, text='busy')
+        session = mock.Mock(headers={})
+        session.request.side_effect = [requests.Timeout('read timed out'), ok]
+        downloader = cds.Downloader(url='http://cds.test/api', key='k', poll_interval=0.001, retries=2,
+                                    session=session)
+        self.assertEqual(downloader._json('GET', '/retrieve/v1/jobs/job0'), {'status': 'running'})
+        self.assertEqual(session.request.call_count, 2)
+
+        session.request.reset_mock(side_effect=True)
+        session.request.return_value = unavailable
+        with self.assertRaises(cds.CDSError):
+            downloader.submit(cds.Job('ukmo', 'seasonal-monthly-single-levels', {}, 'ukmo.nc'))
+        self.assertEqual(session.request.call_count, 1)
+
+
+class CatalogTests(TestCase):
+    def test_manifest_is_incremental_and_drives_latest_issue(self):
+        """catalog.json records datasets once; the API reads it instead of re-globbing data_bsas"""
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        for name in ['hc_jma_3_bsas.nc', 'operational_ncep_202512.nc']:
+            shutil.copy(os.path.join(DEFAULT_DATA_DIR, name), os.path.join(tmp, name))
+        manifest = catalog.update_manifest(tmp)
+        self.assertEqual(manifest['latest_operational'], '2025-12')
+        self.assertEqual(manifest['datasets']['hc_jma_3_bsas.nc']['kind'], 'hindcast')
+        self.assertEqual(manifest['datasets']['operational_ncep_202512.nc']['model'], 'ncep')
+        self.assertIsNone(manifest['datasets']['hc_jma_3_bsas.nc']['normalized'])
+
+        with mock.patch.object(catalog, '_sha256', wraps=catalog._sha256) as sha:
+            shutil.copy(os.path.join(tmp, 'operational_ncep_202512.nc'), os.path.join(tmp, 'operational_jma_202601.nc'))
+            with override_settings(CLIMATE_DATA_DIR=tmp):
+                # Un archivo nuevo cuenta enseguida: el catálogo viejo se ignora hasta actualizarlo
+                self.assertIsNone(catalog.read_manifest())
+                self.assertEqual(analysis.get_latest_op_date(), ('2026', '01'))
+                fp = catalog.fingerprint()
+                manifest = catalog.update_manifest(tmp)
+                self.assertIsNotNone(catalog.read_manifest())
+                self.assertEqual(analysis.get_latest_op_date(), ('2026', '01'))
+                self.assertEqual(catalog.fingerprint(), fp)
+            self.assertEqual(sha.call_count, 1)  # solo el archivo nuevo
+        self.assertEqual(catalog.operational_issues(tmp), {('ncep', '2025-12'), ('jma', '2026-01')})
+
+    def test_file_added_after_manifest_invalidates_versions(self):
+        """A hindcast dropped into data_bsas after catalog.json changes the fingerprint, ETag and cube freshness"""
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        self.addCleanup(benchmark._reset)
+        benchmark.make_fixtures(tmp, n_lat=6, n_lon=6, n_models=1, years=11)
+        catalog.update_manifest(tmp)
+        cube_dir = os.path.join(tmp, 'skill_cube')
+        with override_settings(CLIMATE_DATA_DIR=tmp, CLIMATE_STORE_DIR=os.path.join(tmp, 'store'),
+                               SKILL_CUBE_DIR=cube_dir), redirect_stdout(io.StringIO()):
+            build_skill_cube(cube_dir, tmp, progress=None)
+            def version():
+                request = types.SimpleNamespace(GET={'lat': '-33.5', 'lon': '-63.5', 'month': '12'},
+                                                META={}, headers={})
+                return catalog.fingerprint(), conditional.etag('skill', conditional.skill_query, request)
+
+            before = version()
+            self.assertTrue(skill_cube.load_skill_cube().is_fresh())
+
+            shutil.copy(os.path.join(tmp, 'hc_model0_1_bsas.nc'), os.path.join(tmp, 'hc_extra_1_bsas.nc'))
+            after = version()
+            self.assertFalse(skill_cube.load_skill_cube().is_fresh())
+            self.assertIn('hc_extra_1_bsas.nc', catalog.source_files())
+        self.assertNotEqual(after[0], before[0])
+        self.assertNotEqual(after[1], before[1])
+
+    def test_latest_published_issue(self):
+        """C3S releases on the 13th: before that day the previous month is the latest issue"""
+        self.assertEqual(catalog.latest_published_issue(date(2026, 1, 12)), (2025, 12))
+        self.assertEqual(catalog.latest_published_issue(date(2026, 1, 13)), (2026, 1))
+        self.assertEqual(catalog.recent_issues(3, date(2026, 2, 1)), [(2025, 11), (2025, 12), (2026, 1)])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SmartForecastTests(TestCase):
+    def setUp(self):
+        result_cache.clear()
+
+    def test_forecast_uses_normalized_operational_arrays(self):
+        """Operational files are read once per issue month and every lead gets a calibrated value"""
+        with mock.patch.object(store, 'operational', wraps=store.operational) as opened, \
+                redirect_stdout(io.StringIO()):
+            store._forecasts.clear()
+            champions = analysis.compute_best_models(-34.75, -58.5)
+            analysis.compute_best_models(-38.0, -61.0)
+        self.assertEqual(opened.call_count, 3)  # ecmwf, jma y ncep de 2025-12, una vez cada uno
+        self.assertEqual([c['mejor_modelo'] for c in champions], ['JMA'] * 6)
+        self.assertTrue(all(c['acumulado_mm'] is not None for c in champions))
+
+        grid = maps.grid_map('jma', 12, 1)
+        i, j = grid['latitude'].index(-34.75), grid['longitude'].index(-58.5)
+        self.assertAlmostEqual(float(grid['fields']['anomaly'][i, j]), champions[0]['anomalia_mm'], places=1)
+
+    def test_forecast_point_matches_nearest_operational_value(self):
+        forecasts = store.operational_forecasts('2025', '12')
+        self.assertEqual(forecasts.models, ['ecmwf', 'jma', 'ncep'])
+        ds = DatasetPool().get(os.path.join(DEFAULT_DATA_DIR, 'operational_jma_202512.nc'))
+        raw = float(ds['tprate'].mean('number').sel(latitude=-34.75, longitude=-58.5, method='nearest')
+                    .sel(forecastMonth=2).squeeze())
+        expected = pairing.operational_to_mm(raw, 28)  # febrero 2026
+        self.assertAlmostEqual(float(forecasts.point(-34.75, -58.5)['jma'][1]), float(expected), places=6)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class WarmupTests(APITestCase):
+    def test_warm_up_loads_arrays_and_reports_ready(self):
+        with redirect_stdout(io.StringIO()):
+            state = warmup.start('sync')
+        self.assertEqual(state['status'], 'ready')
+        self.assertEqual(state['loaded'][:2], ['era5_obs_bsas_1993_2016.nc', 'hc_jma_3_bsas.nc'])
+        self.assertIn('query', state['loaded'])
+        response = self.client.get(reverse('api_ready'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['status'], 'ready')
+
+    def test_not_ready_while_warming(self):
+        with mock.patch.dict(warmup._state, status='warming'):
+            response = self.client.get(reverse('api_ready'))
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class MetricsTests(APITestCase):
+    def setUp(self):
+        result_cache.clear()
+        caches['analysis'].clear()
+        metrics.reset()
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        settings = override_settings(SKILL_CUBE_DIR=os.path.join(tmp, 'skill_cube'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def skill(self):
+        with redirect_stdout(io.StringIO()):
+            return self.client.get(reverse('api_skill'), {'lat': -34.6, 'lon': -58.4, 'month': 12})
+
+    def test_server_timing_lists_stages_per_model(self):
+        """Server-Timing carries per-model pairing/stats spans, also from the model thread pool"""
+        self.assertNotIn('Server-Timing', self.skill())
+        result_cache.clear()
+        caches['analysis'].clear()
+        with override_settings(METRICS_SERVER_TIMING=True, ANALYSIS_MODEL_WORKERS=2):
+            response = self.skill()
+        timing = response['Server-Timing']
+        for stage in ['point_extraction;dur=', 'point_extraction;desc="jma"', 'pairing;desc="jma"',
+                      'stats;desc="jma"', 'total;dur=']:
+            self.assertIn(stage, timing)
+
+    def test_metrics_endpoint_exports_histograms_and_counters(self):
+        self.skill()
+        self.skill()
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn('# TYPE climate_stage_seconds histogram', text)
+        self.assertIn('climate_stage_seconds_bucket{model="jma",stage="stats",le="+Inf"} 1', text)
+        self.assertIn('climate_request_seconds_count{endpoint="skill"} 2', text)
+        self.assertIn('climate_skill_cube_total{result="miss"} 1', text)
+        self.assertRegex(text, r'climate_result_cache_hits_total [1-9]')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        result_cache.clear()
+        caches['analysis'].clear()
+        self.calls = []
+
+    def slow_skill(self, lat, lon, base_month, progress=None):
+        self.calls.append((lat, lon, base_month))
+        time.sleep(0.3)
+        return {"acc": {}, "bias": {}, "base_month": base_month}
+
+    def test_identical_requests_share_one_computation(self):
+        """Ten concurrent clicks in the same ERA5 cell trigger a single computation"""
+        async def clicks():
+            client = AsyncClient()
+            return await asyncio.gather(*[
+                client.get(reverse('api_skill_async'), {'lat': -34.6 + i * 0.01, 'lon': -58.4, 'month': 3})
+                for i in range(10)])
+
+        before = offload.offloader().coalesced
+        with mock.patch.object(analysis, '_skill_matrix', self.slow_skill):
+            responses = asyncio.run(clicks())
+        self.assertEqual([r.status_code for r in responses], [200] * 10)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(offload.offloader().coalesced - before, 9)
+
+    @override_settings(ANALYSIS_ASYNC_TIMEOUT=0.05)
+    def test_timeout_returns_504_and_result_is_kept(self):
+        with mock.patch.object(analysis, '_skill_matrix', self.slow_skill):
+            response = self.client.get(reverse('api_skill_async'), {'lat': -34.6, 'lon': -58.4, 'month': 5})
+            self.assertEqual(response.status_code, status.HTTP_504_GATEWAY_TIMEOUT)
+            time.sleep(0.5)
+            response = self.client.get(reverse('api_skill_async'), {'lat': -34.6, 'lon': -58.4, 'month': 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_matches_sync_view(self):
+        with redirect_stdout(io.StringIO()):
+            async_data = self.client.get(reverse('api_smart_forecast_async'), {'lat': -34.6, 'lon': -58.4}).json()
+            sync_data = self.client.get(reverse('api_smart_forecast'), {'lat': -34.6, 'lon': -58.4}).json()
+            bad = self.client.get(reverse('api_skill_async'), {'lat': 'x', 'lon': -58.4})
+        self.assertEqual(async_data, sync_data)
+        self.assertEqual(bad.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, JOB_WORKERS=0)
+class JobQueueTests(APITestCase):
+    def setUp(self):
+        result_cache.clear()
+        caches['analysis'].clear()
+
+    def submit(self, kind, **params):
+        return self.client.post(reverse('api_jobs'), {'kind': kind, 'params': params}, format='json')
+
+    def test_skill_job_reports_per_model_progress_and_result(self):
+        response = self.submit('skill', lat=-34.6, lon=-58.4, month=12)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = response.json()
+        self.assertEqual((job['status'], job['created']), ('queued', True))
+
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual(jobs.run_pending(), 1)
+        done = self.client.get(job['url']).json()
+        self.assertEqual(done['status'], 'done')
+        self.assertEqual(done['progress']['done'], done['progress']['total'])
+        self.assertEqual(done['progress']['partial']['jma']['acc'], done['result']['acc']['jma'])
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual(done['result'], get_skill_matrix(-34.6, -58.4, 12))
+
+    def test_identical_requests_share_a_job_and_errors_can_retry(self):
+        """Dedup by ERA5 cell/month/data version; a failed job does not block a new one"""
+        first = self.submit('forecast', lat=-34.6, lon=-58.4).json()
+        second = self.submit('forecast', lat=-34.61, lon=-58.41).json()
+        self.assertEqual(first['id'], second['id'])
+        self.assertFalse(second['created'])
+        self.assertEqual(AnalysisJob.objects.count(), 1)
+
+        AnalysisJob.objects.filter(pk=first['id']).update(status='error', error='boom')
+        third = self.submit('forecast', lat=-34.6, lon=-58.4).json()
+        self.assertNotEqual(third['id'], first['id'])
+        self.assertEqual(self.submit('grid', lead=9).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.submit('nope').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_events_stream_progress_then_result(self):
+        job = self.submit('grid', model='best', lead=1).json()
+        with redirect_stdout(io.StringIO()):
+            jobs.run_pending()
+        response = self.client.get(job['events'])
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith('retry: 1000\n\nevent: done\n'))
+        payload = json.loads(body.split('data: ', 1)[1])
+        self.assertEqual(payload['result']['lead'], 1)
+
+    @override_settings(JOB_EVENTS_TIMEOUT=0.3)
+    def test_events_stream_closes_within_cap_for_reconnect(self):
+        """A stream on an unfinished job ends at the cap without an error, letting EventSource reconnect."""
+        job = self.submit('grid', model='best', lead=1).json()
+        started = time.monotonic()
+        body = b''.join(self.client.get(job['events']).streaming_content).decode()
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertTrue(body.startswith('retry: '))
+        self.assertIn('event: progress\n', body)
+        self.assertNotIn('event: error', body)
+        self.assertNotIn('event: done', body)
+
+    def test_stale_running_jobs_are_requeued(self):
+        job = AnalysisJob.objects.create(kind='skill', params={'lat': -34.6, 'lon': -58.4, 'month': 1}, key='k',
+                                         status='running', worker='dead')
+        AnalysisJob.objects.filter(pk=job.pk).update(started_at=job.created_at.replace(year=2000))
+        jobs.housekeeping()
+        self.assertEqual(AnalysisJob.objects.get(pk=job.pk).status, 'queued')
+
+    def test_first_request_starts_workers_once_per_process(self):
+        """After a restart the queue is picked up by the first request, not only by the next submit"""
+        self.addCleanup(jobs._workers.update, dict(jobs._workers))
+        jobs._workers.update(pid=None, threads=[])
+
+        def start():
+            jobs._workers['pid'] = os.getpid()
+
+        with mock.patch.object(jobs, 'ensure_workers', side_effect=start) as ensure:
+            self.client.get(reverse('api_ready'))
+            self.assertEqual(ensure.call_count, 0)  # JOB_WORKERS=0: solo manage.py run_jobs
+            with override_settings(JOB_WORKERS=2):
+                self.client.get(reverse('api_ready'))
+                self.client.get(reverse('api_ready'))
+            self.assertEqual(ensure.call_count, 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ResponseFormatTests(APITestCase):
+    def setUp(self):
+        result_cache.clear()
+        caches['analysis'].clear()
+
+    def test_columnar_skill_matches_json(self):
+        params = {'lat': -34.6, 'lon': -58.4, 'month': 3}
+        with redirect_stdout(io.StringIO()):
+            data = self.client.get(reverse('api_skill'), params).json()
+            response = self.client.get(reverse('api_skill'), params,
+                                       HTTP_ACCEPT='application/vnd.climate-viewer.columnar')
+        self.assertEqual(response['Content-Type'], 'application/vnd.climate-viewer.columnar')
+        block = columnar.decode_skill(response.content)
+        self.assertEqual(block['models'], ['jma'])
+        self.assertEqual(block['shape'], [1, 1, 1, 6, 6])
+        for lead, stats in enumerate(data['acc']['jma']):
+            expected = [np.nan] * 6 if stats is None else [stats[s] for s in block['stats']]
+            np.testing.assert_allclose(block['values'][0, 0, 0, lead], expected, rtol=1e-6)
+
+    def test_batch_columnar_is_smaller_and_keeps_point_order(self):
+        body = {'points': [{'id': f'p{i}', 'lat': -34 - i * 0.3, 'lon': -58 - i * 0.2} for i in range(20)],
+                'months': [1, 7]}
+        with redirect_stdout(io.StringIO()):
+            as_json = self.client.post(reverse('api_skill_batch'), body, format='json')
+            as_block = self.client.post(reverse('api_skill_batch') + '?output=columnar', body, format='json')
+        results = as_json.json()['results']
+        block = columnar.decode_skill(as_block.content)
+        self.assertEqual([p['id'] for p in block['points']], list(results))
+        self.assertEqual(block['months'], ['1', '7'])
+        self.assertLess(len(as_block.content), len(as_json.content) / 3)
+        r = results['p5']['skill']['7']['acc']['jma'][2]
+        self.assertAlmostEqual(float(block['values'][1, 5, 0, 2, 0]), r['r'], places=5)
+
+    def test_msgpack_is_optional_and_json_stays_default(self):
+        params = {'lat': -34.6, 'lon': -58.4}
+        with redirect_stdout(io.StringIO()):
+            default = self.client.get(reverse('api_smart_forecast'), params)
+            with mock.patch.dict(sys.modules, {'msgpack': None}):
+                missing = self.client.get(reverse('api_smart_forecast'), params, HTTP_ACCEPT='application/msgpack')
+            fake = types.SimpleNamespace(packb=lambda data, use_bin_type: json.dumps(data).encode())
+            with mock.patch.dict(sys.modules, {'msgpack': fake}):
+                packed = self.client.get(reverse('api_smart_forecast'), {**params, 'output': 'msgpack'})
+            columnar_forecast = self.client.get(reverse('api_smart_forecast'), {**params, 'output': 'columnar'})
+        self.assertEqual(default['Content-Type'], 'application/json')
+        self.assertEqual(missing.status_code, status.HTTP_406_NOT_ACCEPTABLE)
+        self.assertEqual(packed['Content-Type'], 'application/msgpack')
+        self.assertEqual(json.loads(packed.content), default.json())
+        self.assertEqual(columnar_forecast.status_code, status.HTTP_406_NOT_ACCEPTABLE)
+
+    def test_gzip_and_brotli_compression(self):
+        params = {'lat': -34.6, 'lon': -58.4, 'month': 3}
+        with redirect_stdout(io.StringIO()):
+            plain = self.client.get(reverse('api_skill'), params)
+            gzipped = self.client.get(reverse('api_skill'), params, HTTP_ACCEPT_ENCODING='gzip')
+            fake = types.SimpleNamespace(compress=lambda data, quality: b'BR' + gzip.compress(data))
+            with mock.patch.dict(sys.modules, {'brotli': fake}):
+                br = self.client.get(reverse('api_skill'), params, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(gzipped['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(gzipped.content)), plain.json())
+        self.assertEqual(br['Content-Encoding'], 'br')
+        self.assertEqual(gzip.decompress(br.content[2:]), plain.content)
+
+
+SCIENTIFIC_STACK = {'xarray', 'pandas', 'scipy', 'netCDF4'}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProbabilisticSkillTests(APITestCase):
+    def setUp(self):
+        result_cache.clear()
+        caches['analysis'].clear()
+
+    def test_scores_match_brute_force_for_any_member_chunk(self):
+        """Vectorized tercile scores equal a per-year loop and do not depend on the member chunk size"""
+        rng = np.random.default_rng(1)
+        dates = np.arange('1990-01', '2020-01', 12, dtype='datetime64[M]')
+        members = rng.gamma(2, 40, (len(dates), 6, 3, 13))
+        obs_times = np.arange('1990-01', '2022-01', dtype='datetime64[M]')
+        obs = rng.gamma(2, 35, (len(obs_times), 3))
+        index = pairing.month_positions(obs_times)
+        results = [probabilistic.tercile_scores(members, dates, np.arange(1, 7), obs, index, 1, chunk=c)
+                   for c in (1, 4, 13)]
+        for other in results[1:]:
+            for stat in probabilistic.PROB_STATS:
+                np.testing.assert_allclose(other[stat], results[0][stat], rtol=1e-12)
+
+        lead, point = 2, 1
+        _, _, obs_idx, _ = pairing.align(dates, np.arange(1, 7), 1, index)
+        y = obs[obs_idx[:, lead], point]
+        x = members[:, lead, point]
+        x = x - (x.mean() - y.mean())
+        p33, p66 = np.percentile(y, [100 / 3, 200 / 3])
+        below, above = (x < p33).mean(axis=1), (x > p66).mean(axis=1)
+        rps = ((below - (y < p33)) ** 2 + (above - (y > p66)) ** 2).sum()
+        rps_clim = ((1 / 3 - (y < p33)) ** 2 + (1 / 3 - (y > p66)) ** 2).sum()
+        crps = np.mean([np.abs(xs - ys).mean() - 0.5 * np.abs(xs[:, None] - xs[None, :]).mean()
+                        for xs, ys in zip(x, y)])
+        pos, neg = below[y < p33], below[y >= p33]
+        roc = np.mean([(a > b) + 0.5 * (a == b) for a in pos for b in neg])
+        stats = results[0]
+        self.assertAlmostEqual(stats['p33'][lead, point], p33)
+        self.assertAlmostEqual(stats['rpss'][lead, point], 1 - rps / rps_clim)
+        self.assertAlmostEqual(stats['crps'][lead, point], crps)
+        self.assertAlmostEqual(stats['roc_below'][lead, point], roc)
+
+    def test_member_chunk_respects_budget(self):
+        self.assertEqual(probabilistic.member_chunk(1000, 51, budget=8 * 1000 * 16), 4)
+        self.assertEqual(probabilistic.member_chunk(10, 51, budget=2 ** 30), 51)
+        self.assertEqual(probabilistic.member_chunk(10 ** 9, 51, budget=1), 1)
+
+    def test_endpoint_reports_skill_and_tercile_probabilities(self):
+        with redirect_stdout(io.StringIO()):
+            response = self.client.get(reverse('api_skill_probabilistic'), {'lat': -34.6, 'lon': -58.4, 'month': 12})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['issue'], '2025-12')
+        lead1 = data['skill']['jma'][0]
+        self.assertLessEqual(lead1['rpss'], 1)
+        self.assertTrue(0 <= lead1['roc_below'] <= 1 and lead1['crps'] > 0)
+        self.assertLess(lead1['p33'], lead1['p66'])
+        probs = data['forecast']['jma'][0]
+        self.assertAlmostEqual(probs['below'] + probs['normal'] + probs['above'], 1, places=2)
+
+        with redirect_stdout(io.StringIO()):
+            other = self.client.get(reverse('api_skill_probabilistic'), {'lat': -34.6, 'lon': -58.4, 'month': 3})
+        self.assertNotIn('forecast', other.json())
+
+    def test_ingested_members_match_in_memory(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        hc_path = os.path.join(DEFAULT_DATA_DIR, 'hc_jma_3_bsas.nc')
+        with override_settings(CLIMATE_STORE_DIR=os.path.join(tmp, 'missing')):
+            fresh = store.hindcast_members(hc_path)
+        with override_settings(CLIMATE_STORE_DIR=tmp):
+            store.ingest()
+            stored = store.hindcast_members(hc_path)
+        self.assertIsInstance(stored.values, np.memmap)
+        self.assertEqual(stored.values.shape, (8, 7, 288, 6, 10))
+        np.testing.assert_allclose(stored.values, fresh.values, rtol=1e-6)
+        np.testing.assert_allclose(store.hindcast(hc_path).values, fresh.values.mean(axis=-1), rtol=1e-5)
+
+
+class ImportTimeTests(TestCase):
+    """Guards the web tier against pulling the scientific stack in at import time."""
+
+    def run_python(self, code, **env):
+        base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='climate_viewer.settings', CLIMATE_WARMUP='', **env)
+        return subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=base, env=env,
+                              capture_output=True, text=True, check=True)
+
+    @staticmethod
+    def imported(stderr):
+        # Líneas "import time: self [us] | cumulative | módulo"
+        return {line.split('|')[-1].strip().split('.')[0] for line in stderr.splitlines() if '|' in line}
+
+    def test_views_import_without_numeric_stack(self):
+        result = self.run_python("import django; django.setup(); import core.views, climate_viewer.urls")
+        modules = self.imported(result.stderr)
+        self.assertIn('core', modules)
+        self.assertFalse(modules & (SCIENTIFIC_STACK | {'numpy'}))
+
+    def test_serving_from_store_uses_numpy_only(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        store.ingest(out_dir=os.path.join(tmp, 'store'))
+        code = ("import django, io, contextlib, sys; django.setup()\n"
+                "from core import analysis\n"
+                "with contextlib.redirect_stdout(io.StringIO()):\n"
+                "    assert 'error' not in analysis.get_skill_matrix(-34.6, -58.4, 12)\n"
+                "    assert analysis.get_best_models(-34.6, -58.4, None)[0]['acumulado_mm'] is not None\n")
+        result = self.run_python(code, CLIMATE_STORE_DIR=os.path.join(tmp, 'store'),
+                                 ANALYSIS_CACHE_DIR=os.path.join(tmp, 'cache'))
+        modules = self.imported(result.stderr)
+        self.assertIn('numpy', modules)
+        self.assertFalse(modules & SCIENTIFIC_STACK)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BenchmarkFixtureTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        benchmark.make_fixtures(self.tmp, n_lat=8, n_lon=8, n_models=4, years=11)
+        settings = override_settings(CLIMATE_DATA_DIR=self.tmp, CLIMATE_STORE_DIR=os.path.join(self.tmp, 'store'),
+                                     SKILL_CUBE_DIR=os.path.join(self.tmp, 'skill_cube'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(benchmark._reset)
+
+    def test_every_naming_variant_is_scored(self):
+        """Synthetic hindcasts/operationals in each schema variant yield skill and a forecast"""
+        with redirect_stdout(io.StringIO()):
+            data = analysis.compute_skill_matrix(-33.5, -63.5, 12)
+            forecast = analysis.compute_best_models(-33.5, -63.5)
+        self.assertEqual(sorted(data['acc']), ['model0', 'model1', 'model2', 'model3'])
+        for model, row in data['acc'].items():
+            self.assertTrue(all(v is not None for v in row), model)
+        self.assertEqual(len(forecast), 6)
+        self.assertTrue(all(row['acumulado_mm'] is not None for row in forecast))
+
+    def test_run_reports_all_sections(self):
+        with redirect_stdout(io.StringIO()):
+            results = benchmark.run(points=2, batch=5, threads=(1, 2), requests=4)
+        self.assertEqual(set(results), {'skill_cold', 'skill_warm', 'forecast_cold', 'forecast_warm',
+                                        'ensemble_warm', 'batch', 'concurrent'})
+        self.assertEqual(set(results['concurrent']), {'1', '2'})
+        self.assertGreater(results['skill_warm']['median_ms'], 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TiledSkillCubeTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        benchmark.make_fixtures(self.tmp, n_lat=9, n_lon=7, n_models=2, years=11)
+        store_dir = os.path.join(self.tmp, 'store')
+        settings = override_settings(CLIMATE_DATA_DIR=self.tmp, CLIMATE_STORE_DIR=store_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(benchmark._reset)
+        with redirect_stdout(io.StringIO()):
+            store.ingest(self.tmp, store_dir)
+
+    def test_tiles_cover_the_grid_once(self):
+        """Blocks fit the budget and cover every cell exactly once"""
+        self.assertEqual(tile_shape(9, 7, 0, 1000), (9, 7))
+        self.assertEqual(tile_shape(9, 7, 3000, 1000), (1, 3))
+        self.assertEqual(tile_shape(9, 7, 15000, 1000), (2, 7))
+        covered = np.zeros((9, 7), dtype=int)
+        for rows, cols in tiles(9, 7, (2, 3)):
+            covered[rows, cols] += 1
+        self.assertTrue((covered == 1).all())
+
+    def test_tiled_cube_matches_single_block(self):
+        """A cube built tile by tile under a tiny budget equals the one-block cube, with progress per tile"""
+        calls = []
+        single = build_skill_cube(os.path.join(self.tmp, 'single'), self.tmp, memory_mb=0, progress=None)
+        tiled = build_skill_cube(os.path.join(self.tmp, 'tiled'), self.tmp, memory_mb=0.05,
+                                 progress=lambda done, total: calls.append((done, total)))
+        total = calls[-1][1]
+        self.assertGreater(total, 1)
+        self.assertEqual(calls, [(i, total) for i in range(1, total + 1)])
+        for name in ['n'] + pairing.STATS:
+            want = np.load(os.path.join(single, f'{name}.npy'))
+            got = np.load(os.path.join(tiled, f'{name}.npy'))
+            np.testing.assert_array_equal(got, want, err_msg=name)
+        with open(os.path.join(tiled, 'index.json')) as fh:
+            self.assertEqual(json.load(fh)['models'], ['model0', 'model1'])
+
+    def test_tiled_grid_matches_single_block(self):
+        with redirect_stdout(io.StringIO()):
+            want = compute_grid(3, self.tmp, memory_mb=0)
+            got = compute_grid(3, self.tmp, memory_mb=0.05)
+        np.testing.assert_array_equal(got['n'], want['n'])
+        for s in pairing.STATS:
+            np.testing.assert_array_equal(got['stats'][s], want['stats'][s])
+
+    def test_memory_scaling_reports_both_paths(self):
+        with redirect_stdout(io.StringIO()):
+            report = benchmark.memory_scaling([(6, 5)], memory_mb=0.05, years=11)
+        row = report['grids'][0]
+        self.assertEqual(row['cells'], 30)
+        self.assertGreater(row['in_memory']['peak_mb'], 0)
+        self.assertGreater(row['tiled']['seconds'], 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class MultiModelEnsembleTests(APITestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        benchmark.make_fixtures(self.tmp, n_lat=8, n_lon=8, n_models=3, years=11)
+        settings = override_settings(CLIMATE_DATA_DIR=self.tmp, CLIMATE_STORE_DIR=os.path.join(self.tmp, 'store'),
+                                     SKILL_CUBE_DIR=os.path.join(self.tmp, 'skill_cube'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(benchmark._reset)
+        result_cache.clear()
+        caches['analysis'].clear()
+
+    def test_blend_weights_follow_positive_skill(self):
+        stats = {'r': [[0.6], [0.2], [-0.3], [0.5]], 'bias': [[10.0], [-5.0], [0.0], [0.0]],
+                 'p20': [[1.0]] * 4, 'p50': [[50.0]] * 4, 'p80': [[90.0]] * 4}
+        forecast = [[110.0], [85.0], [300.0], [np.nan]]
+        blended = ensemble.blend(forecast, stats)
+        np.testing.assert_allclose(blended['weights'][:, 0], [0.75, 0.25, 0, 0])
+        self.assertAlmostEqual(blended['forecast'][0], 0.75 * 100 + 0.25 * 90)
+        self.assertAlmostEqual(blended['spread'][0], np.sqrt(0.75 * 2.5 ** 2 + 0.25 * 7.5 ** 2))
+        self.assertAlmostEqual(blended['anomaly'][0], blended['forecast'][0] - 50)
+
+        unskilled = ensemble.blend([[100.0], [80.0]], {**{s: v[:2] for s, v in stats.items()},
+                                                       'r': [[-0.1], [0.0]]})
+        np.testing.assert_allclose(unskilled['weights'][:, 0], [0.5, 0.5])
+
+    def test_zero_and_missing_percentiles_stay_floats(self):
+        """A 0.0 percentile is kept as a float and a missing one falls back to 0.0, not int 0"""
+        blend = ensemble.blend
+
+        def patched(forecast, stats):
+            result = blend(forecast, stats)
+            result['p20'] = np.zeros_like(result['p20'])
+            result['p80'] = np.full_like(result['p80'], np.nan)
+            return result
+
+        with mock.patch.object(ensemble, 'blend', side_effect=patched), redirect_stdout(io.StringIO()):
+            leads = analysis.compute_ensemble_forecast(-33.5, -63.5)
+        for lead in leads:
+            self.assertIsInstance(lead['p20'], float)
+            self.assertIsInstance(lead['p50'], float)
+            self.assertEqual((lead['p20'], lead['p80']), (0.0, 0.0))
+            self.assertIsInstance(lead['p80'], float)
+
+    def test_point_forecast_blends_every_centre(self):
+        with redirect_stdout(io.StringIO()):
+            response = self.client.get(reverse('api_smart_forecast'), {'lat': -33.5, 'lon': -63.5, 'mode': 'ensemble'})
+            skill = analysis.get_skill_matrix(-33.5, -63.5, 12)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lead1 = response.json()[0]
+        op_year, op_month = analysis.get_latest_op_date()
+        point = store.operational_forecasts(op_year, op_month).point(-33.5, -63.5)
+        models = list(skill['acc'])
+        r = np.clip([skill['acc'][m][0]['r'] for m in models], 0, None)
+        calibrated = [point[m][0] - skill['acc'][m][0]['bias'] for m in models]
+        self.assertAlmostEqual(lead1['acumulado_mm'], round(float(np.dot(r, calibrated) / r.sum()), 1))
+        self.assertGreater(lead1['spread_mm'], 0)
+        self.assertAlmostEqual(sum(lead1['modelos'].values()), 1, places=2)
+
+        bad = self.client.get(reverse('api_smart_forecast'), {'lat': -33.5, 'lon': -63.5, 'mode': 'mean'})
+        self.assertEqual(bad.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_grid_and_batch_ensemble(self):
+        with redirect_stdout(io.StringIO()):
+            grid = maps.grid_map('ensemble', 12, 1)
+            body = {'points': [{'id': 'a', 'lat': -33.5, 'lon': -63.5}], 'months': [12], 'forecast': 'ensemble'}
+            batch = self.client.post(reverse('api_skill_batch'), body, format='json').json()
+            single = analysis.get_ensemble_forecast(-33.5, -63.5)
+        self.assertEqual(list(grid['fields']), maps.ENSEMBLE_FIELDS)
+        decoded = maps.decode_binary(maps.encode_binary(grid))
+        np.testing.assert_array_equal(decoded['fields']['spread'], grid['fields']['spread'])
+        i = int(np.argmin(np.abs(np.asarray(grid['latitude']) + 33.5)))
+        j = int(np.argmin(np.abs(np.asarray(grid['longitude']) + 63.5)))
+        self.assertAlmostEqual(float(grid['fields']['anomaly'][i, j]), single[0]['anomalia_mm'], places=0)
+        self.assertEqual(batch['results']['a']['forecast'], single)
+
+    def test_grid_ensemble_outside_issue_month_is_skill_weighted(self):
+        """Without a forecast for the base month the ensemble grid still reports skill-weighted r and bias"""
+        with redirect_stdout(io.StringIO()):
+            grid = maps.grid_map('ensemble', 3, 1)
+            skill = analysis.get_skill_matrix(-33.5, -63.5, 3)
+        fields = grid['fields']
+        self.assertGreater(int(np.isfinite(fields['r']).sum()), fields['r'].size // 2)
+        self.assertTrue(np.isfinite(fields['best_model'][np.isfinite(fields['r'])]).all())
+        self.assertTrue(np.isnan(fields['anomaly']).all())
+        self.assertTrue(np.isnan(fields['spread']).all())
+
+        i = int(np.argmin(np.abs(np.asarray(grid['latitude']) + 33.5)))
+        j = int(np.argmin(np.abs(np.asarray(grid['longitude']) + 63.5)))
+        r = np.asarray([skill['acc'][m][0]['r'] for m in grid['models']])
+        bias = np.asarray([skill['acc'][m][0]['bias'] for m in grid['models']])
+        w = np.clip(r, 0, None) / np.clip(r, 0, None).sum()
+        self.assertAlmostEqual(float(fields['r'][i, j]), float(np.dot(w, r)), places=4)
+        self.assertAlmostEqual(float(fields['bias'][i, j]), float(np.dot(w, bias)), places=2)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GridIndexTests(APITestCase):
+    def setUp(self):
+        result_cache.clear()
+        caches['analysis'].clear()
+
+    def test_nearest_matches_coordinate_search(self):
+        """Binary search gives the same cells as the brute-force nearest search, ties included"""
+        rng = np.random.default_rng(3)
+        lats = np.arange(-33, -42.25, -0.25)  # decreciente, como ERA5
+        lons = np.arange(-64, -56.25, 0.25)
+        queries = np.concatenate([rng.uniform(-43, -32, 500), lats + 0.125])
+        index = GridIndex(lats, lons)
+        ilat, _, _ = index.nearest(queries, np.full(queries.shape, -60.0))
+        np.testing.assert_array_equal(ilat, nearest_index(lats, queries))
+        _, ilon, _ = index.nearest(np.full(queries.shape, -35.0), queries - 22)
+        np.testing.assert_array_equal(ilon, nearest_index(lons, queries - 22))
+
+    def test_bilinear_weights_and_domain_flags(self):
+        lats, lons = np.asarray([-40.0, -39.0, -38.0]), np.asarray([-60.0, -59.0])
+        index = GridIndex(lats, lons)
+        field = 2 * lats[:, None] + 3 * lons[None, :]
+        points = ([-38.6, -39.5, -38.4, -43.0], [-59.3, -59.75, -58.6, -59.5])
+        values = index.sample(field, *points, method='bilinear')
+        np.testing.assert_allclose(values[:2], [2 * -38.6 + 3 * -59.3, 2 * -39.5 + 3 * -59.75])
+        # Dentro de media celda del borde se usa el borde; más lejos es NaN, no la celda del borde
+        self.assertAlmostEqual(values[2], 2 * -38.4 + 3 * -59.0)
+        self.assertTrue(np.isnan(values[3]))
+        np.testing.assert_array_equal(index.inside(*points), [True, True, True, False])
+        self.assertTrue(np.isnan(index.sample(field, [-43.0], [-59.5])[0]))
+
+    def test_out_of_domain_queries_are_flagged(self):
+        with redirect_stdout(io.StringIO()):
+            single = self.client.get(reverse('api_skill'), {'lat': -20.0, 'lon': -58.4})
+            body = {'points': [{'id': 'in', 'lat': -34.6, 'lon': -58.4}, {'id': 'out', 'lat': -20.0, 'lon': -58.4}],
+                    'months': [1], 'forecast': True}
+            batch = self.client.post(reverse('api_skill_batch'), body, format='json').json()['results']
+        self.assertEqual(single.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('outside the data domain', single.json()['error'])
+        self.assertIsNone(batch['out']['cell'])
+        self.assertIn('error', batch['out']['skill']['1'])
+        self.assertNotIn('forecast', batch['out'])
+        self.assertIn('acc', batch['in']['skill']['1'])
+
+        # ERA5 llega a -42 pero los operativos a -41: esas celdas ya no copian la fila del borde
+        op_year, op_month = analysis.get_latest_op_date()
+        forecasts = store.operational_forecasts(op_year, op_month)
+        self.assertTrue(np.isnan(forecasts.point(-42.0, -60.0)['jma']).all())
+        self.assertFalse(np.isnan(forecasts.point(-41.0, -60.0)['jma']).any())
+
+    def test_bilinear_interpolation_is_cached_separately(self):
+        with redirect_stdout(io.StringIO()):
+            nearest = get_skill_matrix(-34.6, -58.4, 1)['acc']['jma'][0]['r']
+            with override_settings(GRID_INTERPOLATION='bilinear'):
+                bilinear = get_skill_matrix(-34.6, -58.4, 1)['acc']['jma'][0]['r']
+                version = analysis.data_version()
+        self.assertNotEqual(nearest, bilinear)
+        self.assertTrue(version.endswith(':bilinear'))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConditionalCacheTests(APITestCase):
+    def setUp(self):
+        result_cache.clear()
+        caches['analysis'].clear()
+
+    def get(self, params, **headers):
+        with redirect_stdout(io.StringIO()):
+            return self.client.get(reverse('api_skill'), params, **headers)
+
+    def test_matching_etag_returns_304_without_analysis(self):
+        first = self.get({'lat': -34.6, 'lon': -58.4, 'month': 3})
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertIn('max-age=3600', first['Cache-Control'])
+        self.assertIn('public', first['Cache-Control'])
+        self.assertIn('Accept', first['Vary'])
+        self.assertIn('Last-Modified', first)
+
+        with mock.patch.object(analysis, 'get_skill_matrix', side_effect=AssertionError('recomputed')):
+            # Otro clic en la misma celda ERA5 comparte el ETag
+            again = self.get({'lat': -34.61, 'lon': -58.41, 'month': 3}, HTTP_IF_NONE_MATCH=first['ETag'])
+            weak = self.get({'lat': -34.6, 'lon': -58.4, 'month': 3}, HTTP_IF_NONE_MATCH='W/' + first['ETag'])
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(weak.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(again.content, b'')
+
+    def test_etag_depends_on_query_format_and_data(self):
+        base = self.get({'lat': -34.6, 'lon': -58.4, 'month': 3})['ETag']
+        self.assertNotEqual(self.get({'lat': -34.6, 'lon': -58.4, 'month': 4})['ETag'], base)
+        self.assertNotEqual(self.get({'lat': -34.6, 'lon': -58.4, 'month': 3, 'output': 'columnar'})['ETag'], base)
+
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        benchmark.make_fixtures(tmp, n_lat=6, n_lon=6, n_models=1, years=11)
+        self.addCleanup(benchmark._reset)
+        with override_settings(CLIMATE_DATA_DIR=tmp, CLIMATE_STORE_DIR=os.path.join(tmp, 'store')):
+            params = {'lat': -33.5, 'lon': -63.5, 'month': 12}
+            before = self.get(params)['ETag']
+            hc = os.path.join(tmp, sorted(n for n in os.listdir(tmp) if n.startswith('hc_'))[0])
+            os.utime(hc, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+            after = self.get(params, HTTP_IF_NONE_MATCH=before)
+        self.assertEqual(after.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(after['ETag'], before)
+
+    def test_errors_are_not_cacheable(self):
+        response = self.get({'lat': -20.0, 'lon': -58.4})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Cache-Control', response)
+
+    def test_invalid_month_gets_no_validators_or_cache_control(self):
+        """The view and the ETag share the month check: out-of-range months are uncacheable 400s"""
+        for month in ('0', '-1', '13'):
+            response = self.get({'lat': -34.6, 'lon': -58.4, 'month': month},
+                                HTTP_IF_MODIFIED_SINCE='Thu, 01 Jan 2099 00:00:00 GMT')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, month)
+            for header in ('ETag', 'Last-Modified', 'Cache-Control'):
+                self.assertNotIn(header, response)
+        with self.assertRaises(ValueError):
+            conditional.base_month('13')
+        self.assertEqual(conditional.base_month('auto'), analysis.resolve_base_month('auto'))
+
+    def test_etag_and_cache_keys_share_the_data_version(self):
+        """Switching the interpolation changes the ETag, and an invalid method fails in both places alike"""
+        params = {'lat': -34.6, 'lon': -58.4, 'month': 3}
+        nearest = self.get(params)['ETag']
+        with override_settings(GRID_INTERPOLATION='bilinear'):
+            self.assertEqual(analysis.data_version(), catalog.data_version())
+            self.assertTrue(catalog.data_version().endswith(':bilinear'))
+            self.assertNotEqual(conditional.etag('skill', conditional.skill_query, self._request(params)), nearest)
+        with override_settings(GRID_INTERPOLATION='cubic'):
+            with self.assertRaises(ValueError):
+                conditional.etag('skill', conditional.skill_query, self._request(params))
+            with self.assertRaises(ValueError):
+                analysis.data_version()
+
+    def _request(self, params):
+        return RequestFactory().get(reverse('api_skill'), params)
+
+    def test_forecast_and_grid_revalidate(self):
+        params = {'lat': -34.6, 'lon': -58.4}
+        with redirect_stdout(io.StringIO()):
+            forecast = self.client.get(reverse('api_smart_forecast'), params)
+            ensemble = self.client.get(reverse('api_smart_forecast'), {**params, 'mode': 'ensemble'})
+            grid = self.client.get(reverse('api_grid'), {'lead': 2})
+        self.assertNotEqual(forecast['ETag'], ensemble['ETag'])
+        with mock.patch.object(analysis, 'get_best_models', side_effect=AssertionError('recomputed')), \
+                mock.patch.object(maps, 'grid_map', side_effect=AssertionError('recomputed')):
+            cached = self.client.get(reverse('api_smart_forecast'), params, HTTP_IF_NONE_MATCH=forecast['ETag'])
+            cached_grid = self.client.get(reverse('api_grid'), {'lead': 2}, HTTP_IF_NONE_MATCH=grid['ETag'])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(cached_grid.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class DatasetPoolTests(TestCase):
+    def test_pool_loads_once_and_reloads_on_change(self):
+        """Concurrent readers share one in-memory handle until the file's mtime changes"""
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        path = os.path.join(tmp, 'operational_ncep_202512.nc')
+        shutil.copy(os.path.join(DEFAULT_DATA_DIR, 'operational_ncep_202512.nc'), path)
+
+        pool = DatasetPool()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            handles = list(executor.map(lambda _: pool.get(path), range(8)))
+        self.assertTrue(all(h is handles[0] for h in handles))
+
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000))
+        self.assertIsNot(pool.get(path), handles[0])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ResultCacheTests(APITestCase):
+    def setUp(self):
+        result_cache.clear()
+        caches['analysis'].clear()
+
+    def test_lru_eviction_and_ttl(self):
+        """The cache is bounded and entries expire after the TTL"""
+        cache = ResultCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        cache.ttl = -1
+        cache.set('d', 4)
+        self.assertIsNone(cache.get('d'))
+        self.assertEqual(cache.stats()['evictions'], 3)
+
+    def test_nearby_clicks_share_entry_until_data_changes(self):
+        """Points in the same grid cell hit the cache; a new data file invalidates it"""
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        for name in ['era5_obs_bsas_1993_2016.nc', 'hc_jma_3_bsas.nc']:
+            shutil.copy(os.path.join(DEFAULT_DATA_DIR, name), tmp)
+
+        with override_settings(CLIMATE_DATA_DIR=tmp), redirect_stdout(io.StringIO()):
+            before = result_cache.stats()
+            first = get_skill_matrix(-34.61, -58.38, 3)
+            second = get_skill_matrix(-34.55, -58.45, 3)
+            self.assertIs(first, second)
+            after = result_cache.stats()
+            self.assertEqual(after['misses'] - before['misses'], 1)
+            self.assertEqual(after['hits'] - before['hits'], 1)
+
+            shutil.copy(os.path.join(DEFAULT_DATA_DIR, 'operational_jma_202512.nc'), tmp)
+            self.assertIsNot(get_skill_matrix(-34.61, -58.38, 3), first)
+
+        response = self.client.get(reverse('api_cache_stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('evictions', response.json())
+
+    def test_workers_share_results_through_backend(self):
+        """A second worker reads a result computed by another one instead of recomputing it"""
+        worker_a = ResultCache(backend='analysis')
+        worker_b = ResultCache(backend='analysis')
+        calls = []
+        worker_a.get_or_compute(('skill', 1, 2), lambda: calls.append('a') or {"acc": {}})
+        value = worker_b.get_or_compute(('skill', 1, 2), lambda: calls.append('b') or {"acc": {}})
+        self.assertEqual(value, {"acc": {}})
+        self.assertEqual(calls, ['a'])
+        self.assertEqual(worker_b.stats()['shared_hits'], 1)
+
+    def test_cold_key_is_computed_once(self):
+        """While one worker holds the compute lock the others wait for its result"""
+        worker_a = ResultCache(backend='analysis')
+        worker_b = ResultCache(backend='analysis', lock_timeout=5)
+        caches['analysis'].add('lock:skill:3:4', 'worker-a', 5)
+        timer = threading.Timer(0.2, lambda: worker_a.set(('skill', 3, 4), [1, 2, 3]))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        value = worker_b.get_or_compute(('skill', 3, 4), lambda: self.fail("recomputed a locked key"))
+        self.assertEqual(value, [1, 2, 3])
+
+    def test_file_backend_lock_is_atomic(self):
+        """With FileBasedCache exactly one of many simultaneous cold requests takes the compute lock"""
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        file_caches = dict(LOCMEM_CACHES, analysis={
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tmp})
+        with override_settings(CACHES=file_caches):
+            workers = [ResultCache(backend='analysis', lock_timeout=5) for _ in range(16)]
+            shared = caches['analysis']
+            barrier = threading.Barrier(len(workers))
+
+            def race(worker):
+                barrier.wait()
+                return worker._acquire(shared, 'lock:skill:5:6', uuid.uuid4().hex)
+
+            with ThreadPoolExecutor(max_workers=len(workers)) as executor:
+                won = list(executor.map(race, workers))
+            self.assertEqual(won.count(True), 1)
+            self.assertTrue(workers[0]._locked(shared, 'lock:skill:5:6'))
+
+            # Un candado huérfano (worker caído) vence a los lock_timeout segundos
+            path = workers[0]._lock_path(shared, 'lock:skill:5:6')
+            os.utime(path, (time.time() - 10, time.time() - 10))
+            self.assertFalse(workers[0]._locked(shared, 'lock:skill:5:6'))
+            self.assertTrue(workers[0]._acquire(shared, 'lock:skill:5:6', 'fresh'))
+            workers[1]._release(shared, 'lock:skill:5:6', 'other')
+            self.assertTrue(os.path.exists(path))
+            workers[0]._release(shared, 'lock:skill:5:6', 'fresh')
+            self.assertFalse(os.path.exists(path))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BatchSkillTests(APITestCase):
+    def setUp(self):
+        result_cache.clear()
+
+    def test_batch_matches_single_point_results(self):
+        """Each point in a batch gets the same skill matrix as /api/skill, keyed by id"""
+        body = {"points": [{"id": "lote-1", "lat": -34.61, "lon": -58.38},
+                           {"id": "lote-2", "lat": -34.55, "lon": -58.45},
+                           {"id": "lote-3", "lat": -37.3, "lon": -61.2}],
+                "months": [1, 7]}
+        with redirect_stdout(io.StringIO()):
+            response = self.client.post(reverse('api_skill_batch'), body, format='json')
+            expected = get_skill_matrix(-37.3, -61.2, 7)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['results']
+        self.assertEqual(set(results), {'lote-1', 'lote-2', 'lote-3'})
+        self.assertEqual(results['lote-1']['cell'], results['lote-2']['cell'])
+        self.assertEqual(results['lote-3']['skill']['7'], json.loads(json.dumps(expected)))
+
+    def test_batch_streams_ndjson(self):
+        """Large lists can be streamed as one JSON line per point"""
+        body = {"points": [[-35.0 - i * 0.3, -60.0] for i in range(5)], "month": 2, "stream": True}
+        with redirect_stdout(io.StringIO()):
+            response = self.client.post(reverse('api_skill_batch'), body, format='json')
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([json.loads(line)['id'] for line in lines], ['0', '1', '2', '3', '4'])
+
+    def test_batch_streams_ndjson_from_accept_header(self):
+        """Accept: application/x-ndjson asks for the stream without the body flag"""
+        body = {"points": [[-35.0, -60.0], [-36.0, -61.0]], "month": 2}
+        with redirect_stdout(io.StringIO()):
+            response = self.client.post(reverse('api_skill_batch'), body, format='json',
+                                        HTTP_ACCEPT='application/x-ndjson')
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([json.loads(line)['id'] for line in lines], ['0', '1'])
+
+    def test_batch_rejects_bad_input(self):
+        """Missing points or duplicated ids return 400"""
+        url = reverse('api_skill_batch')
+        self.assertEqual(self.client.post(url, {}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        body = {"points": [{"id": "a", "lat": -35, "lon": -60}, {"id": "a", "lat": -36, "lon": -60}]}
+        self.assertEqual(self.client.post(url, body, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_rejects_month_out_of_range(self):
+        """Months outside 1-12 are rejected while parsing, before any row is streamed"""
+        url = reverse('api_skill_batch')
+        for months in ([13], [0], [-1], [1, 13]):
+            for stream in (False, True):
+                body = {"points": [[-35.0, -60.0]], "months": months, "stream": stream}
+                response = self.client.post(url, body, format='json')
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, (months, stream))
+                self.assertIn('month must be 1-12', response.json()['error'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GridMapTests(APITestCase):
+    def test_grid_matches_point_skill(self):
+        """The whole-domain grid holds the same r/bias as the per-point skill matrix"""
+        response = self.client.get(reverse('api_grid'), {'model': 'jma', 'month': 3, 'lead': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        i = data['latitude'].index(-36.0)
+        j = data['longitude'].index(-60.0)
+        with redirect_stdout(io.StringIO()):
+            point = compute_skill_matrix(-36.0, -60.0, 3)['acc']['jma'][1]
+        self.assertAlmostEqual(data['fields']['r'][i][j], point['r'], places=3)
+        self.assertAlmostEqual(data['fields']['bias'][i][j], point['bias'], places=3)
+        # Sin pronóstico operativo emitido en marzo no hay anomalía
+        self.assertIsNone(data['fields']['anomaly'][i][j])
+
+    def test_binary_and_geojson_formats(self):
+        """The float32 binary grid decodes to the JSON values; GeoJSON has one polygon per cell"""
+        params = {'model': 'best', 'month': 12, 'lead': 1}
+        data = self.client.get(reverse('api_grid'), params).json()
+        blob = self.client.get(reverse('api_grid'), dict(params, output='bin'))
+        self.assertEqual(blob['Content-Type'], 'application/octet-stream')
+        grid = maps.decode_binary(blob.content)
+        self.assertEqual(grid['shape'], [len(data['latitude']), len(data['longitude'])])
+        self.assertAlmostEqual(float(grid['fields']['anomaly'][5, 7]), data['fields']['anomaly'][5][7], places=3)
+        self.assertEqual(grid['models'][int(grid['fields']['best_model'][0, 0])], 'jma')
+
+        geo = self.client.get(reverse('api_grid'), dict(params, output='geojson')).json()
+        self.assertEqual(len(geo['features']), grid['shape'][0] * grid['shape'][1])
+
+    def test_best_model_outside_issue_month_ranks_by_skill(self):
+        """Without an operational forecast for the base month, 'best' still picks the highest-r model per cell"""
+        data = self.client.get(reverse('api_grid'), {'model': 'best', 'month': 3, 'lead': 1}).json()
+        models = data['models']
+        per_model = {m: self.client.get(reverse('api_grid'), {'model': m, 'month': 3, 'lead': 1}).json()['fields']
+                     for m in models}
+        fields = data['fields']
+        finite = [(i, j) for i, row in enumerate(fields['r']) for j, v in enumerate(row) if v is not None]
+        self.assertGreater(len(finite), len(data['latitude']) * len(data['longitude']) // 2)
+        self.assertTrue(all(v is None for row in fields['anomaly'] for v in row))
+        for i, j in finite[::97]:
+            candidates = {m: f['r'][i][j] for m, f in per_model.items() if f['r'][i][j] is not None}
+            best = models[int(fields['best_model'][i][j])]
+            self.assertEqual(fields['r'][i][j], max(candidates.values()))
+            self.assertEqual(fields['bias'][i][j], per_model[best]['bias'][i][j])
+
+    def test_unknown_model_is_rejected(self):
+        response = self.client.get(reverse('api_grid'), {'model': 'nope'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
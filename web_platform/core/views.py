@@ -1,40 +1,92 @@
+import json
+
+from django.conf import settings
 from django.shortcuts import render
-from django.http import JsonResponse
-from rest_framework.decorators import api_view
-from .analysis import get_skill_matrix, get_best_models
+from django.urls import reverse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from rest_framework.decorators import api_view, renderer_classes
+# core.analysis / core.maps (NumPy y, sin store, xarray) se importan dentro de cada
+# vista: cargar las URLs o servir index no arrastra el stack científico
+from . import catalog
+from . import conditional
+from . import metrics
+from . import warmup
+from .renderers import NEGOTIATED_RENDERERS, NdjsonRenderer
+from .cache import result_cache
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
 
 def index(request):
     return render(request, 'core/index.html')
 
+def _output(request, allowed=('json', 'columnar', 'msgpack')):
+    # Formato negociado (?output= o Accept); JSON por defecto
+    from . import columnar
+    try:
+        return columnar.negotiate(request, allowed), None
+    except columnar.NotAcceptable as e:
+        return None, JsonResponse({'error': f"Not acceptable: {str(e)}"}, status=406)
+
+def _encoded(output, data, columnar_body=None):
+    # columnar_body() arma el bloque CVS1 solo si se pidió ese formato
+    from . import columnar
+    if output == 'columnar':
+        return HttpResponse(columnar_body(), content_type=columnar.CONTENT_TYPES['columnar'])
+    if output == 'msgpack':
+        return HttpResponse(columnar.pack_msgpack(data), content_type=columnar.CONTENT_TYPES['msgpack'])
+    return JsonResponse(data, safe=False)
+
+def _skill_block(data, lat, lon):
+    from . import columnar
+    return columnar.encode_skill({str(data['base_month']): [data]}, [{"lat": lat, "lon": lon}])
+
+def _forecast_mode(value):
+    # 'best' (un modelo por lead) o 'ensemble' (multimodelo ponderado por skill)
+    mode = str(value or 'best').lower()
+    if mode not in ('best', 'ensemble'):
+        raise ValueError("mode must be 'best' or 'ensemble'")
+    return mode
+
+def _forecast(lat, lon, month, mode):
+    from . import analysis
+    if mode == 'ensemble':
+        return analysis.get_ensemble_forecast(lat, lon)
+    return analysis.get_best_models(lat, lon, month)
+
+def _point_query(params):
+    lat = float(params.get('lat'))
+    lon = float(params.get('lon'))
+    raw_month = params.get('month', '1')
+    return lat, lon, 'auto' if raw_month == 'auto' else int(raw_month)
+
 @extend_schema(
     parameters=[
         OpenApiParameter("lat", OpenApiTypes.FLOAT, OpenApiParameter.QUERY, description="Latitude value", required=True),
         OpenApiParameter("lon", OpenApiTypes.FLOAT, OpenApiParameter.QUERY, description="Longitude value", required=True),
         OpenApiParameter("month", OpenApiTypes.STR, OpenApiParameter.QUERY, description="Base month (1-12 or 'auto')", required=False, default="1"),
+        OpenApiParameter("output", OpenApiTypes.STR, OpenApiParameter.QUERY, description="json (default), columnar (CVS1 float32 block) or msgpack; also negotiable via Accept", required=False),
     ],
-    responses={200: OpenApiTypes.OBJECT, 400: OpenApiTypes.OBJECT},
+    responses={200: OpenApiTypes.OBJECT, 304: None, 400: OpenApiTypes.OBJECT, 406: OpenApiTypes.OBJECT},
     description="Returns the skill matrix (Correlation and Bias) for all models at a specific point."
 )
 @api_view(['GET'])
+@renderer_classes(NEGOTIATED_RENDERERS)
+@metrics.instrument('skill')
+@conditional.cacheable('skill', conditional.skill_query)
 def api_skill(request):
+    output, error = _output(request)
+    if error is not None:
+        return error
     try:
-        lat = float(request.query_params.get('lat'))
-        lon = float(request.query_params.get('lon'))
-        raw_month = request.query_params.get('month', '1')
-        
-        if raw_month == 'auto':
-            month = 'auto'
-        else:
-            month = int(raw_month)
+        lat, lon, month = _point_query(request.query_params)
         
+        from .analysis import get_skill_matrix
         data = get_skill_matrix(lat, lon, month)
         
         if "error" in data:
             return JsonResponse(data, status=400) 
             
-        return JsonResponse(data)
+        return _encoded(output, data, lambda: _skill_block(data, lat, lon))
     except Exception as e:
         return JsonResponse({'error': f"Missing or invalid parameters: {str(e)}"}, status=400)
 
@@ -43,23 +95,310 @@ def api_skill(request):
         OpenApiParameter("lat", OpenApiTypes.FLOAT, OpenApiParameter.QUERY, description="Latitude value", required=True),
         OpenApiParameter("lon", OpenApiTypes.FLOAT, OpenApiParameter.QUERY, description="Longitude value", required=True),
         OpenApiParameter("month", OpenApiTypes.STR, OpenApiParameter.QUERY, description="Base month (1-12 or 'auto')", required=False, default="1"),
+        OpenApiParameter("output", OpenApiTypes.STR, OpenApiParameter.QUERY, description="json (default) or msgpack; also negotiable via Accept", required=False),
     ],
-    responses={200: OpenApiTypes.OBJECT},
-    description="Returns the best model recommendation and calibrated forecast for each lead time."
+    responses={200: OpenApiTypes.OBJECT, 304: None, 406: OpenApiTypes.OBJECT},
+    description="Returns tercile skill from the full ensemble (RPSS, ROC area for below/above normal, CRPS, ERA5 p33/p66) per model and lead. When the base month is the latest operational issue month, also returns the below/normal/above probabilities of each model's forecast."
 )
 @api_view(['GET'])
+@renderer_classes(NEGOTIATED_RENDERERS)
+@metrics.instrument('skill_probabilistic')
+@conditional.cacheable('probabilistic', conditional.probabilistic_query)
+def api_skill_probabilistic(request):
+    output, error = _output(request, ('json', 'msgpack'))
+    if error is not None:
+        return error
+    try:
+        lat, lon, month = _point_query(request.query_params)
+
+        from .analysis import get_probabilistic_skill
+        data = get_probabilistic_skill(lat, lon, month)
+
+        if "error" in data:
+            return JsonResponse(data, status=400)
+
+        return _encoded(output, data)
+    except Exception as e:
+        return JsonResponse({'error': f"Missing or invalid parameters: {str(e)}"}, status=400)
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter("lat", OpenApiTypes.FLOAT, OpenApiParameter.QUERY, description="Latitude value", required=True),
+        OpenApiParameter("lon", OpenApiTypes.FLOAT, OpenApiParameter.QUERY, description="Longitude value", required=True),
+        OpenApiParameter("month", OpenApiTypes.STR, OpenApiParameter.QUERY, description="Base month (1-12 or 'auto')", required=False, default="1"),
+        OpenApiParameter("mode", OpenApiTypes.STR, OpenApiParameter.QUERY, description="best (single model per lead) or ensemble (skill-weighted multi-model blend with spread)", required=False, default="best"),
+        OpenApiParameter("output", OpenApiTypes.STR, OpenApiParameter.QUERY, description="json (default) or msgpack; also negotiable via Accept", required=False),
+    ],
+    responses={200: OpenApiTypes.OBJECT, 304: None, 406: OpenApiTypes.OBJECT},
+    description="Returns the best model recommendation and calibrated forecast for each lead time. With mode=ensemble, all centres with an operational forecast are blended with weights from their hindcast r, each bias-corrected, and the weighted spread is reported."
+)
+@api_view(['GET'])
+@renderer_classes(NEGOTIATED_RENDERERS)
+@metrics.instrument('smart_forecast')
+@conditional.cacheable('forecast', conditional.forecast_query)
 def api_smart_forecast(request):
+    output, error = _output(request, ('json', 'msgpack'))
+    if error is not None:
+        return error
     try:
-        lat = float(request.query_params.get('lat'))
-        lon = float(request.query_params.get('lon'))
-        raw_month = request.query_params.get('month', '1')
+        lat, lon, month = _point_query(request.query_params)
+        mode = _forecast_mode(request.query_params.get('mode'))
         
-        if raw_month == 'auto':
-            month = 'auto'
+        data = _forecast(lat, lon, month, mode)
+        return _encoded(output, data)
+    except Exception as e:
+        return JsonResponse({'error': f"Missing or invalid parameters: {str(e)}"}, status=400)
+
+@extend_schema(
+    responses={200: OpenApiTypes.OBJECT},
+    description="Returns hit/miss/eviction counters of the in-process analysis result cache."
+)
+@api_view(['GET'])
+def api_cache_stats(request):
+    return JsonResponse(result_cache.stats())
+
+@extend_schema(
+    responses={200: OpenApiTypes.OBJECT, 503: OpenApiTypes.OBJECT},
+    description="Readiness probe: 503 while the worker is still preloading datasets (CLIMATE_WARMUP), 200 afterwards."
+)
+@api_view(['GET'])
+def api_ready(request):
+    state = warmup.status()
+    return JsonResponse(state, status=200 if state["status"] != "warming" else 503)
+
+async def _offloaded(key_fn, key_args, fn, args):
+    # La clave (celda ERA5 + mes + huella) se arma fuera del loop; el cálculo va al pool acotado
+    from . import offload
+    try:
+        key = await offload.call(key_fn, *key_args)
+    except ValueError as e:
+        # p. ej. analysis.OutOfDomain: el punto cae fuera de la grilla
+        return None, JsonResponse({'error': f"Missing or invalid parameters: {str(e)}"}, status=400)
+    timeout = float(getattr(settings, 'ANALYSIS_ASYNC_TIMEOUT', 60))
+    try:
+        return await offload.offloader().run(key, fn, *args, timeout=timeout), None
+    except offload.Busy as e:
+        return None, JsonResponse({'error': f"Server busy: {e}"}, status=503)
+    except offload.Timeout as e:
+        return None, JsonResponse({'error': f"Timed out: {e}; retry later"}, status=504)
+
+@metrics.instrument('skill_async')
+async def api_skill_async(request):
+    """/api/skill para ASGI: no ocupa el loop mientras calcula y coalesce pedidos iguales."""
+    from . import analysis
+    output, error = _output(request)
+    if error is not None:
+        return error
+    try:
+        lat, lon, month = _point_query(request.GET)
+    except Exception as e:
+        return JsonResponse({'error': f"Missing or invalid parameters: {str(e)}"}, status=400)
+    data, error = await _offloaded(analysis.skill_key, (lat, lon, month),
+                                   analysis.get_skill_matrix, (lat, lon, month))
+    if error is not None:
+        return error
+    if "error" in data:
+        return JsonResponse(data, status=400)
+    return _encoded(output, data, lambda: _skill_block(data, lat, lon))
+
+@metrics.instrument('smart_forecast_async')
+async def api_smart_forecast_async(request):
+    """/api/smart_forecast para ASGI (ver api_skill_async)."""
+    from . import analysis
+    output, error = _output(request, ('json', 'msgpack'))
+    if error is not None:
+        return error
+    try:
+        lat, lon, month = _point_query(request.GET)
+        mode = _forecast_mode(request.GET.get('mode'))
+    except Exception as e:
+        return JsonResponse({'error': f"Missing or invalid parameters: {str(e)}"}, status=400)
+    data, error = await _offloaded(analysis.forecast_key, (lat, lon, mode), _forecast, (lat, lon, month, mode))
+    return error if error is not None else _encoded(output, data)
+
+@extend_schema(
+    request=OpenApiTypes.OBJECT,
+    responses={202: OpenApiTypes.OBJECT, 400: OpenApiTypes.OBJECT},
+    description=(
+        "Queues a background analysis and returns its job id immediately. Body: "
+        "{\"kind\": \"skill\" | \"forecast\" | \"grid\", \"params\": {...}} with the same parameters "
+        "as /api/skill, /api/smart_forecast or /api/grid. An identical live job (same ERA5 cell, month and "
+        "data version) is returned instead of queuing a new one. Poll /api/jobs/<id> or stream "
+        "/api/jobs/<id>/events (server-sent events) for per-model progress."
+    )
+)
+@api_view(['POST'])
+def api_jobs(request):
+    from . import jobs
+    try:
+        job, created = jobs.submit(request.data.get('kind'), request.data.get('params') or {})
+    except Exception as e:
+        return JsonResponse({'error': f"Missing or invalid parameters: {str(e)}"}, status=400)
+    data = jobs.describe(job)
+    data.update(created=created, url=reverse('api_job', args=[job.id]),
+                events=reverse('api_job_events', args=[job.id]))
+    return JsonResponse(data, status=202)
+
+@extend_schema(
+    responses={200: OpenApiTypes.OBJECT, 404: OpenApiTypes.OBJECT},
+    description="Status, per-model partial results and (when done) the result of a background analysis job."
+)
+@api_view(['GET'])
+def api_job(request, job_id):
+    from . import jobs
+    from .models import AnalysisJob
+    job = AnalysisJob.objects.filter(pk=job_id).first()
+    if job is None:
+        return JsonResponse({'error': 'job not found'}, status=404)
+    return JsonResponse(jobs.describe(job))
+
+def api_job_events(request, job_id):
+    # Server-sent events (fuera de DRF: text/event-stream sin negociación de contenido)
+    from . import jobs
+    from .models import AnalysisJob
+    if not AnalysisJob.objects.filter(pk=job_id).exists():
+        return JsonResponse({'error': 'job not found'}, status=404)
+    response = StreamingHttpResponse(jobs.events(job_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def api_metrics(request):
+    # Texto de Prometheus (fuera de DRF: sin negociación de contenido ni esquema)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Puntos por bloque: cada bloque lee los arrays una vez y se emite apenas está listo
+BATCH_CHUNK = 500
+
+def _parse_batch(body):
+    raw_points = body.get('points')
+    if not isinstance(raw_points, list) or not raw_points:
+        raise ValueError("'points' must be a non-empty list")
+    max_points = getattr(settings, 'BATCH_MAX_POINTS', 10000)
+    if len(raw_points) > max_points:
+        raise ValueError(f"at most {max_points} points per request")
+
+    points = []
+    for i, p in enumerate(raw_points):
+        if isinstance(p, dict):
+            points.append({'id': str(p.get('id', i)), 'lat': float(p['lat']), 'lon': float(p['lon'])})
         else:
-            month = int(raw_month)
-        
-        data = get_best_models(lat, lon, month)
-        return JsonResponse(data, safe=False)
+            lat, lon = p
+            points.append({'id': str(i), 'lat': float(lat), 'lon': float(lon)})
+    if len({p['id'] for p in points}) != len(points):
+        raise ValueError("point ids must be unique")
+
+    raw_months = body.get('months', [body.get('month', '1')])
+    months = ['auto' if m == 'auto' else catalog.base_month(m) for m in raw_months]
+    forecast = body.get('forecast', False)
+    mode = _forecast_mode('best' if forecast is True else forecast) if forecast else None
+    return points, months, mode
+
+def _batch_rows(points, months, forecast_mode):
+    from .analysis import get_skill_matrix_batch
+    for start in range(0, len(points), BATCH_CHUNK):
+        chunk = points[start:start + BATCH_CHUNK]
+        coords = [(p['lat'], p['lon']) for p in chunk]
+        per_month = {m: get_skill_matrix_batch(coords, m) for m in months}
+        for i, p in enumerate(chunk):
+            cell = per_month[months[0]][i][0]
+            row = {
+                "id": p['id'],
+                "lat": p['lat'],
+                "lon": p['lon'],
+                # None: el punto cae fuera de la grilla y cada mes trae el error
+                "cell": {"lat": cell[0], "lon": cell[1]} if cell is not None else None,
+                "skill": {str(m): per_month[m][i][1] for m in months},
+            }
+            if forecast_mode and cell is not None:
+                row["forecast"] = _forecast(p['lat'], p['lon'], None, forecast_mode)
+            yield row
+
+@extend_schema(
+    request=OpenApiTypes.OBJECT,
+    responses={200: OpenApiTypes.OBJECT, 400: OpenApiTypes.OBJECT},
+    description=(
+        "Skill matrix for many points at once (e.g. field centroids). Body: "
+        "{\"points\": [{\"id\": \"lote-1\", \"lat\": -34.6, \"lon\": -58.4}, ...], "
+        "\"months\": [1, 2] (or \"month\": 1 / \"auto\"), \"forecast\": false, \"stream\": false}. "
+        "\"forecast\": true (or \"best\" / \"ensemble\") adds the smart forecast of each point. "
+        "Results are keyed by point id. With \"stream\": true (or Accept: application/x-ndjson) "
+        "one JSON line per point is streamed as soon as each block is computed. "
+        "?output=columnar (or Accept: application/vnd.climate-viewer.columnar) returns one CVS1 block: "
+        "a JSON header (months, points, models, leads, stats) plus float32 values shaped "
+        "(month, point, model, lead, stat); ?output=msgpack returns the JSON shape as MessagePack."
+    )
+)
+@api_view(['POST'])
+@renderer_classes([*NEGOTIATED_RENDERERS, NdjsonRenderer])
+def api_skill_batch(request):
+    output, error = _output(request)
+    if error is not None:
+        return error
+    try:
+        points, months, forecast_mode = _parse_batch(request.data)
     except Exception as e:
         return JsonResponse({'error': f"Missing or invalid parameters: {str(e)}"}, status=400)
+
+    rows = _batch_rows(points, months, forecast_mode)
+    if output == 'columnar':
+        from . import columnar
+        per_month = {str(m): [] for m in months}
+        header_points = []
+        for row in rows:
+            header_points.append({k: row[k] for k in ('id', 'lat', 'lon', 'cell')})
+            for m in per_month:
+                per_month[m].append(row['skill'][m])
+        return HttpResponse(columnar.encode_skill(per_month, header_points),
+                            content_type=columnar.CONTENT_TYPES['columnar'])
+    if request.data.get('stream') or 'application/x-ndjson' in request.headers.get('Accept', ''):
+        return StreamingHttpResponse((json.dumps(row) + '\n' for row in rows),
+                                     content_type='application/x-ndjson')
+
+    results = {}
+    for row in rows:
+        results[row.pop('id')] = row
+    return _encoded(output, {"results": results})
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter("model", OpenApiTypes.STR, OpenApiParameter.QUERY, description="Model name, 'best' or 'ensemble' (skill-weighted multi-model blend)", required=False, default="best"),
+        OpenApiParameter("month", OpenApiTypes.STR, OpenApiParameter.QUERY, description="Base month (1-12 or 'auto')", required=False, default="auto"),
+        OpenApiParameter("lead", OpenApiTypes.INT, OpenApiParameter.QUERY, description="Lead time in months (1-6)", required=False, default=1),
+        OpenApiParameter("output", OpenApiTypes.STR, OpenApiParameter.QUERY, description="json, bin (float32 with JSON header), geojson or msgpack", required=False, default="json"),
+    ],
+    responses={200: OpenApiTypes.OBJECT, 304: None, 400: OpenApiTypes.OBJECT},
+    description=(
+        "Returns the whole-domain grid (ERA5 cells) of best-model index, r, bias and calibrated anomaly "
+        "for a model, base month and lead, computed in one vectorized pass. With model=ensemble the fields "
+        "are the skill-weighted blend (best_model is the model with the largest weight) plus its spread."
+    )
+)
+@api_view(['GET'])
+@metrics.instrument('grid')
+@conditional.cacheable('grid', conditional.grid_query)
+def api_grid(request):
+    from . import maps
+    from .analysis import resolve_base_month
+    try:
+        model = request.query_params.get('model', 'best').lower()
+        month = resolve_base_month(request.query_params.get('month', 'auto'))
+        lead = int(request.query_params.get('lead', 1))
+        fmt = request.query_params.get('output', 'json')
+        if not 1 <= lead <= 6 or not 1 <= month <= 12:
+            raise ValueError("month must be 1-12 and lead 1-6")
+        if fmt not in ('json', 'bin', 'geojson', 'msgpack'):
+            raise ValueError("output must be json, bin, geojson or msgpack")
+        if fmt == 'msgpack':
+            _, error = _output(request, ('msgpack',))
+            if error is not None:
+                return error
+        result = maps.grid_map(model, month, lead)
+    except Exception as e:
+        return JsonResponse({'error': f"Missing or invalid parameters: {str(e)}"}, status=400)
+
+    if fmt == 'bin':
+        return HttpResponse(maps.encode_binary(result), content_type='application/octet-stream')
+    if fmt == 'geojson':
+        return JsonResponse(maps.to_geojson(result), content_type='application/geo+json')
+    return _encoded(fmt, maps.to_json(result))
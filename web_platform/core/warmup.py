@@ -0,0 +1,83 @@
+"""Precarga de ERA5, hindcasts, operativos y cubo al arrancar el proceso.
+
+CLIMATE_WARMUP elige el modo:
+  ''/'0'   sin precarga (todo se carga en el primer pedido, como siempre)
+  'thread' en un hilo de fondo: el worker atiende mientras tanto y /api/ready da 503
+  'sync'   antes de terminar de cargar la app; con gunicorn --preload corre en el
+           master y los workers heredan los arrays (copy-on-write) ya listos
+"""
+import os
+import glob
+import time
+import threading
+
+_state = {"status": "disabled", "mode": None, "seconds": None, "loaded": [], "error": None}
+_lock = threading.Lock()
+
+
+def status():
+    with _lock:
+        return dict(_state, loaded=list(_state["loaded"]), pid=os.getpid())
+
+
+def is_ready():
+    return status()["status"] != "warming"
+
+
+def _loaded(name):
+    with _lock:
+        _state["loaded"].append(name)
+
+
+def warm_up(query=True):
+    """Carga los arrays canónicos y, si `query`, corre una consulta sintética."""
+    from . import analysis
+    from . import catalog
+    from . import skill_cube
+    from . import store
+
+    with _lock:
+        _state.update(status="warming", seconds=None, loaded=[], error=None)
+    t0 = time.perf_counter()
+    try:
+        directory = catalog.data_dir()
+        obs = store.observations(os.path.join(directory, analysis.ERA5_FILE))
+        _loaded(analysis.ERA5_FILE)
+        for f in sorted(glob.glob(os.path.join(directory, 'hc_*_bsas.nc'))):
+            try:
+                store.hindcast(f)
+                _loaded(os.path.basename(f))
+            except Exception as e:
+                print(f"Warm-up: no se pudo cargar {os.path.basename(f)}: {e}")
+        op_year, op_month = analysis.get_latest_op_date()
+        if op_year:
+            store.operational_forecasts(op_year, op_month)
+            _loaded(f"operational {op_year}-{op_month}")
+        if skill_cube.load_skill_cube() is not None:
+            _loaded("skill_cube")
+        if query:
+            # Un punto en el centro de la grilla recorre todo el camino de cálculo (sin cache)
+            lat = float(obs.latitude[len(obs.latitude) // 2])
+            lon = float(obs.longitude[len(obs.longitude) // 2])
+            analysis.compute_skill_points([(lat, lon)], int(op_month) if op_month else 1)
+            _loaded("query")
+        with _lock:
+            _state.update(status="ready", seconds=round(time.perf_counter() - t0, 3))
+    except Exception as e:
+        print(f"Warm-up falló: {e}")
+        with _lock:
+            _state.update(status="error", error=str(e), seconds=round(time.perf_counter() - t0, 3))
+    return status()
+
+
+def start(mode, query=True):
+    """Arranca la precarga según el modo (ver docstring del módulo)."""
+    with _lock:
+        _state["mode"] = mode or None
+    if mode == 'sync':
+        return warm_up(query)
+    if mode == 'thread':
+        with _lock:
+            _state["status"] = "warming"
+        threading.Thread(target=warm_up, args=(query,), name='warmup', daemon=True).start()
+    return status()